@@ -0,0 +1,203 @@
+import os
+import time
+import traceback
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+# ==========================================
+# CARREGAMENTO PARALELO DE ASSETS
+# ==========================================
+#
+# Cada personagem é convertido (fbx_loader.load_fbx_model) e tem a textura
+# decodificada (PIL) em um processo do pool. Os arrays resultantes voltam
+# por memória compartilhada: o processo filho copia tudo para um único
+# bloco SharedMemory e devolve só um descritor pequeno (nome do bloco,
+# offset/dtype/shape de cada array). O processo principal copia os arrays
+# para fora do bloco, libera o bloco e faz apenas os uploads para o GL.
+#
+# Falhas não derrubam o lote: cada asset volta com o motivo do erro e os
+# tempos de cada etapa, e print_asset_report() mostra o resumo.
+
+_ALIGN = 64
+
+# Blocos criados neste processo filho. Ficam abertos até o pool encerrar:
+# no Windows a memória some quando o último handle fecha, então o filho não
+# pode fechar o bloco antes de o processo principal anexá-lo.
+_WORKER_BLOCKS = []
+
+
+class AssetResult:
+    """Resultado de um asset: mesh_data no formato de load_fbx_model, textura decodificada, tempos e erro"""
+    def __init__(self, path):
+        self.path = path
+        self.mesh_data = None
+        self.texture = None       # mapa difuso (altura, largura, 4) uint8 RGBA, ou None
+        self.timings = {}
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None and self.mesh_data is not None
+
+    @property
+    def name(self):
+        return os.path.splitext(os.path.basename(self.path))[0]
+
+
+def decode_texture(path):
+    """Decodifica a imagem em RGBA (sem GL); roda em qualquer processo"""
+    from PIL import Image
+    with Image.open(path) as img:
+        return np.asarray(img.convert("RGBA"), dtype=np.uint8)
+
+
+# ------------------------------------------
+# Lado do processo filho
+# ------------------------------------------
+
+def _pack_shared(arrays):
+    """Copia os arrays para um único bloco SharedMemory e devolve (nome, layout)"""
+    layout, offset = {}, 0
+    for key, arr in arrays.items():
+        offset += (-offset) % _ALIGN
+        layout[key] = (offset, arr.dtype.str, arr.shape)
+        offset += arr.nbytes
+
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for key, arr in arrays.items():
+        start, dtype, shape = layout[key]
+        np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=start)[...] = arr
+    _WORKER_BLOCKS.append(block)
+    return block.name, layout
+
+
+def _load_asset_worker(path, options):
+    """Executa no pool: converte a malha, decodifica a textura e empacota em memória compartilhada"""
+    report = {"path": path, "timings": {}, "error": None, "block": None, "layout": None, "materials": None}
+    try:
+        from fbx_loader import load_fbx_model
+        from texture_baker import is_baked
+
+        start = time.perf_counter()
+        mesh_data = load_fbx_model(path, **options)
+        report["timings"]["malha"] = time.perf_counter() - start
+        if not mesh_data:
+            report["error"] = "load_fbx_model não retornou malha (arquivo inválido ou sem mesh)"
+            return report
+
+        positions, normals, uvs, indices, materials = mesh_data
+        arrays = {
+            "positions": np.ascontiguousarray(positions),
+            "normals": np.ascontiguousarray(normals),
+            "uvs": np.ascontiguousarray(uvs),
+            "indices": np.ascontiguousarray(indices),
+        }
+        report["materials"] = materials
+        texture_path = materials.get("diffuse") if materials else None
+
+        # Textura já pré-processada: o TextureManager lê os níveis do cache, nada a decodificar
+        if texture_path and not is_baked(texture_path):
+            start = time.perf_counter()
+            try:
+                arrays["texture"] = decode_texture(texture_path)
+            except (ImportError, OSError, ValueError) as e:
+                # Textura ruim (ou PIL ausente) não invalida a malha: segue sem textura
+                report["texture_error"] = f"{type(e).__name__}: {e}"
+            report["timings"]["textura"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        report["block"], report["layout"] = _pack_shared(arrays)
+        report["timings"]["empacotar"] = time.perf_counter() - start
+    except Exception as e:
+        report["error"] = f"{type(e).__name__}: {e}"
+        report["traceback"] = traceback.format_exc()
+    return report
+
+
+# ------------------------------------------
+# Lado do processo principal
+# ------------------------------------------
+
+def _unpack_shared(block_name, layout):
+    """Copia os arrays para fora do bloco e o libera"""
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        arrays = {}
+        for key, (start, dtype, shape) in layout.items():
+            arrays[key] = np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=start).copy()
+        return arrays
+    finally:
+        block.close()
+        block.unlink()
+
+
+def _collect(report, result):
+    result.timings.update(report["timings"])
+    result.error = report["error"]
+    if report.get("texture_error"):
+        print(f"⚠️ Textura de {result.name} ignorada: {report['texture_error']}")
+    if report.get("traceback"):
+        print(report["traceback"])
+    if report["block"] is None:
+        return
+
+    start = time.perf_counter()
+    arrays = _unpack_shared(report["block"], report["layout"])
+    result.timings["desempacotar"] = time.perf_counter() - start
+    result.mesh_data = [arrays["positions"], arrays["normals"], arrays["uvs"], arrays["indices"], report["materials"]]
+    result.texture = arrays.get("texture")
+
+
+def load_assets(paths, max_workers=None, **options):
+    """
+    Converte vários FBX em paralelo (options vão para load_fbx_model).
+    max_workers=0 carrega tudo neste processo, na ordem (útil para depurar).
+    Retorna uma lista de AssetResult na mesma ordem de paths.
+    """
+    results = [AssetResult(path) for path in paths]
+    start = time.perf_counter()
+
+    if max_workers == 0:
+        for result in results:
+            _collect(_load_asset_worker(result.path, options), result)
+            _release_worker_blocks()
+    else:
+        workers = max_workers or min(len(paths), os.cpu_count() or 1)
+        try:
+            # "spawn" em todas as plataformas: o processo principal já tem um
+            # contexto OpenGL/pygame, que não deve ser duplicado por fork
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = [pool.submit(_load_asset_worker, result.path, options) for result in results]
+                for result, future in zip(results, futures):
+                    try:
+                        _collect(future.result(), result)
+                    except Exception as e:
+                        # Processo filho morreu (ex.: crash no SDK) ou bloco inacessível
+                        result.error = f"{type(e).__name__}: {e}"
+        except OSError as e:
+            # Sem suporte a processos neste ambiente: carrega sequencialmente
+            print(f"⚠️ Pool de processos indisponível ({e}); carregando em sequência.")
+            return load_assets(paths, max_workers=0, **options)
+
+    print(f"⏱️ {len(paths)} assets em {time.perf_counter() - start:.2f}s")
+    return results
+
+
+def _release_worker_blocks():
+    # Modo sequencial: o "filho" é este processo e o bloco já foi desvinculado
+    while _WORKER_BLOCKS:
+        _WORKER_BLOCKS.pop().close()
+
+
+def print_asset_report(results):
+    """Tempos por etapa e motivo de cada falha"""
+    print("📦 Assets:")
+    for result in results:
+        steps = ", ".join(f"{step} {seconds * 1000:.0f}ms" for step, seconds in result.timings.items())
+        if result.ok:
+            print(f"   ✅ {result.name}: {steps}")
+        else:
+            print(f"   ❌ {result.name}: {result.error} ({steps or 'sem tempos'})")
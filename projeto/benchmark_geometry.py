@@ -0,0 +1,108 @@
+import time
+import argparse
+import numpy as np
+from geometry_utils import compute_faces_normals, compute_vertices_normals, compute_bounding_box
+
+# ==========================================
+# BENCHMARK: NORMAIS E BOUNDING BOX (LAÇO x VETORIZADO)
+# ==========================================
+#
+# python benchmark_geometry.py                 -> 1k, 10k, 100k, 1M e 5M triângulos
+# python benchmark_geometry.py --max-antigo 1e6
+#
+# As versões em laço abaixo são cópias das implementações originais de
+# geometry_utils, mantidas só para comparação (tempo e resultado).
+
+
+def _old_compute_faces_normals(vertices_pos, faces):
+    faces_normals = []
+    for face in faces:
+        p0 = vertices_pos[face[0][0]]
+        p1 = vertices_pos[face[1][0]]
+        p2 = vertices_pos[face[2][0]]
+        face_normal = np.cross(p1 - p0, p2 - p0)
+        norm = np.linalg.norm(face_normal)
+        if norm > 1e-8:
+            face_normal = face_normal / norm
+        faces_normals.append(face_normal)
+    return np.array(faces_normals, dtype=np.float32)
+
+
+def _old_compute_vertices_normals(vertices_pos, faces):
+    vertices_normals = np.zeros_like(vertices_pos)
+    faces_normals = _old_compute_faces_normals(vertices_pos, faces)
+    for i in range(len(faces)):
+        for j in range(len(faces[i])):
+            vertices_normals[faces[i][j]] += faces_normals[i]
+    normals_normalized = []
+    for normal in vertices_normals:
+        norm = np.linalg.norm(normal)
+        if norm > 1e-8:
+            normal = normal / norm
+        normals_normalized.append(normal.tolist())
+    return np.array(normals_normalized, dtype=np.float32)
+
+
+def _old_compute_bounding_box(vertices_pos, faces):
+    used_vertices = []
+    for face in faces:
+        for face_vertex in face:
+            used_vertices.append(vertices_pos[face_vertex[0]])
+    xv, yv, zv = zip(*used_vertices)
+    return np.array([[min(xv), min(yv), min(zv)], [max(xv), max(yv), max(zv)]], dtype=np.float32)
+
+
+def synthetic_mesh(triangle_count, seed=0):
+    """Grade ondulada com ~triangle_count triângulos, faces no formato (F, 3, 1) dos loaders"""
+    n = max(2, int(np.ceil(np.sqrt(triangle_count / 2.0))) + 1)
+    rng = np.random.default_rng(seed)
+    xs, zs = np.meshgrid(np.arange(n, dtype=np.float32), np.arange(n, dtype=np.float32))
+    ys = np.sin(xs * 0.3) * np.cos(zs * 0.2) + rng.normal(0, 0.01, xs.shape).astype(np.float32)
+    vertices_pos = np.stack([xs, ys, zs], axis=-1).reshape(-1, 3)
+
+    cell = (np.arange(n - 1)[:, None] * n + np.arange(n - 1)[None, :]).ravel()
+    quads = np.stack([cell, cell + n, cell + 1, cell + 1, cell + n, cell + n + 1], axis=1)
+    faces = quads.reshape(-1, 3)[:triangle_count]
+    return vertices_pos, faces.astype(np.uint32)[:, :, None]
+
+
+def _time(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def run(sizes, max_old):
+    print(f"{'triângulos':>12} | {'função':<24} | {'laço (s)':>9} | {'vetor (s)':>9} | {'ganho':>8}")
+    print("-" * 75)
+    for size in sizes:
+        vertices_pos, faces = synthetic_mesh(size)
+        cases = [
+            ("compute_faces_normals", _old_compute_faces_normals, compute_faces_normals),
+            ("compute_vertices_normals", _old_compute_vertices_normals, compute_vertices_normals),
+            ("compute_bounding_box", _old_compute_bounding_box, compute_bounding_box),
+        ]
+        for name, old_fn, new_fn in cases:
+            t_new, new = _time(new_fn, vertices_pos, faces)
+            if len(faces) <= max_old:
+                t_old, old = _time(old_fn, vertices_pos, faces)
+                assert np.allclose(old, new, atol=1e-4), f"{name}: resultados diferentes"
+                old_txt, gain_txt = f"{t_old:9.3f}", f"{t_old / max(t_new, 1e-9):7.1f}x"
+            else:
+                old_txt, gain_txt = f"{'—':>9}", f"{'—':>8}"
+            print(f"{len(faces):>12} | {name:<24} | {old_txt} | {t_new:9.3f} | {gain_txt}")
+
+        # Pesos alternativos (só na versão vetorizada)
+        for weighting in ("area", "angle"):
+            t_new, _ = _time(compute_vertices_normals, vertices_pos, faces, weighting)
+            print(f"{len(faces):>12} | {'  normais (' + weighting + ')':<24} | {'—':>9} | {t_new:9.3f} | {'—':>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara as versões em laço e vetorizadas de geometry_utils.")
+    parser.add_argument("--tamanhos", type=float, nargs="+", default=[1e3, 1e4, 1e5, 1e6, 5e6],
+                        help="Números de triângulos das malhas sintéticas")
+    parser.add_argument("--max-antigo", type=float, default=1e5,
+                        help="Maior malha em que a versão em laço também roda (ela é lenta)")
+    args = parser.parse_args()
+    run([int(s) for s in args.tamanhos], int(args.max_antigo))
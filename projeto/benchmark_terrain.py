@@ -0,0 +1,78 @@
+import time
+import math
+import argparse
+import numpy as np
+import glm
+from heightfield import ChunkedHeightfield, generate_heightmap
+from culling import extract_frustum_planes
+
+# ==========================================
+# BENCHMARK: TERRENO EM BLOCOS COM LOD x MALHA INTEIRA
+# ==========================================
+#
+# python benchmark_terrain.py                       -> mapas 513², 1025² e 2049²
+# python benchmark_terrain.py --tamanhos 4097 --erro 1 4
+#
+# Uma câmera percorre um círculo sobre o terreno procedural. Para cada quadro
+# conta os triângulos enviados no passe principal e no de sombra:
+#   - malha inteira: a grade completa nos dois passes (como o terreno.obj)
+#   - blocos: nível por erro na tela + culling dos blocos no frustum
+#     (o passe de sombra usa os mesmos níveis, sem culling)
+# Não precisa de OpenGL: mede só a seleção feita na CPU a cada quadro.
+
+
+def camera_path(frames, extent, height_scale):
+    """Posições e pontos de mira numa volta de raio extent/2, pouco acima do relevo"""
+    angles = np.linspace(0, 2 * np.pi, frames, endpoint=False)
+    radius = extent * 0.5
+    eyes = np.stack([radius * np.cos(angles), np.full(frames, height_scale * 1.2), radius * np.sin(angles)], axis=1)
+    targets = np.stack([radius * np.cos(angles + 0.3), np.full(frames, height_scale * 0.5),
+                        radius * np.sin(angles + 0.3)], axis=1)
+    return eyes, targets
+
+
+def run(sizes, pixel_errors, frames, chunk_size, extent=300.0, height_scale=30.0, width=1200, height=800, fov=60.0):
+    projection = glm.perspective(math.radians(fov), width / height, 0.1, 500.0)
+    projection_scale = height / (2.0 * math.tan(math.radians(fov) / 2.0))
+
+    print(f"{'amostras':>10} | {'erro px':>7} | {'malha inteira':>14} | {'blocos':>10} | {'redução':>8} | "
+          f"{'blocos vis.':>11} | {'seleção (ms)':>12}")
+    print("-" * 92)
+    for size in sizes:
+        start = time.perf_counter()
+        heightfield = ChunkedHeightfield(generate_heightmap(size), extent, height_scale, chunk_size)
+        build_time = time.perf_counter() - start
+        whole = 2 * heightfield.full_triangles
+        eyes, targets = camera_path(frames, extent, height_scale)
+
+        for pixel_error in pixel_errors:
+            triangles, visible_chunks, select_time = 0, 0, 0.0
+            for eye, target in zip(eyes, targets):
+                view = glm.lookAt(glm.vec3(*eye), glm.vec3(*target), glm.vec3(0, 1, 0))
+                planes = extract_frustum_planes(np.array(projection * view))
+                start = time.perf_counter()
+                lods = heightfield.select_lods(eye, projection_scale, pixel_error)
+                chunks = heightfield.visible_chunks(planes)
+                select_time += time.perf_counter() - start
+                all_chunks = np.arange(heightfield.chunk_count)
+                triangles += heightfield.triangle_count(chunks, lods) + heightfield.triangle_count(all_chunks, lods)
+                visible_chunks += len(chunks)
+
+            per_frame = triangles / frames
+            print(f"{size:>9}² | {pixel_error:7.1f} | {whole:14,d} | {int(per_frame):10,d} | "
+                  f"{whole / max(per_frame, 1):7.1f}x | {visible_chunks / frames:5.0f}/{heightfield.chunk_count:<5d} | "
+                  f"{select_time / frames * 1000:12.3f}")
+        memory = heightfield.vertices.nbytes + heightfield.indices.nbytes
+        print(f"{'':>10}   construção: {build_time:.2f}s, {memory / 2**20:.1f} MB de vértices + índices")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Triângulos enviados por quadro: terreno em blocos com LOD x malha inteira.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[513, 1025, 2049],
+                        help="Lados dos mapas de alturas procedurais (amostras)")
+    parser.add_argument("--erro", type=float, nargs="+", default=[1.0, 2.0, 4.0],
+                        help="Erros máximos na tela (pixels) a comparar")
+    parser.add_argument("--quadros", type=int, default=120, help="Quadros do percurso da câmera")
+    parser.add_argument("--bloco", type=int, default=64, help="Quads por lado de cada bloco (potência de 2)")
+    args = parser.parse_args()
+    run(args.tamanhos, args.erro, args.quadros, args.bloco)
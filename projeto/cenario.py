@@ -1,33 +1,398 @@
 import numpy as np
-import glm
+from OpenGL.GL import *
+from culling import SpatialGrid, extract_frustum_planes
+from gl_state import DrawList
+from material_array import NO_MATERIAL
+
+# Registro por instância no VBO: mat4 de modelo (locations 3..6) + vec4 de material (location 7)
+INSTANCE_STRIDE = 80
+
+def build_model_matrices(positions, yaw_degrees, scales):
+    """
+    Monta em lote as matrizes T * Ry * S de várias instâncias.
+
+    Equivale a glm.translate -> glm.rotate (eixo Y) -> glm.scale, mas já no
+    layout do OpenGL: matrices[i] é a transposta da matriz matemática
+    (cada linha do array é uma coluna da mat4), pronta para o VBO de instâncias.
+    """
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+    yaw = np.radians(np.asarray(yaw_degrees, dtype=np.float32))
+    s = np.asarray(scales, dtype=np.float32)
+    c, si = np.cos(yaw) * s, np.sin(yaw) * s
+
+    matrices = np.zeros((len(positions), 4, 4), dtype=np.float32)
+    # Coluna 0: eixo X rotacionado | Coluna 1: eixo Y | Coluna 2: eixo Z | Coluna 3: translação
+    matrices[:, 0, 0] = c
+    matrices[:, 0, 2] = -si
+    matrices[:, 1, 1] = s
+    matrices[:, 2, 0] = si
+    matrices[:, 2, 2] = c
+    matrices[:, 3, :3] = positions
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+class InstanceStore:
+    """
+    Transformações de todas as instâncias em estrutura de arrays (SoA).
+
+    positions (N,3), yaw (N,) em graus, scale (N,), model_ids (N,),
+    materials (N,4) (vec4 de material por instância, ver material_array) e as
+    matrizes (N,4,4) em cache no layout do OpenGL. As alterações só marcam a
+    máscara dirty; update() recalcula todas as matrizes sujas de uma vez.
+    frame conta os update(); revisions[i] é o frame em que o registro de i
+    mudou pela última vez (quem envia registros à GPU compara com o seu último envio).
+    Os arrays têm folga (capacity), os dados válidos são [:count].
+    """
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.capacity = 0
+        self.frame = 0
+        self.positions = np.zeros((0, 3), dtype=np.float32)
+        self.yaw = np.zeros(0, dtype=np.float32)
+        self.scale = np.zeros(0, dtype=np.float32)
+        self.model_ids = np.zeros(0, dtype=np.int32)
+        self.materials = np.zeros((0, 4), dtype=np.float32)
+        self.matrices = np.zeros((0, 4, 4), dtype=np.float32)
+        self.dirty = np.zeros(0, dtype=bool)
+        self.revisions = np.zeros(0, dtype=np.int64)
+        self._reserve(capacity)
+
+    def _reserve(self, needed):
+        if needed <= self.capacity:
+            return
+        new_capacity = max(needed, self.capacity * 2, 16)
+
+        def grow(arr, fill=0):
+            out = np.full((new_capacity,) + arr.shape[1:], fill, dtype=arr.dtype)
+            out[:self.count] = arr[:self.count]
+            return out
+
+        self.positions = grow(self.positions)
+        self.yaw = grow(self.yaw)
+        self.scale = grow(self.scale, 1)
+        self.model_ids = grow(self.model_ids)
+        self.materials = grow(self.materials, -1)
+        self.matrices = grow(self.matrices)
+        self.dirty = grow(self.dirty, False)
+        self.revisions = grow(self.revisions)
+        self.capacity = new_capacity
+
+    def add_many(self, positions, yaw, scale, model_ids, materials=NO_MATERIAL):
+        """Adiciona várias instâncias de uma vez; retorna seus índices"""
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        n = len(positions)
+        self._reserve(self.count + n)
+
+        idx = np.arange(self.count, self.count + n)
+        self.positions[idx] = positions
+        self.yaw[idx] = yaw
+        self.scale[idx] = scale
+        self.model_ids[idx] = model_ids
+        self.materials[idx] = materials
+        self.dirty[idx] = True
+        # Novas: contam como alteradas para qualquer envio até o próximo update()
+        self.revisions[idx] = self.frame + 1
+        self.count += n
+        return idx
+
+    def set_transform(self, indices, pos=None, yaw=None, scale=None):
+        """Altera pos/yaw/scale de uma ou várias instâncias e marca como sujas"""
+        if pos is not None: self.positions[indices] = pos
+        if yaw is not None: self.yaw[indices] = yaw
+        if scale is not None: self.scale[indices] = scale
+        self.dirty[indices] = True
+
+    def set_material(self, indices, material):
+        """Troca o vec4 de material (ex.: outra camada do MaterialArray) de uma ou várias instâncias"""
+        self.materials[indices] = material
+        self.dirty[indices] = True
+
+    def instance_records(self, indices):
+        """Registros do VBO de instâncias: mat4 (16 floats) + vec4 de material, 80 bytes cada"""
+        records = np.empty((len(indices), 20), dtype=np.float32)
+        records[:, :16] = self.matrices[indices].reshape(-1, 16)
+        records[:, 16:] = self.materials[indices]
+        return records
+
+    def update(self):
+        """
+        Recalcula em um único passo vetorizado as matrizes sujas.
+        Retorna a máscara (count,) das instâncias que mudaram neste frame.
+        """
+        self.frame += 1
+        changed = self.dirty[:self.count].copy()
+        idx = np.flatnonzero(changed)
+        if len(idx) > 0:
+            self.matrices[idx] = build_model_matrices(self.positions[idx], self.yaw[idx], self.scale[idx])
+            self.dirty[idx] = False
+            self.revisions[idx] = self.frame
+        return changed
 
 class Instancia:
+    """
+    Alça para uma instância do InstanceStore.
+
+    Antes de ser adicionada ao Cenario guarda os valores iniciais; depois,
+    pos/rot/scale leem e escrevem direto no store (marcando a instância suja).
+    """
     def __init__(self, personagem, pos, rot=0, scale=1.0):
         self.personagem = personagem
-        self.pos = np.array(pos, dtype=np.float32)
-        self.rot = rot
-        self.scale = scale
+        self.store = None
+        self.index = -1
+        self._initial = (np.array(pos, dtype=np.float32), rot, scale)
+
+    def attach(self, store, index):
+        self.store = store
+        self.index = index
+
+    @property
+    def pos(self):
+        return self.store.positions[self.index] if self.store else self._initial[0]
+
+    @pos.setter
+    def pos(self, value):
+        self.store.set_transform(self.index, pos=value)
+
+    @property
+    def rot(self):
+        return float(self.store.yaw[self.index]) if self.store else self._initial[1]
+
+    @rot.setter
+    def rot(self, value):
+        self.store.set_transform(self.index, yaw=value)
+
+    @property
+    def scale(self):
+        return float(self.store.scale[self.index]) if self.store else self._initial[2]
+
+    @scale.setter
+    def scale(self, value):
+        self.store.set_transform(self.index, scale=value)
 
     def model_matrix(self):
-        x, y, z = self.pos
-        s = self.scale
-        
-        # Criar matriz com glm
-        model = glm.mat4(1.0)
-        model = glm.translate(model, glm.vec3(x, y, z))
-        model = glm.rotate(model, glm.radians(self.rot), glm.vec3(0, 1, 0))
-        model = glm.scale(model, glm.vec3(s, s, s))
-        
-        # Converter glm para numpy array
-        return np.array(model, dtype=np.float32)
+        # Matriz matemática (por linhas), como a antiga versão via glm
+        return build_model_matrices(self.pos, [self.rot], [self.scale])[0].T.copy()
+
+class LoteInstancias:
+    """
+    VBO de instâncias + VAO de um personagem para um passe de renderização.
+
+    Cada passe (cena, sombra...) desenha um subconjunto diferente das
+    instâncias, então cada um tem seu próprio buffer compactado. Se a seleção
+    for a mesma do último envio, só as instâncias alteradas desde esse envio
+    (InstanceStore.revisions > synced_frame) são reenviadas; vale também para
+    passes que ficam frames sem desenhar, como as cascatas adiadas.
+    """
+    def __init__(self, personagem):
+        self.instance_vbo = glGenBuffers(1)
+        self.vao = personagem.create_instanced_vao(self.instance_vbo)
+        self.capacity = 0
+        self.selection = None
+        self.synced_frame = -1
+
+    def upload(self, store, selection):
+        same = self.selection is not None and np.array_equal(selection, self.selection)
+        synced, self.synced_frame = self.synced_frame, store.frame
+        if same:
+            dirty_slots = np.flatnonzero(store.revisions[selection] > synced)
+            if len(dirty_slots) == 0:
+                return
+            first, last = dirty_slots[0], dirty_slots[-1]
+        else:
+            first, last = 0, len(selection) - 1
+            self.selection = selection.copy()
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        if len(selection) > self.capacity:
+            # Realoca com folga para evitar realocações a cada frame
+            self.capacity = max(len(selection), self.capacity * 2)
+            glBufferData(GL_ARRAY_BUFFER, self.capacity * INSTANCE_STRIDE, None, GL_DYNAMIC_DRAW)
+            first, last = 0, len(selection) - 1
+
+        data = store.instance_records(selection[first:last + 1])
+        glBufferSubData(GL_ARRAY_BUFFER, int(first) * INSTANCE_STRIDE, data.nbytes, data)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+class GrupoInstancias:
+    """
+    Todas as instâncias de um mesmo PersonagemFBX.
+
+    Guarda os índices das suas instâncias no InstanceStore e, por passe,
+    um LoteInstancias com as matrizes das instâncias a desenhar (divisor 1).
+    """
+    def __init__(self, personagem):
+        self.personagem = personagem
+        self.indices = np.zeros(0, dtype=np.int64)
+        self.lotes = {}
+
+    def add(self, store_indices):
+        self.indices = np.concatenate([self.indices, np.asarray(store_indices, dtype=np.int64)])
+
+    def submit(self, draw_list, program, store, selection, pass_name, bind_textures=True):
+        if len(selection) == 0:
+            return
+        lote = self.lotes.get(pass_name)
+        if lote is None:
+            lote = LoteInstancias(self.personagem)
+            self.lotes[pass_name] = lote
+        lote.upload(store, selection)
+        self.personagem.submit_instanced(draw_list, program, lote.vao, len(selection), bind_textures)
 
 class Cenario:
-    def __init__(self):
+    def __init__(self, cell_size=32.0):
+        self.store = InstanceStore()
         self.instancias = []
+        self.modelos = []
+        self.grupos = {}
+        
+        # Culling: esfera local de cada modelo + grade espacial das instâncias
+        self.local_centers = np.zeros((0, 3), dtype=np.float32)
+        self.local_radii = np.zeros(0, dtype=np.float32)
+        # Base (menor y local) de cada modelo, para apoiar as instâncias no chão
+        self.local_bottoms = np.zeros(0, dtype=np.float32)
+        self.spatial_index = SpatialGrid(cell_size)
+        self.changed = np.zeros(0, dtype=bool)
+        # Incrementada sempre que alguma instância é adicionada ou se move
+        # (usada para invalidar caches, ex.: o mapa de sombras)
+        self.version = 0
+        self.cull_stats = dict(self.spatial_index.stats)
+        # MeshBatch com todas as malhas (um desenho por passe); None = um draw por personagem
+        self.batch = None
+        # GpuCuller sobre o batch: culling + comandos indiretos num compute shader (GL 4.3)
+        self.gpu_culler = None
+
+    def _model_id(self, personagem):
+        grupo = self.grupos.get(personagem)
+        if grupo is None:
+            grupo = GrupoInstancias(personagem)
+            self.grupos[personagem] = grupo
+            self.modelos.append(personagem)
+            center = getattr(personagem, "bounding_center", np.zeros(3))
+            radius = getattr(personagem, "bounding_radius", 1.0)
+            self.local_centers = np.vstack([self.local_centers, np.asarray(center, dtype=np.float32)])
+            self.local_radii = np.append(self.local_radii, np.float32(radius))
+            bbox = getattr(personagem, "bounding_box", None)
+            self.local_bottoms = np.append(self.local_bottoms, np.float32(bbox[0][1] if bbox is not None else 0.0))
+            if self.batch is not None:
+                print("⚠️ Novo modelo fora do lote único: voltando a um draw por personagem.")
+                self.batch = None
+                self.gpu_culler = None
+        return self.modelos.index(personagem)
+
+    def set_batch(self, batch):
+        """Usa um MeshBatch (criado com self.modelos, na mesma ordem) para desenhar todos os personagens"""
+        if batch is not None and batch.personagens != self.modelos:
+            raise ValueError("MeshBatch precisa ter as malhas de Cenario.modelos, na mesma ordem")
+        self.batch = batch
+        if batch is None:
+            self.gpu_culler = None
+
+    def set_gpu_culler(self, culler):
+        """Faz o culling do passe principal na GPU (GpuCuller criado sobre self.batch)"""
+        if culler is not None and culler.batch is not self.batch:
+            raise ValueError("GpuCuller precisa usar o MeshBatch do cenário (set_batch antes)")
+        self.gpu_culler = culler
+
+    def _material(self, personagem):
+        """vec4 de material padrão das instâncias de um personagem"""
+        return getattr(personagem, "material", NO_MATERIAL)
 
     def add(self, inst):
+        pos, rot, scale = inst._initial
+        model_id = self._model_id(inst.personagem)
+        index = self.store.add_many(pos, rot, scale, model_id, self._material(inst.personagem))
+        inst.attach(self.store, int(index[0]))
         self.instancias.append(inst)
+        self.grupos[inst.personagem].add(index)
+
+    def add_many(self, personagem, positions, yaw, scale):
+        """Adiciona várias instâncias de um mesmo personagem em uma só operação"""
+        model_id = self._model_id(personagem)
+        indices = self.store.add_many(positions, yaw, scale, model_id, self._material(personagem))
+        for index in indices:
+            inst = Instancia(personagem, self.store.positions[index])
+            inst.attach(self.store, int(index))
+            self.instancias.append(inst)
+        self.grupos[personagem].add(indices)
+        return indices
+
+    def snap_to_ground(self, terrain, indices=None):
+        """
+        Apoia as instâncias (todas se indices for None) no terreno em uma
+        consulta vetorizada: y = altura em (x, z) - base do modelo * escala.
+        """
+        if indices is None:
+            indices = np.arange(self.store.count)
+        offsets = -self.local_bottoms[self.store.model_ids[indices]] * self.store.scale[indices]
+        self.store.set_transform(indices, pos=terrain.snap_to_ground(self.store.positions[indices], offsets))
+
+    def world_spheres(self, indices):
+        """Centros e raios das esferas envolventes em coordenadas de mundo"""
+        mats = self.store.matrices[indices]
+        model_ids = self.store.model_ids[indices]
+        local = self.local_centers[model_ids]
+        # Layout OpenGL: mats[:, k] é a coluna k da matriz de modelo
+        centers = np.einsum("nk,nkj->nj", local, mats[:, :3, :3]) + mats[:, 3, :3]
+        radii = self.local_radii[model_ids] * np.abs(self.store.scale[indices])
+        return centers, radii
+
+    def update(self):
+        """
+        Uma vez por frame, antes dos passes de sombra e de cena: recalcula as
+        matrizes sujas e atualiza a grade espacial só com quem mudou.
+        """
+        self.changed = self.store.update()
+        moved = np.flatnonzero(self.changed)
+        if len(moved) > 0:
+            self.spatial_index.update(moved, *self.world_spheres(moved))
+            self.version += 1
+        if self.gpu_culler is not None:
+            self.gpu_culler.sync(self.store, self.changed)
+
+    def cull(self, proj_view):
+        """Índices das instâncias visíveis para a câmera (proj * view)"""
+        visible = self.spatial_index.query_frustum(proj_view)
+        self.cull_stats = dict(self.spatial_index.stats)
+        return visible
+
+    def submit_frustum(self, draw_list, program, proj_view, pass_name="main", hiz=None):
+        """
+        Culling + envio de um passe. Com gpu_culler o teste (frustum e, se
+        houver, Hi-Z) e a montagem dos comandos ficam no compute shader e nada
+        volta para a CPU; senão usa a grade espacial e submit().
+        """
+        if self.gpu_culler is None:
+            self.submit(draw_list, program, self.cull(proj_view), pass_name=pass_name)
+            return
+        self.gpu_culler.cull(extract_frustum_planes(proj_view), pass_name, hiz)
+        self.gpu_culler.submit(draw_list, program, pass_name)
+
+    def cull_planes(self, planes):
+        """Índices das instâncias que cruzam um volume qualquer (ex.: o da luz)"""
+        return self.spatial_index.query_planes(planes)
+
+    def submit(self, draw_list, program, visible=None, bind_textures=True, pass_name="main"):
+        """
+        Um glDrawElementsInstanced por personagem, só com as instâncias em
+        visible (todas se None), enviado para a DrawList do passe; com
+        self.batch, um único desenho para todos.
+        Os VBOs de instâncias são atualizados já aqui, antes dos desenhos.
+        """
+        if visible is None:
+            visible = np.arange(self.store.count)
+        visible_models = self.store.model_ids[visible]
+        
+        if self.batch is not None:
+            self.batch.submit(draw_list, program, self.store, visible, pass_name)
+            return
+        
+        for model_id, personagem in enumerate(self.modelos):
+            selection = visible[visible_models == model_id]
+            self.grupos[personagem].submit(draw_list, program, self.store, selection, pass_name, bind_textures)
 
-    def draw(self, program):
-        for inst in self.instancias:
-            inst.personagem.draw(program, inst.model_matrix())
\ No newline at end of file
+    def draw(self, program, visible=None, bind_textures=True, pass_name="main"):
+        """Atalho: envia e executa na hora uma DrawList só com os personagens"""
+        draw_list = DrawList()
+        self.submit(draw_list, program, visible, bind_textures, pass_name)
+        draw_list.execute()
+        program.set_int("useInstancing", 0)
@@ -0,0 +1,193 @@
+import numpy as np
+
+# ==========================================
+# FRUSTUM
+# ==========================================
+
+def extract_frustum_planes(proj_view):
+    """
+    Extrai os 6 planos (esq, dir, baixo, cima, perto, longe) de proj * view
+    pelo método de Gribb/Hartmann.
+
+    proj_view : matriz 4x4 matemática (np.array(glm.mat4) já vem por linhas)
+    Retorna (6, 4) com [nx, ny, nz, d] normalizados; um ponto p está dentro
+    do plano quando n·p + d >= 0.
+    """
+    m = np.asarray(proj_view, dtype=np.float64).reshape(4, 4)
+    planes = np.array([
+        m[3] + m[0], m[3] - m[0],
+        m[3] + m[1], m[3] - m[1],
+        m[3] + m[2], m[3] - m[2],
+    ])
+    planes /= np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+    return planes
+
+def spheres_in_frustum(planes, centers, radii):
+    """Teste vetorizado de esferas contra os planos; retorna máscara (N,)"""
+    if len(centers) == 0:
+        return np.zeros(0, dtype=bool)
+    dist = centers @ planes[:, :3].T + planes[:, 3]
+    return np.all(dist >= -radii[:, None], axis=1)
+
+def classify_aabbs(planes, box_min, box_max):
+    """
+    Classifica caixas contra o frustum.
+    Retorna (outside, inside): fora de algum plano / totalmente dentro de todos.
+    """
+    normals = planes[:, :3]
+    # Vértice "positivo" (mais à frente na direção da normal) e "negativo"
+    p_vertex = np.where(normals[None] >= 0, box_max[:, None], box_min[:, None])
+    n_vertex = np.where(normals[None] >= 0, box_min[:, None], box_max[:, None])
+    p_dist = np.einsum("kpj,pj->kp", p_vertex, normals) + planes[:, 3]
+    n_dist = np.einsum("kpj,pj->kp", n_vertex, normals) + planes[:, 3]
+    outside = np.any(p_dist < 0, axis=1)
+    inside = np.all(n_dist >= 0, axis=1)
+    return outside, inside
+
+def frustum_corners(proj_view):
+    """Os 8 cantos do frustum de proj * view em coordenadas de mundo (8, 3)"""
+    ndc = np.array([[x, y, z, 1.0] for z in (-1, 1) for y in (-1, 1) for x in (-1, 1)])
+    world = ndc @ np.linalg.inv(np.asarray(proj_view, dtype=np.float64)).T
+    return world[:, :3] / world[:, 3:4]
+
+def ortho_matrix(left, right, bottom, top, near, far):
+    """Mesma matriz de glm.ortho, em NumPy (por linhas)"""
+    m = np.identity(4)
+    m[0, 0] = 2.0 / (right - left)
+    m[1, 1] = 2.0 / (top - bottom)
+    m[2, 2] = -2.0 / (far - near)
+    m[0, 3] = -(right + left) / (right - left)
+    m[1, 3] = -(top + bottom) / (top - bottom)
+    m[2, 3] = -(far + near) / (far - near)
+    return m
+
+def shadow_caster_planes(light_view, ortho_bounds, camera_corners, margin=0.0):
+    """
+    Planos do volume de possíveis projetores de sombra.
+
+    É a interseção do volume ortográfico da luz com a extrusão do frustum da
+    câmera na direção da luz: em xy (espaço da luz) vale só a área coberta
+    pela câmera; em profundidade, do plano near da luz até o ponto mais
+    distante visto pela câmera. Objetos fora disso não sombreiam nada visível.
+
+    light_view   : matriz view da luz (por linhas)
+    ortho_bounds : (left, right, bottom, top, near, far) da projeção da luz
+    margin       : folga (metros) somada à área e à profundidade da câmera
+    Retorna (6, 4) ou None se a câmera não enxergar nada dentro da luz.
+    """
+    left, right, bottom, top, near, far = ortho_bounds
+    light_view = np.asarray(light_view, dtype=np.float64)
+    corners = np.c_[camera_corners, np.ones(len(camera_corners))] @ light_view.T
+
+    x0, x1 = max(left, corners[:, 0].min() - margin), min(right, corners[:, 0].max() + margin)
+    y0, y1 = max(bottom, corners[:, 1].min() - margin), min(top, corners[:, 1].max() + margin)
+    # A luz olha para -z: profundidade = -z
+    depth_far = min(far, -corners[:, 2].min() + margin)
+    if x0 >= x1 or y0 >= y1 or depth_far <= near:
+        return None
+
+    return extract_frustum_planes(ortho_matrix(x0, x1, y0, y1, near, depth_far) @ light_view)
+
+# ==========================================
+# GRADE UNIFORME "LOOSE" SOBRE AS INSTÂNCIAS
+# ==========================================
+
+class SpatialGrid:
+    """
+    Índice espacial das esferas envolventes das instâncias.
+
+    Cada instância pertence à célula que contém seu centro; a caixa de cada
+    célula é expandida pelo maior raio ("loose grid"), então uma instância
+    que se move dentro da mesma célula não exige nenhuma reconstrução.
+    Só quando alguma instância troca de célula a tabela de células (CSR) é
+    refeita, com um argsort vetorizado.
+
+    query_frustum() testa primeiro as células: as totalmente dentro aceitam
+    todos os membros, as de borda testam esfera por esfera.
+    """
+    def __init__(self, cell_size=32.0):
+        self.cell_size = float(cell_size)
+        self.count = 0
+        self.centers = np.zeros((0, 3), dtype=np.float64)
+        self.radii = np.zeros(0, dtype=np.float64)
+        self.cells = np.zeros((0, 3), dtype=np.int64)
+        self.max_radius = 0.0
+
+        self.order = np.zeros(0, dtype=np.int64)
+        self.cell_coords = np.zeros((0, 3), dtype=np.int64)
+        self.cell_start = np.zeros(1, dtype=np.int64)
+        self._needs_rebuild = False
+
+        self.stats = {"tested": 0, "sphere_tests": 0, "visible": 0, "culled": 0, "rebuilds": 0}
+
+    def update(self, indices, centers, radii):
+        """Insere/atualiza as esferas das instâncias indicadas (incremental)"""
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) == 0:
+            return
+
+        needed = int(indices.max()) + 1
+        if needed > len(self.radii):
+            grow = max(needed, 2 * len(self.radii))
+            self.centers = np.resize(self.centers, (grow, 3))
+            self.radii = np.resize(self.radii, grow)
+            old_cells = self.cells
+            self.cells = np.full((grow, 3), np.iinfo(np.int64).min, dtype=np.int64)
+            self.cells[:len(old_cells)] = old_cells
+        self.count = max(self.count, needed)
+
+        self.centers[indices] = centers
+        self.radii[indices] = radii
+        self.max_radius = max(self.max_radius, float(np.max(radii)))
+
+        new_cells = np.floor(np.asarray(centers) / self.cell_size).astype(np.int64)
+        if np.any(new_cells != self.cells[indices]):
+            self.cells[indices] = new_cells
+            self._needs_rebuild = True
+
+    def _rebuild(self):
+        cells = self.cells[:self.count]
+        self.cell_coords, inverse = np.unique(cells, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        self.order = np.argsort(inverse, kind="stable")
+        counts = np.bincount(inverse, minlength=len(self.cell_coords))
+        self.cell_start = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.cell_start[1:])
+        self._needs_rebuild = False
+        self.stats["rebuilds"] += 1
+
+    def query_planes(self, planes):
+        """Índices (ordenados) das instâncias cujas esferas cruzam os planos"""
+        if self.count == 0:
+            return np.zeros(0, dtype=np.int64)
+        if self._needs_rebuild:
+            self._rebuild()
+
+        box_min = self.cell_coords * self.cell_size - self.max_radius
+        box_max = (self.cell_coords + 1) * self.cell_size + self.max_radius
+        outside, inside = classify_aabbs(planes, box_min, box_max)
+
+        starts, ends = self.cell_start[:-1], self.cell_start[1:]
+
+        def members(cell_mask):
+            cell_ids = np.flatnonzero(cell_mask)
+            if len(cell_ids) == 0:
+                return np.zeros(0, dtype=np.int64)
+            lengths = ends[cell_ids] - starts[cell_ids]
+            offsets = np.repeat(starts[cell_ids] - np.cumsum(lengths) + lengths, lengths)
+            return self.order[offsets + np.arange(lengths.sum())]
+
+        accepted = members(inside)
+        border = members(~outside & ~inside)
+        self.stats["sphere_tests"] = len(border)
+        border = border[spheres_in_frustum(planes, self.centers[border], self.radii[border])]
+
+        visible = np.sort(np.concatenate([accepted, border]))
+        self.stats["tested"] = self.count
+        self.stats["visible"] = len(visible)
+        self.stats["culled"] = self.count - len(visible)
+        return visible
+
+    def query_frustum(self, proj_view):
+        """Atalho: extrai os planos de proj * view e consulta a grade"""
+        return self.query_planes(extract_frustum_planes(proj_view))
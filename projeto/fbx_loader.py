@@ -2,6 +2,27 @@ import numpy as np
 import fbx
 import os
 from FbxCommon import InitializeSdkObjects, LoadScene
+import mesh_cache
+from mesh_optimizer import weld_vertices, optimize_mesh
+
+# Incrementar sempre que a saída do loader mudar (invalida o cache em disco)
+LOADER_VERSION = 2
+
+# Mapas de material extraídos -> propriedades do FbxSurfaceMaterial que os
+# alimentam (em ordem de preferência) e sufixos usados na busca por nome
+MATERIAL_PROPERTIES = {
+    "diffuse": ("DiffuseColor",),
+    "normal": ("NormalMap", "Bump"),
+    "specular": ("SpecularColor", "SpecularFactor", "ShininessExponent"),
+    "emission": ("EmissiveColor", "EmissiveFactor"),
+}
+MATERIAL_SUFFIXES = {
+    "diffuse": ("_diffuse", "_albedo", "_basecolor", "_base_color", "_color", "_diffuse_transparent"),
+    "normal": ("_normal", "_normalmap", "_nrm", "_bump"),
+    "specular": ("_specular", "_spec", "_metallic", "_roughness"),
+    "emission": ("_emission", "_emissive", "_glow"),
+}
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tga')
 
 # ==========================================
 # FUNÇÕES AUXILIARES
@@ -25,17 +46,41 @@ def normalize_fbx_scale(vertices, target_size=2.0):
     print(f"📐 Escala ajustada: {max_dimension:.2f} -> {target_size} (fator: {scale_factor:.3f})")
     return normalized_vertices
 
-def find_texture_for_fbx(fbx_path, mesh_node):
-    """Tenta encontrar a textura automaticamente na pasta do modelo"""
+def classify_texture_files(files):
+    """
+    Separa nomes de imagem por tipo de mapa pelo sufixo (Vampire_normal.png -> "normal").
+    Sufixos mais específicos vêm primeiro na lista de cada tipo, então
+    Vampire_diffuse.png ganha de Vampire_diffuse_transparent.png.
+    """
+    found = {}
+    stems = {file: os.path.splitext(file)[0].lower() for file in sorted(files)
+             if file.lower().endswith(IMAGE_EXTENSIONS)}
+    for kind, suffixes in MATERIAL_SUFFIXES.items():
+        for suffix in suffixes:
+            match = next((file for file, stem in stems.items() if stem.endswith(suffix)), None)
+            if match:
+                found[kind] = match
+                break
+    return found
+
+def find_texture_for_fbx(fbx_path, mesh_node=None):
+    """Tenta encontrar a textura difusa automaticamente na pasta do modelo"""
     model_dir = os.path.dirname(fbx_path)
     fbx_name = os.path.splitext(os.path.basename(fbx_path))[0]
     
-    # 1. Tenta pasta .fbm
+    # 1. Tenta pasta .fbm: o mapa difuso pelo nome; senão a primeira imagem
+    #    sem sufixo de mapa. Mapas normal/specular/emission nunca viram difuso
+    #    (se só houver eles, segue para os nomes comuns)
     fbm_dir = os.path.join(model_dir, fbx_name + ".fbm")
     if os.path.exists(fbm_dir):
-        for file in os.listdir(fbm_dir):
-            if file.lower().endswith(('.png', '.jpg', '.jpeg', '.tga')):
-                return os.path.join(fbm_dir, file)
+        files = sorted(os.listdir(fbm_dir))
+        classified = classify_texture_files(files)
+        if "diffuse" in classified:
+            return os.path.join(fbm_dir, classified["diffuse"])
+        maps = set(classified.values())
+        others = [f for f in files if f.lower().endswith(IMAGE_EXTENSIONS) and f not in maps]
+        if others:
+            return os.path.join(fbm_dir, others[0])
     
     # 2. Tenta nomes comuns
     common_names = [
@@ -50,14 +95,194 @@ def find_texture_for_fbx(fbx_path, mesh_node):
             
     return None
 
+def resolve_texture_file(filename, fbx_path):
+    """
+    Caminho local de uma textura referenciada no FBX. O caminho gravado
+    costuma ser o da máquina do autor: tenta como está, relativo ao modelo
+    e, por fim, pelo nome dentro da pasta .fbm.
+    """
+    if not filename:
+        return None
+    model_dir = os.path.dirname(fbx_path)
+    fbm_dir = os.path.splitext(fbx_path)[0] + ".fbm"
+    base = os.path.basename(filename.replace("\\", "/"))
+    for candidate in (filename, os.path.join(model_dir, filename), os.path.join(fbm_dir, base), os.path.join(model_dir, base)):
+        if os.path.isfile(candidate):
+            return os.path.normpath(candidate)
+    return None
+
+def _property_texture(material, property_name):
+    """Nome do arquivo da primeira FbxFileTexture ligada à propriedade (ou None)"""
+    prop = material.FindProperty(property_name)
+    if not prop.IsValid():
+        return None
+    criteria = fbx.FbxCriteria.ObjectType(fbx.FbxFileTexture.ClassId)
+    for i in range(prop.GetSrcObjectCount(criteria)):
+        texture = prop.GetSrcObject(criteria, i)
+        if texture is not None and texture.GetFileName():
+            return texture.GetFileName()
+    return None
+
+def extract_materials(fbx_path, mesh_node):
+    """
+    Mapas difuso, normal, especular e de emissão da malha, lidos das conexões
+    material -> textura do FBX. Tipos sem conexão são completados pelos nomes
+    dos arquivos da pasta .fbm. Retorna {tipo: caminho ou None}.
+    """
+    materials = dict.fromkeys(MATERIAL_PROPERTIES)
+    for m in range(mesh_node.GetMaterialCount()):
+        material = mesh_node.GetMaterial(m)
+        for kind, properties in MATERIAL_PROPERTIES.items():
+            if materials[kind]:
+                continue
+            for property_name in properties:
+                path = resolve_texture_file(_property_texture(material, property_name), fbx_path)
+                if path:
+                    materials[kind] = path
+                    break
+
+    fbm_dir = os.path.splitext(fbx_path)[0] + ".fbm"
+    if os.path.isdir(fbm_dir):
+        for kind, file in classify_texture_files(os.listdir(fbm_dir)).items():
+            if not materials[kind]:
+                materials[kind] = os.path.join(fbm_dir, file)
+    if not materials["diffuse"]:
+        materials["diffuse"] = find_texture_for_fbx(fbx_path, mesh_node)
+    return materials
+
+def fbx_vectors_to_numpy(vectors, components):
+    """Converte uma sequência de FbxVector2/FbxVector4 em um array (N, components)"""
+    if len(vectors) == 0:
+        return np.zeros((0, components), dtype=np.float64)
+    return np.array([[v[c] for c in range(components)] for v in vectors], dtype=np.float64)
+
+def layer_array_to_numpy(array, dtype):
+    """
+    Copia um FbxLayerElementArray inteiro (DirectArray/IndexArray) com uma
+    única leitura do buffer interno: GetLocked(eReadLock) devolve o ponteiro
+    para os elementos contíguos (FbxVector4 = 4 doubles, FbxVector2 = 2,
+    int = 1) e GetStride o tamanho de cada um. Retorna (N, stride / itemsize)
+    ou None se o SDK não liberar o ponteiro.
+    """
+    count = array.GetCount()
+    if count == 0:
+        return np.zeros((0, 1), dtype=dtype)
+    pointer = array.GetLocked(fbx.FbxLayerElementArray.eReadLock)
+    if not pointer:
+        return None
+    try:
+        stride = array.GetStride()
+        data = np.frombuffer(pointer.asstring(count * stride), dtype=dtype)
+    finally:
+        array.ReadUnlock()
+    return data.reshape(count, -1)
+
+def fbx_direct_array_to_numpy(direct, components):
+    """DirectArray de FbxVector2/FbxVector4 -> (N, components) float64; elemento a elemento só se GetLocked falhar"""
+    data = layer_array_to_numpy(direct, np.float64)
+    if data is None:
+        return fbx_vectors_to_numpy([direct.GetAt(i) for i in range(direct.GetCount())], components)
+    return data[:, :components]
+
+def fbx_int_array_to_numpy(int_array):
+    """Converte um FbxLayerElementArrayTemplate<int> (IndexArray) em array NumPy"""
+    data = layer_array_to_numpy(int_array, np.int32)
+    if data is None:
+        return np.array([int_array.GetAt(i) for i in range(int_array.GetCount())], dtype=np.int64)
+    return data[:, 0].astype(np.int64)
+
+def resolve_layer_element(element, corner_cp, components):
+    """
+    Resolve um layer element (normal, UV...) para um valor por canto de polígono.
+    
+    Lê DirectArray/IndexArray uma vez e trata todos os modos de mapeamento
+    (eByControlPoint, eByPolygonVertex, eByPolygon, eAllSame) e de referência
+    (eDirect, eIndexToDirect) com indexação vetorizada.
+    Retorna None se o modo não for suportado.
+    """
+    mapping_mode = element.GetMappingMode()
+    ref_mode = element.GetReferenceMode()
+    EMapping = fbx.FbxLayerElement.EMappingMode
+    ERef = fbx.FbxLayerElement.EReferenceMode
+    
+    direct = fbx_direct_array_to_numpy(element.GetDirectArray(), components)
+    if len(direct) == 0:
+        return None
+    
+    # Índice "lógico" de cada canto de acordo com o modo de mapeamento
+    corner_count = len(corner_cp)
+    if mapping_mode == EMapping.eByControlPoint:
+        lookup = corner_cp
+    elif mapping_mode == EMapping.eByPolygonVertex:
+        lookup = np.arange(corner_count, dtype=np.int64)
+    elif mapping_mode == EMapping.eByPolygon:
+        # Malha já triangulada: 3 cantos por polígono
+        lookup = np.arange(corner_count, dtype=np.int64) // 3
+    elif mapping_mode == EMapping.eAllSame:
+        lookup = np.zeros(corner_count, dtype=np.int64)
+    else:
+        return None
+    
+    # Modo de referência: direto ou via IndexArray
+    if ref_mode == ERef.eDirect:
+        direct_index = lookup
+    elif ref_mode == ERef.eIndexToDirect:
+        direct_index = fbx_int_array_to_numpy(element.GetIndexArray())[lookup]
+    else:
+        return None
+    
+    return direct[direct_index]
+
+def compute_flat_normals(positions):
+    """Normais por face (repetidas nos 3 cantos) para malhas trianguladas sem normais"""
+    tris = positions.reshape(-1, 3, 3)
+    face_normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    norms = np.linalg.norm(face_normals, axis=1, keepdims=True)
+    face_normals = np.divide(face_normals, norms, out=np.zeros_like(face_normals), where=norms > 1e-8)
+    return np.repeat(face_normals, 3, axis=0)
+
 # ==========================================
 # LÓGICA PRINCIPAL DE CARREGAMENTO
 # ==========================================
 
-def load_fbx_model(filepath):
+def load_fbx_model(filepath, use_cache=True, rebuild_cache=False, weld=False, optimize=False):
     """
     Carrega a malha do FBX, converte para triângulos e extrai normais corretamente.
+    Retorna [positions, normals, uvs, indices, materials], com materials =
+    {"diffuse", "normal", "specular", "emission"} -> caminho da imagem ou None.
+    
+    Com use_cache, consulta primeiro o cache binário (mesh_cache) e só abre o
+    SDK se não houver entrada válida; rebuild_cache força a reconversão.
+    Com weld, vértices repetidos são soldados e os índices passam a ser reais;
+    com optimize (requer weld), os índices são reordenados para o cache de
+    vértices da GPU (mesh_optimizer.optimize_mesh).
     """
+    variant = ("weld+opt" if optimize else "weld") if weld else ""
+    if use_cache and not rebuild_cache:
+        cached = mesh_cache.load(filepath, "fbx", LOADER_VERSION, variant)
+        if cached:
+            arrays, extra = cached
+            return [arrays["positions"], arrays["normals"], arrays["uvs"], arrays["indices"], extra.get("materials")]
+
+    mesh_data = _load_fbx_model_sdk(filepath)
+    
+    if mesh_data and weld:
+        positions, normals, uvs, indices, materials = mesh_data
+        (positions, normals, uvs), indices = weld_vertices([positions, normals, uvs], indices)
+        print(f"🔗 Vértices soldados: {len(mesh_data[0])} -> {len(positions)}")
+        if optimize:
+            (positions, normals, uvs), indices = optimize_mesh([positions, normals, uvs], indices)
+        mesh_data = [positions, normals, uvs, indices, materials]
+    
+    if mesh_data and use_cache:
+        positions, normals, uvs, indices, materials = mesh_data
+        mesh_cache.store(filepath, "fbx", LOADER_VERSION,
+                         {"positions": positions, "normals": normals, "uvs": uvs, "indices": indices},
+                         extra={"materials": materials}, variant=variant)
+    return mesh_data
+
+def _load_fbx_model_sdk(filepath):
+    """Conversão completa via FBX SDK (caminho frio, sem cache)"""
     # 1. Inicializa SDK (Usando seu FbxCommon)
     sdk_manager, scene = InitializeSdkObjects()
     if not LoadScene(sdk_manager, scene, filepath):
@@ -88,75 +313,43 @@ def load_fbx_model(filepath):
 
     mesh = mesh_node.GetMesh()
     
-    # --- EXTRAÇÃO DE DADOS ---
-    control_points = mesh.GetControlPoints()
-    polygon_count = mesh.GetPolygonCount()
+    # --- EXTRAÇÃO DE DADOS (EM BLOCO) ---
+    # Cada array do SDK é lido uma única vez; o "desenrolar" por canto de
+    # polígono é feito com indexação do NumPy em vez de chamadas por vértice.
+    control_points = fbx_vectors_to_numpy(mesh.GetControlPoints(), 3)
+    corner_cp = np.asarray(mesh.GetPolygonVertices(), dtype=np.int64)
     
-    positions = []
-    normals = []
-    uvs = []
-    indices = []
+    # 1. POSIÇÃO
+    positions = control_points[corner_cp]
     
-    vertex_counter = 0
+    # 2. NORMAL
+    normals = None
+    if mesh.GetElementNormalCount() > 0:
+        normals = resolve_layer_element(mesh.GetElementNormal(0), corner_cp, 3)
+    if normals is None:
+        # Sem normais no arquivo: usa a normal da face (triângulos já convertidos)
+        normals = compute_flat_normals(positions)
     
-    # Prepara leitura de UVs
-    le_uv = None
+    # 3. UV (TEXTURA)
+    uvs = None
     if mesh.GetElementUVCount() > 0:
-        le_uv = mesh.GetElementUV(0)
-        mapping_mode = le_uv.GetMappingMode()
-        ref_mode = le_uv.GetReferenceMode()
-    
-    # Loop pelos polígonos
-    for i in range(polygon_count):
-        for j in range(3):
-            ctrl_point_index = mesh.GetPolygonVertex(i, j)
-            
-            # 1. POSIÇÃO
-            p = control_points[ctrl_point_index]
-            positions.append([p[0], p[1], p[2]])
-            
-            # 2. NORMAL (A CORREÇÃO IMPORTANTE)
-            # Pede ao SDK a normal exata do vértice, resolvendo problemas de iluminação
-            n = fbx.FbxVector4()
-            mesh.GetPolygonVertexNormal(i, j, n)
-            normals.append([n[0], n[1], n[2]])
-            
-            # 3. UV (TEXTURA)
-            uv = [0.0, 0.0]
-            if le_uv:
-                lUVIndex = 0
-                if ref_mode == fbx.FbxLayerElement.EReferenceMode.eDirect:
-                    lUVIndex = vertex_counter
-                elif ref_mode == fbx.FbxLayerElement.EReferenceMode.eIndexToDirect:
-                    lUVIndex = le_uv.GetIndexArray().GetAt(vertex_counter)
-                
-                if mapping_mode == fbx.FbxLayerElement.EMappingMode.eByControlPoint:
-                    if ref_mode == fbx.FbxLayerElement.EReferenceMode.eDirect:
-                        lUVIndex = ctrl_point_index
-                    elif ref_mode == fbx.FbxLayerElement.EReferenceMode.eIndexToDirect:
-                        lUVIndex = le_uv.GetIndexArray().GetAt(ctrl_point_index)
-
-                fbx_uv = le_uv.GetDirectArray().GetAt(lUVIndex)
-                uv = [fbx_uv[0], fbx_uv[1]]
-                
-            uvs.append(uv)
-            indices.append(vertex_counter)
-            vertex_counter += 1
-
-    # Converte listas para Arrays Numpy
-    positions = np.array(positions, dtype=np.float32)
-    normals = np.array(normals, dtype=np.float32)
-    uvs = np.array(uvs, dtype=np.float32)
-    indices = np.array(indices, dtype=np.uint32)
+        uvs = resolve_layer_element(mesh.GetElementUV(0), corner_cp, 2)
+    if uvs is None:
+        uvs = np.zeros((len(corner_cp), 2), dtype=np.float32)
+    
+    positions = positions.astype(np.float32)
+    normals = normals.astype(np.float32)
+    uvs = uvs.astype(np.float32)
+    indices = np.arange(len(corner_cp), dtype=np.uint32)
 
     # Ajusta Escala
     if len(positions) > 0:
         positions = normalize_fbx_scale(positions, target_size=2.0)
         
-    # Encontra Textura
-    texture_path = find_texture_for_fbx(filepath, mesh_node)
+    # Mapas do material (difuso, normal, especular, emissão)
+    materials = extract_materials(filepath, mesh_node)
     
     # Limpa memória do SDK
     sdk_manager.Destroy()
     
-    return [positions, normals, uvs, indices, texture_path]
\ No newline at end of file
+    return [positions, normals, uvs, indices, materials]
\ No newline at end of file
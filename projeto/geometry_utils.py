@@ -1,43 +1,27 @@
 import numpy as np
 
-from FbxCommon import *
+try:
+    from FbxCommon import *
+    HAS_FBX_SDK = True
+except ImportError:
+    # Sem o FBX SDK só as funções load_fbx_* ficam indisponíveis
+    HAS_FBX_SDK = False
+from obj_reader import read_obj
 
 debug_fbx = False
 
 
 def load_obj_file(obj_file_path):
-    vertices_pos = []
-    vertices_normals = []
-    vertices_texcoords = []
-    faces = []
+    """
+    Retorna (posições, normais, texcoords, faces) com faces (F, 3, m): para cada
+    canto os índices base 0 dos atributos presentes, na ordem v, vt, vn.
+    A leitura é feita por obj_reader.read_obj (polígonos já triangulados).
+    """
+    vertices_pos, vertices_texcoords, vertices_normals, corners = read_obj(obj_file_path)
+    present = [k for k in range(3) if len(corners) and corners[0, k] >= 0] or [0]
+    faces = corners[:, present].reshape(-1, 3, len(present))
 
-    lines = []
-    with open(obj_file_path, 'r') as f:
-        lines = f.readlines()
-
-    for line in lines:
-        if line.startswith('v '):
-            parts = line.split()
-            vertices_pos.append([float(parts[1]), float(parts[2]), float(parts[3])])
-        elif line.startswith('vn '):
-            parts = line.split()
-            vertices_normals.append([float(parts[1]), float(parts[2]), float(parts[3])])
-        elif line.startswith('vt '):
-            parts = line.split()
-            vertices_texcoords.append([float(parts[1]), float(parts[2])])
-        elif line.startswith('f '):
-            parts = line.split()
-            face_indices = []
-            for p in parts[1:]:
-                # Handle different face formats (e.g., v, v/vt, v/vt/vn, v//vn)
-                indices = [int(i) - 1 for i in p.split('/') if i] # -1 for 0-based indexing
-                face_indices.append(indices)
-            faces.append(face_indices)
-
-    return np.array(vertices_pos, dtype=np.float32), \
-        np.array(vertices_normals, dtype=np.float32), \
-        np.array(vertices_texcoords, dtype=np.float32), \
-        np.array(faces, dtype=np.uint32)
+    return vertices_pos, vertices_normals, vertices_texcoords, faces.astype(np.uint32)
 
 
 def load_fbx_node_geometry(node):
@@ -167,29 +151,31 @@ def load_fbx_model(filepath):
     return vertices_pos, vertices_normals, faces, faces_normals
 
 
+def face_vertex_indices(faces):
+    """
+    Índices de posição dos cantos de cada triângulo como (F, 3) int64.
+    Aceita (F, 3) ou o formato (F, 3, m) dos loaders (posição na coluna 0).
+    """
+    faces = np.asarray(faces)
+    if faces.ndim == 3:
+        faces = faces[:, :, 0]
+    return faces.reshape(-1, 3).astype(np.int64, copy=False)
+
+
 def compute_bounding_box(vertices_pos, faces):
     """
     Alguns arquivos OBJs contem vertices não utilizados pelas faces.
-    Então, primeiro gerei uma coleção com os vértices utilizados.
+    Então, considero só os vértices referenciados (máscara de uso, sem laço).
     
     Cada bbox é uma lista com dois pontos:
         [ [xmin, ymin, zmin], [xmax, ymax, zmax] ]
     """
+    vertices_pos = np.asarray(vertices_pos).reshape(-1, 3)
+    used = np.zeros(len(vertices_pos), dtype=bool)
+    used[face_vertex_indices(faces).ravel()] = True
+    used_vertices = vertices_pos[used]
 
-    used_vertices = []
-    for face in faces:
-        for face_vertex in face:
-            vertex_index = face_vertex[0]
-            vertex = vertices_pos[vertex_index]
-            used_vertices.append(vertex)
-
-    xv, yv, zv = zip(*used_vertices)
-
-    min_x, max_x = min(xv), max(xv)
-    min_y, max_y = min(yv), max(yv)
-    min_z, max_z = min(zv), max(zv)
-
-    return np.array([[min_x, min_y, min_z], [max_x, max_y, max_z]], dtype=np.float32)
+    return np.array([used_vertices.min(axis=0), used_vertices.max(axis=0)], dtype=np.float32)
 
 
 def union_bounding_boxes(bbox1, bbox2):
@@ -233,50 +219,72 @@ def get_bounding_box_center(bbox):
     return center
 
 
-def compute_faces_normals(vertices_pos, faces):
-    faces_normals = []
-
-    for face in faces:
-        # pega os vértices da face
-        p0 = vertices_pos[face[0][0]]
-        p1 = vertices_pos[face[1][0]]
-        p2 = vertices_pos[face[2][0]]
-
-        # calcula vetores das arestas
-        u = p1 - p0
-        w = p2 - p0
-
-        # normal da face
-        face_normal = np.cross(u, w)
-
-        norm = np.linalg.norm(face_normal)
-        if norm > 1e-8:
-            face_normal = face_normal / norm
-
-        faces_normals.append(face_normal)
+def compute_faces_normals(vertices_pos, faces, normalize=True):
+    """
+    Normais de todas as faces com um único produto vetorial em lote.
+    Com normalize=False retorna o produto vetorial bruto (módulo = 2 x área).
+    Faces degeneradas (norma ~0) ficam com o vetor sem normalizar.
+    """
+    idx = face_vertex_indices(faces)
+    vertices_pos = np.asarray(vertices_pos, dtype=np.float32).reshape(-1, 3)
+    p0, p1, p2 = vertices_pos[idx[:, 0]], vertices_pos[idx[:, 1]], vertices_pos[idx[:, 2]]
 
-    return np.array(faces_normals, dtype=np.float32)
+    # calcula as normais das faces a partir das arestas
+    faces_normals = np.cross(p1 - p0, p2 - p0)
+    if normalize:
+        norm = np.linalg.norm(faces_normals, axis=1, keepdims=True)
+        np.divide(faces_normals, norm, out=faces_normals, where=norm > 1e-8)
 
+    return faces_normals.astype(np.float32, copy=False)
 
-def compute_vertices_normals(vertices_pos, faces):
-    vertices_normals = np.zeros_like(vertices_pos)
 
-    faces_normals = compute_faces_normals(vertices_pos, faces)
-    for i in range(len(faces)):
-        face = faces[i]
-        face_normal = faces_normals[i]
+def _corner_angles(vertices_pos, idx):
+    """Ângulo interno (F, 3) de cada canto dos triângulos"""
+    p = vertices_pos[idx]
+    angles = np.empty(idx.shape, dtype=np.float32)
+    for k in range(3):
+        a = p[:, (k + 1) % 3] - p[:, k]
+        b = p[:, (k + 2) % 3] - p[:, k]
+        a /= np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+        b /= np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+        angles[:, k] = np.arccos(np.clip(np.einsum("ij,ij->i", a, b), -1.0, 1.0))
+    return angles
 
-        for j in range(len(face)):
-            vertices_normals[face[j]] += face_normal
 
-    normals_normalized = []
-    for normal in vertices_normals:
-        norm = np.linalg.norm(normal)
-        if norm > 1e-8:
-            normal = normal / norm
-        normals_normalized.append(normal.tolist())
+def compute_vertices_normals(vertices_pos, faces, weighting="uniform"):
+    """
+    Normais dos vértices acumulando as normais das faces com np.bincount.
 
-    return np.array(normals_normalized, dtype=np.float32)
+    weighting:
+        "uniform" : soma das normais unitárias das faces (comportamento original)
+        "area"    : cada face pesa pela sua área
+        "angle"   : cada face pesa pelo ângulo do canto no vértice
+    """
+    vertices_pos = np.asarray(vertices_pos, dtype=np.float32).reshape(-1, 3)
+    idx = face_vertex_indices(faces)
+
+    if weighting == "area":
+        # O produto vetorial bruto já é proporcional à área
+        corner_normals = np.repeat(compute_faces_normals(vertices_pos, idx, normalize=False)[:, None], 3, axis=1)
+    elif weighting == "angle":
+        faces_normals = compute_faces_normals(vertices_pos, idx)
+        corner_normals = faces_normals[:, None, :] * _corner_angles(vertices_pos, idx)[:, :, None]
+    elif weighting == "uniform":
+        corner_normals = np.repeat(compute_faces_normals(vertices_pos, idx)[:, None], 3, axis=1)
+    else:
+        raise ValueError(f"weighting desconhecido: {weighting}")
+
+    flat_idx = idx.ravel()
+    corner_normals = corner_normals.reshape(-1, 3)
+    vertices_normals = np.stack([
+        np.bincount(flat_idx, weights=corner_normals[:, c], minlength=len(vertices_pos))
+        for c in range(3)
+    ], axis=1)
+
+    norm = np.linalg.norm(vertices_normals, axis=1, keepdims=True)
+    np.divide(vertices_normals, norm, out=vertices_normals, where=norm > 1e-8)
+
+    return vertices_normals.astype(np.float32)
 
 
 def compute_camera_position(bouding_box, fov_y_deg=45.0, aspect_ratio=1.0, up=[0,1,0]):
@@ -0,0 +1,136 @@
+from OpenGL.GL import *
+
+# ==========================================
+# RASTREAMENTO DE ESTADO DO OPENGL
+# ==========================================
+#
+# Cada chamada de PyOpenGL custa caro no lado do Python, então programa,
+# VAO, unidade de textura ativa e textura por unidade passam por aqui:
+# se o estado pedido já é o atual, a chamada não é feita.
+#
+# Só funciona se todos os binds desses estados usarem este módulo. Código
+# que chama o GL direto (criação de buffers, upload de texturas) deve
+# chamar gl_state.invalidate() depois, ou o rastreador fica dessincronizado.
+
+
+class GLState:
+    def __init__(self):
+        self.stats = {"issued": 0, "skipped": 0, "draws": 0}
+        self.last_frame = dict(self.stats)
+        self.invalidate()
+
+    def invalidate(self):
+        """Esquece o estado conhecido: a próxima chamada de cada tipo é sempre feita"""
+        self.program = None
+        self.vao = None
+        self.active_unit = None
+        self.textures = {}
+
+    def _count(self, issued):
+        self.stats["issued" if issued else "skipped"] += 1
+        return issued
+
+    def use_program(self, program_id):
+        if self._count(self.program != program_id):
+            glUseProgram(program_id)
+            self.program = program_id
+
+    def bind_vertex_array(self, vao):
+        if self._count(self.vao != vao):
+            glBindVertexArray(vao)
+            self.vao = vao
+
+    def active_texture(self, unit):
+        if self._count(self.active_unit != unit):
+            glActiveTexture(GL_TEXTURE0 + unit)
+            self.active_unit = unit
+
+    def bind_texture(self, target, texture, unit=0):
+        """Liga a textura na unidade indicada (só troca a unidade ativa se precisar)"""
+        if self.textures.get((unit, target)) == texture:
+            self._count(False)
+            return
+        self.active_texture(unit)
+        glBindTexture(target, texture)
+        self._count(True)
+        self.textures[(unit, target)] = texture
+
+    def draw_call(self):
+        self.stats["draws"] += 1
+
+    def begin_frame(self):
+        """
+        Fecha as estatísticas do frame anterior (last_frame) e zera as do atual.
+        Também invalida o estado: entre frames pode ter havido GL "por fora".
+        """
+        self.last_frame = dict(self.stats)
+        self.stats = dict.fromkeys(self.stats, 0)
+        self.invalidate()
+
+
+# Um único contexto GL na aplicação -> um único rastreador
+gl_state = GLState()
+
+
+# ==========================================
+# CAPACIDADES DO CONTEXTO
+# ==========================================
+
+_extensions = None
+
+
+def gl_version():
+    """(major, minor) do contexto atual"""
+    try:
+        return int(glGetIntegerv(GL_MAJOR_VERSION)), int(glGetIntegerv(GL_MINOR_VERSION))
+    except GLError:
+        return 2, 0
+
+
+def has_extension(name):
+    """A extensão está disponível? A lista é lida uma vez por execução"""
+    global _extensions
+    if _extensions is None:
+        try:
+            count = int(glGetIntegerv(GL_NUM_EXTENSIONS))
+            _extensions = {glGetStringi(GL_EXTENSIONS, i).decode() for i in range(count)}
+        except GLError:
+            _extensions = set()
+    return name in _extensions
+
+
+# ==========================================
+# LISTA DE DESENHO ORDENADA POR ESTADO
+# ==========================================
+
+class DrawList:
+    """
+    Coleta os desenhos de um passe e os executa ordenados por
+    (programa, textura, VAO), minimizando as trocas de estado.
+
+    submit(program, vao, texture, draw, setup=None)
+        program : ShaderProgram
+        vao     : VAO a ligar
+        texture : textura GL_TEXTURE_2D da unidade 0 (None = não liga textura)
+        draw    : função que emite o glDraw*
+        setup   : função opcional para uniforms do item (ex.: matriz model)
+    A ordenação é estável: itens com o mesmo estado mantêm a ordem de envio.
+    """
+    def __init__(self):
+        self.items = []
+
+    def submit(self, program, vao, texture, draw, setup=None):
+        self.items.append((program, vao, texture, draw, setup))
+
+    def execute(self):
+        self.items.sort(key=lambda item: (item[0].id, item[2] or 0, item[1]))
+        for program, vao, texture, draw, setup in self.items:
+            program.use()
+            if setup is not None:
+                setup()
+            if texture is not None:
+                gl_state.bind_texture(GL_TEXTURE_2D, texture, 0)
+            gl_state.bind_vertex_array(vao)
+            draw()
+            gl_state.draw_call()
+        self.items.clear()
@@ -0,0 +1,440 @@
+import os
+import sys
+import time
+import ctypes
+
+# O autoteste roda sem janela: o PyOpenGL precisa do EGL antes de ser importado
+if __name__ == "__main__":
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+
+import numpy as np
+from OpenGL.GL import *
+from gl_state import gl_state, gl_version, has_extension
+from shader_program import ShaderProgram, SHADER_DIR
+from mesh_batch import COMMAND_DTYPE
+
+# ==========================================
+# CULLING NA GPU + COMANDOS INDIRETOS (GL 4.3)
+# ==========================================
+#
+# Todas as instâncias (registros mat4 + vec4 de material) ficam num SSBO
+# atualizado só onde mudou. A cada passe um compute shader
+# (shaders/cull_instances.comp) testa cada instância contra o frustum e,
+# opcionalmente, contra a pirâmide Hi-Z do frame anterior, e escreve:
+#
+#   - o DrawElementsIndirectCommand de cada malha (instanceCount via atomicAdd)
+#   - as instâncias visíveis compactadas, na faixa da malha (baseInstance)
+#
+# O desenho é um glMultiDrawElementsIndirect sobre o VBO/EBO do MeshBatch,
+# sem nenhuma lista de instâncias passando pelo Python. Sem compute shaders
+# o Cenario continua no caminho da CPU (SpatialGrid + MeshBatch).
+#
+# python gpu_culling.py --teste   -> autoteste sem janela (EGL, ex.: Mesa llvmpipe)
+
+CULL_LOCAL_SIZE = 64
+HIZ_LOCAL_SIZE = 8
+HIZ_UNIT = 7
+INSTANCE_RECORD_BYTES = 80
+
+
+def compute_supported():
+    """Compute shaders, SSBOs e multi draw indirect (núcleo do GL 4.3 ou extensões ARB)"""
+    if gl_version() >= (4, 3):
+        return True
+    return all(has_extension(name) for name in ("GL_ARB_compute_shader",
+                                                 "GL_ARB_shader_storage_buffer_object",
+                                                 "GL_ARB_multi_draw_indirect"))
+
+
+# ------------------------------------------
+# Pirâmide Hi-Z
+# ------------------------------------------
+
+class HiZBuffer:
+    """
+    Máximo da profundidade por nível (R32F com mipmaps), gerado a partir do
+    depth buffer do frame. Usado no frame seguinte: o teste de oclusão tem um
+    frame de atraso (objeto que acabou de aparecer atrás de uma quina surge
+    um frame depois).
+    """
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+        self.levels = int(np.floor(np.log2(max(width, height)))) + 1
+        self.view_proj = None
+        self.program = ShaderProgram.compute_from_file(os.path.join(SHADER_DIR, "hiz_build.comp"))
+
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexStorage2D(GL_TEXTURE_2D, self.levels, GL_R32F, width, height)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST_MIPMAP_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+        self.depth_texture = None
+        self.fbo = None
+        gl_state.invalidate()
+
+    def _default_depth_format(self):
+        """O blit de profundidade exige o mesmo formato do depth buffer da janela"""
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        bits = glGetFramebufferAttachmentParameteriv(GL_FRAMEBUFFER, GL_DEPTH,
+                                                     GL_FRAMEBUFFER_ATTACHMENT_DEPTH_SIZE)
+        stencil = glGetFramebufferAttachmentParameteriv(GL_FRAMEBUFFER, GL_STENCIL,
+                                                        GL_FRAMEBUFFER_ATTACHMENT_STENCIL_SIZE)
+        if stencil:
+            return GL_DEPTH32F_STENCIL8 if bits == 32 else GL_DEPTH24_STENCIL8
+        return {16: GL_DEPTH_COMPONENT16, 32: GL_DEPTH_COMPONENT32F}.get(int(bits), GL_DEPTH_COMPONENT24)
+
+    def capture(self, view_proj):
+        """Copia o depth buffer da janela (resolvendo o MSAA) e monta a pirâmide; view_proj por linhas"""
+        if self.fbo is None:
+            fmt = self._default_depth_format()
+            self.depth_texture = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self.depth_texture)
+            glTexStorage2D(GL_TEXTURE_2D, 1, fmt, self.width, self.height)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glBindTexture(GL_TEXTURE_2D, 0)
+            self.fbo = glGenFramebuffers(1)
+            glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+            attachment = GL_DEPTH_STENCIL_ATTACHMENT if fmt in (GL_DEPTH24_STENCIL8, GL_DEPTH32F_STENCIL8) else GL_DEPTH_ATTACHMENT
+            glFramebufferTexture2D(GL_FRAMEBUFFER, attachment, GL_TEXTURE_2D, self.depth_texture, 0)
+
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, 0)
+        glBindFramebuffer(GL_DRAW_FRAMEBUFFER, self.fbo)
+        glBlitFramebuffer(0, 0, self.width, self.height, 0, 0, self.width, self.height,
+                          GL_DEPTH_BUFFER_BIT, GL_NEAREST)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        self.build(self.depth_texture)
+        self.view_proj = np.asarray(view_proj, dtype=np.float32)
+
+    def build(self, source_texture):
+        """Nível 0 = cópia de source_texture (profundidade em .r); demais = máximo 2x2"""
+        self.program.use()
+        self.program.set_int("src", 0)
+        for level in range(self.levels):
+            w, h = max(1, self.width >> level), max(1, self.height >> level)
+            if level == 0:
+                gl_state.bind_texture(GL_TEXTURE_2D, source_texture, 0)
+                self.program.set_int("reduce", 0)
+                self.program.set_int("srcLevel", 0)
+            else:
+                gl_state.bind_texture(GL_TEXTURE_2D, self.texture, 0)
+                self.program.set_int("reduce", 1)
+                self.program.set_int("srcLevel", level - 1)
+            glBindImageTexture(0, self.texture, level, GL_FALSE, 0, GL_WRITE_ONLY, GL_R32F)
+            glDispatchCompute((w + HIZ_LOCAL_SIZE - 1) // HIZ_LOCAL_SIZE, (h + HIZ_LOCAL_SIZE - 1) // HIZ_LOCAL_SIZE, 1)
+            glMemoryBarrier(GL_TEXTURE_FETCH_BARRIER_BIT | GL_SHADER_IMAGE_ACCESS_BARRIER_BIT)
+
+    def cleanup(self):
+        glDeleteTextures(1, [self.texture])
+        if self.depth_texture: glDeleteTextures(1, [self.depth_texture])
+        if self.fbo: glDeleteFramebuffers(1, [self.fbo])
+        self.program.delete()
+
+
+# ------------------------------------------
+# Culling + comandos indiretos
+# ------------------------------------------
+
+class _CullPass:
+    """Buffers de saída de um passe: comandos indiretos + instâncias visíveis (e o VAO que as lê)"""
+    def __init__(self, batch):
+        self.commands = glGenBuffers(1)
+        self.visible = glGenBuffers(1)
+        self.capacity = 0
+        self.vao = batch.create_instanced_vao(self.visible)
+
+    def reserve(self, count):
+        if count <= self.capacity:
+            return
+        self.capacity = max(count, self.capacity * 2, 64)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.visible)
+        glBufferData(GL_SHADER_STORAGE_BUFFER, self.capacity * INSTANCE_RECORD_BYTES, None, GL_DYNAMIC_COPY)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, 0)
+
+
+class GpuCuller:
+    """
+    Culling das instâncias de um Cenario na GPU, desenhando pelo MeshBatch.
+
+    sync() (chamado por Cenario.update) mantém o SSBO de
+    instâncias; cull() dispara o compute shader de um passe; submit() envia
+    o glMultiDrawElementsIndirect para a DrawList.
+    """
+    def __init__(self, batch):
+        self.batch = batch
+        self.mesh_count = len(batch.personagens)
+        self.program = ShaderProgram.compute_from_file(os.path.join(SHADER_DIR, "cull_instances.comp"))
+
+        bounds = np.zeros((self.mesh_count, 4), dtype=np.float32)
+        for i, p in enumerate(batch.personagens):
+            bounds[i, :3] = getattr(p, "bounding_center", np.zeros(3))
+            bounds[i, 3] = getattr(p, "bounding_radius", 1.0)
+
+        self.instances, self.model_ids, self.bounds = glGenBuffers(3)
+        self._upload(self.bounds, bounds, GL_STATIC_DRAW)
+        self.count = 0
+        self.capacity = 0
+        self.templates = np.zeros(self.mesh_count, dtype=COMMAND_DTYPE)
+        self.passes = {}
+
+    @staticmethod
+    def _upload(buffer, data, usage):
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, buffer)
+        glBufferData(GL_SHADER_STORAGE_BUFFER, data.nbytes, data, usage)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, 0)
+
+    def sync(self, store, changed):
+        """Reenvia ao SSBO as instâncias alteradas (todas, se o número de instâncias mudou)"""
+        if store.count != self.count:
+            self.count = store.count
+            model_ids = store.model_ids[:self.count].astype(np.uint32)
+            self._upload(self.model_ids, model_ids, GL_STATIC_DRAW)
+            if self.count > self.capacity:
+                self.capacity = max(self.count, self.capacity * 2)
+                glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.instances)
+                glBufferData(GL_SHADER_STORAGE_BUFFER, self.capacity * INSTANCE_RECORD_BYTES, None, GL_DYNAMIC_DRAW)
+                glBindBuffer(GL_SHADER_STORAGE_BUFFER, 0)
+            first, last = 0, self.count - 1
+
+            # Faixa fixa de cada malha no buffer compactado: cabe todas as suas instâncias
+            totals = np.bincount(model_ids, minlength=self.mesh_count).astype(np.uint32)
+            self.templates["count"] = self.batch.index_counts
+            self.templates["first_index"] = self.batch.first_indices
+            self.templates["base_vertex"] = self.batch.base_vertices
+            self.templates["base_instance"] = np.cumsum(totals) - totals
+        else:
+            dirty = np.flatnonzero(changed[:self.count])
+            if len(dirty) == 0:
+                return
+            first, last = dirty[0], dirty[-1]
+
+        if self.count == 0:
+            return
+        records = store.instance_records(np.arange(first, last + 1))
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.instances)
+        glBufferSubData(GL_SHADER_STORAGE_BUFFER, int(first) * INSTANCE_RECORD_BYTES, records.nbytes, records)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, 0)
+
+    def cull(self, planes, pass_name="main", hiz=None):
+        """Dispara o culling de um passe (planes (6,4) do frustum; hiz = HiZBuffer ou None)"""
+        cull_pass = self.passes.get(pass_name)
+        if cull_pass is None:
+            cull_pass = _CullPass(self.batch)
+            self.passes[pass_name] = cull_pass
+        cull_pass.reserve(self.count)
+
+        # instanceCount volta a zero; o shader conta as visíveis
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, cull_pass.commands)
+        glBufferData(GL_SHADER_STORAGE_BUFFER, self.templates.nbytes, self.templates, GL_DYNAMIC_COPY)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, 0)
+        if self.count == 0:
+            return
+
+        for binding, buffer in enumerate((self.instances, self.model_ids, self.bounds,
+                                          cull_pass.commands, cull_pass.visible)):
+            glBindBufferBase(GL_SHADER_STORAGE_BUFFER, binding, buffer)
+
+        self.program.use()
+        self.program.set_int("instanceCount", self.count)
+        self.program.set_vec4s("frustumPlanes", planes)
+        use_hiz = hiz is not None and hiz.view_proj is not None
+        self.program.set_int("useHiZ", use_hiz)
+        if use_hiz:
+            self.program.set_int("hiZ", HIZ_UNIT)
+            self.program.set_mat4("hiZViewProj", hiz.view_proj, transpose=True)
+            gl_state.bind_texture(GL_TEXTURE_2D, hiz.texture, HIZ_UNIT)
+
+        glDispatchCompute((self.count + CULL_LOCAL_SIZE - 1) // CULL_LOCAL_SIZE, 1, 1)
+        glMemoryBarrier(GL_COMMAND_BARRIER_BIT | GL_VERTEX_ATTRIB_ARRAY_BARRIER_BIT | GL_SHADER_STORAGE_BARRIER_BIT)
+
+    def submit(self, draw_list, program, pass_name="main"):
+        """Um glMultiDrawElementsIndirect com os comandos gerados por cull() (malhas sem instâncias desenham 0)"""
+        cull_pass = self.passes.get(pass_name)
+        if cull_pass is None or self.count == 0:
+            return
+
+        def draw():
+            glBindBuffer(GL_DRAW_INDIRECT_BUFFER, cull_pass.commands)
+            glMultiDrawElementsIndirect(GL_TRIANGLES, GL_UNSIGNED_INT, None, self.mesh_count, 0)
+            glBindBuffer(GL_DRAW_INDIRECT_BUFFER, 0)
+
+        draw_list.submit(program, cull_pass.vao, None, draw,
+                         setup=lambda: program.set_int("useInstancing", 1))
+
+    def read_commands(self, pass_name="main"):
+        """Lê de volta os comandos do passe (sincroniza com a GPU: só para estatísticas e testes)"""
+        cull_pass = self.passes.get(pass_name)
+        if cull_pass is None:
+            return np.zeros(0, dtype=COMMAND_DTYPE)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, cull_pass.commands)
+        data = glGetBufferSubData(GL_SHADER_STORAGE_BUFFER, 0, self.templates.nbytes)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, 0)
+        return np.frombuffer(bytes(data), dtype=COMMAND_DTYPE).copy()
+
+    def read_visible(self, pass_name="main"):
+        """Registros (N, 20) das instâncias visíveis, na ordem do buffer compactado (só para testes)"""
+        commands = self.read_commands(pass_name)
+        cull_pass = self.passes[pass_name]
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, cull_pass.visible)
+        data = glGetBufferSubData(GL_SHADER_STORAGE_BUFFER, 0, self.count * INSTANCE_RECORD_BYTES)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, 0)
+        records = np.frombuffer(bytes(data), dtype=np.float32).reshape(-1, 20)
+        chunks = [records[c["base_instance"]:c["base_instance"] + c["instance_count"]] for c in commands]
+        return np.concatenate(chunks) if chunks else np.zeros((0, 20), dtype=np.float32)
+
+    def stats(self, pass_name="main"):
+        commands = self.read_commands(pass_name)
+        visible = int(commands["instance_count"].sum())
+        return {"tested": self.count, "visible": visible, "culled": self.count - visible}
+
+    def cleanup(self):
+        buffers = [self.instances, self.model_ids, self.bounds]
+        for cull_pass in self.passes.values():
+            buffers += [cull_pass.commands, cull_pass.visible]
+        glDeleteBuffers(len(buffers), buffers)
+        self.program.delete()
+
+
+# ==========================================
+# AUTOTESTE SEM JANELA (EGL)
+# ==========================================
+
+def create_headless_context():
+    """Contexto GL 4.3 core sem superfície (EGL_MESA_platform_surfaceless); funciona com o llvmpipe"""
+    from OpenGL import EGL
+    from OpenGL.EGL.EXT.platform_base import eglGetPlatformDisplayEXT
+    EGL_PLATFORM_SURFACELESS_MESA = 0x31DD
+
+    display = eglGetPlatformDisplayEXT(EGL_PLATFORM_SURFACELESS_MESA, None, None)
+    major, minor = EGL.EGLint(), EGL.EGLint()
+    EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor))
+    config, count = EGL.EGLConfig(), EGL.EGLint()
+    attribs = (EGL.EGLint * 5)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                                EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT, EGL.EGL_NONE)
+    EGL.eglChooseConfig(display, attribs, ctypes.pointer(config), 1, ctypes.pointer(count))
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context_attribs = (EGL.EGLint * 7)(EGL.EGL_CONTEXT_MAJOR_VERSION, 4, EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+                                        EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK,
+                                        EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT, EGL.EGL_NONE)
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, context_attribs)
+    if not context or not EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, context):
+        raise RuntimeError("não foi possível criar o contexto EGL 4.3")
+    return display, context
+
+
+def self_test(instance_count=20000, seed=0):
+    """
+    Compara o culling da GPU com a referência da CPU (culling.spheres_in_frustum)
+    e verifica a oclusão com uma parede sintética no Hi-Z. Retorna True se passou.
+    """
+    import glm
+    from types import SimpleNamespace
+    from cenario import InstanceStore
+    from culling import extract_frustum_planes, spheres_in_frustum
+    from mesh_batch import MeshBatch
+
+    print(f"🖥️ {glGetString(GL_RENDERER).decode()} | GL {glGetString(GL_VERSION).decode()}")
+    if not compute_supported():
+        print("⚠️ Sem compute shaders: o renderer usa o culling da CPU.")
+        return True
+
+    rng = np.random.default_rng(seed)
+    meshes = []
+    for n in (36, 60, 120):
+        positions = rng.uniform(-1, 1, (n, 3)).astype(np.float32)
+        meshes.append(SimpleNamespace(positions=positions, normals=positions, uvs=positions[:, :2],
+                                      indices=np.arange(n, dtype=np.uint32),
+                                      bounding_center=positions.mean(axis=0),
+                                      bounding_radius=float(np.linalg.norm(positions - positions.mean(axis=0), axis=1).max())))
+    batch = MeshBatch(meshes, use_indirect=True)
+    culler = GpuCuller(batch)
+
+    store = InstanceStore()
+    store.add_many(rng.uniform(-150, 150, (instance_count, 3)) * [1, 0.05, 1],
+                   rng.uniform(0, 360, instance_count), rng.uniform(0.5, 2.0, instance_count),
+                   rng.integers(0, len(meshes), instance_count))
+    changed = store.update()
+    culler.sync(store, changed)
+
+    view = glm.lookAt(glm.vec3(0, 10, 60), glm.vec3(0, 0, 0), glm.vec3(0, 1, 0))
+    proj = glm.perspective(glm.radians(60.0), 16 / 9, 0.1, 200.0)
+    proj_view = np.array(proj * view)
+    planes = extract_frustum_planes(proj_view)
+
+    # Referência na CPU: mesmas esferas do Cenario.world_spheres
+    idx = np.arange(store.count)
+    mats = store.matrices[idx]
+    centers_local = np.array([m.bounding_center for m in meshes])[store.model_ids[idx]]
+    radii_local = np.array([m.bounding_radius for m in meshes])[store.model_ids[idx]]
+    centers = np.einsum("nk,nkj->nj", centers_local, mats[:, :3, :3]) + mats[:, 3, :3]
+    radii = radii_local * np.abs(store.scale[idx])
+    expected = spheres_in_frustum(planes, centers, radii)
+
+    ok = True
+    culler.cull(planes)   # o primeiro dispatch inclui a compilação do driver
+    glFinish()
+    start = time.perf_counter()
+    culler.cull(planes)
+    glFinish()
+    gpu_time = time.perf_counter() - start
+    commands = culler.read_commands()
+    per_mesh = np.bincount(store.model_ids[idx][expected], minlength=len(meshes))
+    if not np.array_equal(commands["instance_count"], per_mesh):
+        print(f"❌ Frustum: GPU {commands['instance_count']} x CPU {per_mesh}")
+        ok = False
+    visible = culler.read_visible()
+    expected_records = store.instance_records(idx[expected])
+    by_rows = lambda r: r[np.lexsort(r.T[::-1])]
+    if visible.shape != expected_records.shape or not np.allclose(by_rows(visible), by_rows(expected_records)):
+        print("❌ Frustum: registros compactados diferentes dos esperados")
+        ok = False
+    print(f"{'✅' if ok else '❌'} Frustum: {int(expected.sum())}/{store.count} visíveis "
+          f"(GPU {gpu_time * 1000:.1f}ms incluindo glFinish)")
+
+    # Hi-Z: parede colada na câmera cobrindo a metade esquerda da tela
+    width, height = 256, 144
+    hiz = HiZBuffer(width, height)
+    depth = np.ones((height, width), dtype=np.float32)
+    depth[:, :width // 2] = 0.05
+    source = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, source)
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_R32F, width, height, 0, GL_RED, GL_FLOAT, depth)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+    hiz.build(source)
+    hiz.view_proj = proj_view.astype(np.float32)
+    culler.cull(planes, hiz=hiz)
+    occluded_visible = culler.read_visible()
+
+    # Posições (coluna de translação) -> tela: esquerda inteira atrás da parede some,
+    # direita inteira continua
+    def screen_x(points):
+        clip = np.c_[points, np.ones(len(points))] @ proj_view.T
+        return clip[:, 0] / clip[:, 3]
+    right_side = expected & (screen_x(centers) > 0.2)
+    kept = {tuple(np.round(r[12:15], 3)) for r in occluded_visible}
+    lost_right = [i for i in np.flatnonzero(right_side)
+                  if tuple(np.round(store.instance_records([i])[0, 12:15], 3)) not in kept]
+    left_count = int((expected & (screen_x(centers) < -0.2)).sum())
+    culled = int(expected.sum()) - len(occluded_visible)
+    hiz_ok = len(lost_right) == 0 and culled >= left_count * 0.9
+    print(f"{'✅' if hiz_ok else '❌'} Hi-Z: {culled} ocultas pela parede "
+          f"(~{left_count} atrás dela), {len(lost_right)} visíveis perdidas")
+    ok = ok and hiz_ok
+
+    glDeleteTextures(1, [source])
+    hiz.cleanup()
+    culler.cleanup()
+    batch.cleanup()
+    return ok
+
+
+if __name__ == "__main__":
+    if "--teste" not in sys.argv:
+        print("Uso: python gpu_culling.py --teste")
+        sys.exit(2)
+    create_headless_context()
+    sys.exit(0 if self_test() else 1)
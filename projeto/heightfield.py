@@ -0,0 +1,252 @@
+import os
+import numpy as np
+from culling import classify_aabbs
+
+# ==========================================
+# TERRENO POR MAPA DE ALTURAS EM BLOCOS (GEOMIPMAPPING)
+# ==========================================
+#
+# A grade de alturas é dividida em blocos de chunk_size x chunk_size quads.
+# Cada bloco tem seus vértices (grade completa + saia) num trecho contínuo do
+# VBO; os índices de cada nível de detalhe (passo 1, 2, 4, ... chunk_size) são
+# os mesmos para todos os blocos, então basta um EBO pequeno e o base_vertex
+# do bloco:
+#
+#   glMultiDrawElementsBaseVertex(count = índices do nível, base = bloco * vértices)
+#
+# O nível de cada bloco sai do erro em pixels na tela: o erro geométrico do
+# nível (maior diferença de altura para a grade completa) projetado pela
+# distância da câmera até a caixa do bloco. Blocos vizinhos em níveis
+# diferentes não fecham as bordas; a saia (faixa vertical descendo a partir
+# da borda) cobre essas frestas.
+#
+# Este módulo não usa OpenGL: a seleção roda e é medida sem contexto
+# (benchmark_terrain.py); o Terreno cuida dos buffers e do desenho.
+
+
+def _resample(grid, rows, cols):
+    """Interpolação bilinear de grid (r, c) para (rows, cols), cantos alinhados"""
+    r, c = grid.shape
+    y = np.linspace(0, r - 1, rows)
+    x = np.linspace(0, c - 1, cols)
+    y0 = np.minimum(y.astype(np.int64), r - 2) if r > 1 else np.zeros(rows, dtype=np.int64)
+    x0 = np.minimum(x.astype(np.int64), c - 2) if c > 1 else np.zeros(cols, dtype=np.int64)
+    fy = (y - y0)[:, None] if r > 1 else np.zeros((rows, 1))
+    fx = (x - x0)[None, :] if c > 1 else np.zeros((1, cols))
+    y1 = np.minimum(y0 + 1, r - 1)
+    x1 = np.minimum(x0 + 1, c - 1)
+    top = grid[y0][:, x0] * (1 - fx) + grid[y0][:, x1] * fx
+    bottom = grid[y1][:, x0] * (1 - fx) + grid[y1][:, x1] * fx
+    return (top * (1 - fy) + bottom * fy).astype(np.float32)
+
+
+def generate_heightmap(size=513, seed=0, octaves=None, roughness=0.5, base_cells=4):
+    """
+    Relevo procedural (fBm de value noise) em [0, 1], (size, size) float32.
+    octaves=None desce até o detalhe de ~1 amostra.
+    """
+    rng = np.random.default_rng(seed)
+    if octaves is None:
+        octaves = max(1, int(np.log2(max(size - 1, base_cells) / base_cells)) + 1)
+    heights = np.zeros((size, size), dtype=np.float32)
+    amplitude, total = 1.0, 0.0
+    for octave in range(octaves):
+        cells = base_cells * 2 ** octave + 1
+        heights += amplitude * _resample(rng.random((cells, cells), dtype=np.float32), size, size)
+        total += amplitude
+        amplitude *= roughness
+    heights /= total
+    heights -= heights.min()
+    return heights / max(float(heights.max()), 1e-6)
+
+
+def load_heightmap(path):
+    """Mapa de alturas em [0, 1]: .npy (valores já normalizados ou não) ou imagem em tons de cinza (8 ou 16 bits)"""
+    if os.path.splitext(path)[1].lower() == ".npy":
+        heights = np.load(path).astype(np.float32)
+        low, high = float(heights.min()), float(heights.max())
+        return (heights - low) / max(high - low, 1e-6)
+
+    from PIL import Image
+    img = Image.open(path)
+    if img.mode in ("I;16", "I;16B", "I"):
+        return np.asarray(img, dtype=np.float32) / 65535.0
+    return np.asarray(img.convert("L"), dtype=np.float32) / 255.0
+
+
+class ChunkedHeightfield:
+    """
+    heights: (linhas, colunas) em [0, 1], multiplicado por height_scale.
+    O terreno cobre x em [-extent, extent] (z proporcional às linhas), centrado na origem.
+    chunk_size: quads por lado de cada bloco (potência de 2); a grade é
+    reamostrada para um número inteiro de blocos.
+    """
+    def __init__(self, heights, extent=300.0, height_scale=30.0, chunk_size=64, uv_repeat=40.0):
+        if chunk_size & (chunk_size - 1):
+            raise ValueError("chunk_size precisa ser potência de 2")
+        heights = np.asarray(heights, dtype=np.float32)
+        n = chunk_size
+        chunks_z = max(1, int(np.ceil((heights.shape[0] - 1) / n)))
+        chunks_x = max(1, int(np.ceil((heights.shape[1] - 1) / n)))
+        rows, cols = chunks_z * n + 1, chunks_x * n + 1
+        if heights.shape != (rows, cols):
+            heights = _resample(heights, rows, cols)
+
+        self.chunk_size = n
+        self.chunks_x, self.chunks_z = chunks_x, chunks_z
+        self.chunk_count = chunks_x * chunks_z
+        self.cell_size = 2.0 * extent / (cols - 1)
+        self.origin = np.array([-extent, -self.cell_size * (rows - 1) / 2.0], dtype=np.float32)  # (x, z) da amostra [0, 0]
+        self.heights = heights * np.float32(height_scale)
+        self.lod_levels = int(np.log2(n)) + 1
+        self.full_triangles = 2 * (rows - 1) * (cols - 1)
+
+        # Vista (bloco_z, bloco_x, n+1, n+1) de cada bloco (bordas compartilhadas)
+        self.chunk_heights = np.lib.stride_tricks.sliding_window_view(self.heights, (n + 1, n + 1))[::n, ::n]
+        self.lod_errors = self._lod_errors()
+        self.skirt_depth = self.lod_errors.max(axis=1) + self.cell_size * 0.5
+
+        # Caixa de cada bloco (culling e distância da câmera)
+        blocks = self.chunk_heights.reshape(self.chunk_count, -1)
+        cz, cx = np.divmod(np.arange(self.chunk_count), chunks_x)
+        self.box_min = np.stack([self.origin[0] + cx * n * self.cell_size, blocks.min(axis=1),
+                                 self.origin[1] + cz * n * self.cell_size], axis=1).astype(np.float32)
+        self.box_max = np.stack([self.box_min[:, 0] + n * self.cell_size, blocks.max(axis=1),
+                                 self.box_min[:, 2] + n * self.cell_size], axis=1).astype(np.float32)
+
+        self.vertices = self._build_vertices(uv_repeat / (cols - 1))
+        self.vertices_per_chunk = self.vertices.shape[1]
+        self.indices, self.lod_offsets, self.lod_counts = self._build_lod_indices()
+        self.lod_triangles = self.lod_counts // 3
+
+    # ------------------------------------------
+    # Construção
+    # ------------------------------------------
+
+    def normals(self):
+        """Normais por amostra (diferenças centrais), (linhas, colunas, 3)"""
+        dz, dx = np.gradient(self.heights, self.cell_size)
+        normals = np.stack([-dx, np.ones_like(dx), -dz], axis=-1)
+        return normals / np.linalg.norm(normals, axis=-1, keepdims=True)
+
+    def _lod_errors(self):
+        """
+        Erro geométrico (blocos, níveis): maior |altura completa - altura do
+        nível| no bloco, com o nível reconstruído por interpolação bilinear
+        das amostras de passo 2^nível. Forçado a ser crescente com o nível.
+        """
+        n = self.chunk_size
+        blocks = self.chunk_heights.reshape(-1, n + 1, n + 1)
+        errors = np.zeros((len(blocks), self.lod_levels), dtype=np.float32)
+        t = np.arange(n + 1)
+        for level in range(1, self.lod_levels):
+            step = 2 ** level
+            coarse = blocks[:, ::step, ::step]
+            i0 = np.minimum(t // step, n // step - 1)
+            f = ((t - i0 * step) / step).astype(np.float32)
+            rows = coarse[:, i0] * (1 - f)[None, :, None] + coarse[:, i0 + 1] * f[None, :, None]
+            full = rows[:, :, i0] * (1 - f)[None, None, :] + rows[:, :, i0 + 1] * f[None, None, :]
+            errors[:, level] = np.abs(full - blocks).max(axis=(1, 2))
+        return np.maximum.accumulate(errors, axis=1)
+
+    def _build_vertices(self, uv_per_sample):
+        """(blocos, vértices, 8): grade (n+1)² do bloco seguida das 4 bordas da saia"""
+        n = self.chunk_size
+        normals = self.normals()
+        rows, cols = self.heights.shape
+        zs, xs = np.meshgrid(np.arange(rows, dtype=np.float32), np.arange(cols, dtype=np.float32), indexing="ij")
+        grid = np.concatenate([
+            (self.origin[0] + xs * self.cell_size)[..., None],
+            self.heights[..., None],
+            (self.origin[1] + zs * self.cell_size)[..., None],
+            normals,
+            (xs * uv_per_sample)[..., None],
+            (zs * uv_per_sample)[..., None],
+        ], axis=-1).astype(np.float32)
+
+        windows = np.lib.stride_tricks.sliding_window_view(grid, (n + 1, n + 1), axis=(0, 1))[::n, ::n]
+        blocks = np.moveaxis(windows, 2, -1).reshape(self.chunk_count, n + 1, n + 1, 8)
+        # Bordas: i = 0, i = n, j = 0, j = n (mesma ordem de _edge_vertices)
+        skirt = np.concatenate([blocks[:, 0, :], blocks[:, n, :], blocks[:, :, 0], blocks[:, :, n]], axis=1).copy()
+        skirt[:, :, 1] -= self.skirt_depth[:, None]
+        return np.concatenate([blocks.reshape(self.chunk_count, -1, 8), skirt], axis=1)
+
+    @staticmethod
+    def _edge_vertices(edge, k, n):
+        """Índice na grade do bloco do k-ésimo vértice de cada borda (i = 0, i = n, j = 0, j = n)"""
+        side = n + 1
+        return (k, n * side + k, k * side, k * side + n)[edge]
+
+    def _build_lod_indices(self):
+        """Índices de cada nível (comuns a todos os blocos), concatenados; retorna (índices, offsets, contagens)"""
+        n = self.chunk_size
+        side = n + 1
+        grid_count = side * side
+
+        # Bloco plano de referência (saia uma unidade abaixo), só para orientar os triângulos da saia
+        k = np.arange(side)
+        flat = np.zeros((self.vertices_per_chunk, 3), dtype=np.float32)
+        flat[:grid_count, 0] = np.tile(k, side)
+        flat[:grid_count, 2] = np.repeat(k, side)
+        for edge in range(4):
+            edge_flat = flat[self._edge_vertices(edge, k, n)]
+            flat[grid_count + edge * side + k] = edge_flat - (0, 1, 0)
+
+        blocks, offsets, counts = [], [], []
+        offset = 0
+        for level in range(self.lod_levels):
+            step = 2 ** level
+            k = np.arange(0, n, step)
+            i, j = np.meshgrid(k, k, indexing="ij")
+            v00 = (i * side + j).ravel()
+            v01, v10, v11 = v00 + step, v00 + step * side, v00 + step * side + step
+            tris = [np.stack([v00, v10, v01], axis=1), np.stack([v01, v10, v11], axis=1)]
+
+            # Saia: dois triângulos por segmento de borda, virados para fora do bloco
+            for edge, outward in enumerate(((0, 0, -1), (0, 0, 1), (-1, 0, 0), (1, 0, 0))):
+                top_a, top_b = self._edge_vertices(edge, k, n), self._edge_vertices(edge, k + step, n)
+                low_a, low_b = grid_count + edge * side + k, grid_count + edge * side + k + step
+                quad = np.concatenate([np.stack([top_a, low_a, top_b], axis=1),
+                                       np.stack([top_b, low_a, low_b], axis=1)])
+                pos = flat[quad]
+                normal = np.cross(pos[:, 1] - pos[:, 0], pos[:, 2] - pos[:, 0])
+                flip = normal @ np.array(outward, dtype=np.float32) < 0
+                quad[flip] = quad[flip][:, ::-1]
+                tris.append(quad)
+
+            level_indices = np.concatenate(tris).ravel()
+            blocks.append(level_indices)
+            offsets.append(offset)
+            counts.append(len(level_indices))
+            offset += len(level_indices)
+
+        index_type = np.uint16 if self.vertices_per_chunk <= 65536 else np.uint32
+        return (np.concatenate(blocks).astype(index_type),
+                np.array(offsets, dtype=np.int64), np.array(counts, dtype=np.int64))
+
+    # ------------------------------------------
+    # Seleção por frame
+    # ------------------------------------------
+
+    def select_lods(self, camera_pos, projection_scale, pixel_error=2.0):
+        """
+        Nível de cada bloco: o mais grosso cujo erro projetado (erro * escala /
+        distância) fica abaixo de pixel_error. projection_scale = altura da
+        tela em pixels / (2 * tan(fov / 2)).
+        """
+        camera = np.asarray(camera_pos, dtype=np.float32)[:3]
+        gap = np.maximum(np.maximum(self.box_min - camera, camera - self.box_max), 0.0)
+        distance = np.maximum(np.linalg.norm(gap, axis=1), 1e-3)
+        screen_error = self.lod_errors * (projection_scale / distance)[:, None]
+        # Erros crescentes: o nível é o número de níveis aceitáveis - 1 (o nível 0 sempre é)
+        return np.count_nonzero(screen_error <= pixel_error, axis=1) - 1
+
+    def visible_chunks(self, planes=None):
+        """Índices dos blocos cuja caixa cruza o frustum (todos se planes for None)"""
+        if planes is None:
+            return np.arange(self.chunk_count)
+        outside, _ = classify_aabbs(planes, self.box_min, self.box_max)
+        return np.flatnonzero(~outside)
+
+    def triangle_count(self, chunks, lods):
+        return int(self.lod_triangles[lods[chunks]].sum())
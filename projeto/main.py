@@ -1,16 +1,14 @@
-import subprocess
 from scene_renderer import SceneRenderer
-import sys
-import os
 
 def gerar_cena():
-    # Verifica se o script existe antes de tentar rodar
-    if os.path.exists("spawn_personagens.py"):
-        print("🔄 Iniciando gerador de cena...")
-        # Usa sys.executable para garantir que roda com o mesmo python que chamou o main
-        subprocess.run([sys.executable, "spawn_personagens.py"])
-    else:
-        print("❌ Erro: 'spawn_personagens.py' não encontrado.")
+    # No mesmo processo: sem iniciar outro Python nem carregar o FBX SDK de novo a cada geração
+    try:
+        import spawn_personagens
+    except ImportError as e:
+        print(f"❌ Erro: gerador de cena indisponível ({e}).")
+        return
+    print("🔄 Iniciando gerador de cena...")
+    spawn_personagens.generate()
 
 def visualizar():
     print("🚀 Iniciando renderizador OpenGL...")
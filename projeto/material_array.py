@@ -0,0 +1,153 @@
+import os
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from OpenGL.GL import *
+from gl_state import gl_state
+
+# ==========================================
+# MATERIAIS DOS PERSONAGENS EM TEXTURE ARRAYS
+# ==========================================
+#
+# Cada tipo de mapa (difuso, normal, especular, emissão) vira um único
+# GL_TEXTURE_2D_ARRAY com uma camada por material. Todos os personagens
+# usam os mesmos 4 binds (unidades 3..6); a camada sai do atributo por
+# instância aInstanceMaterial (location 7):
+#
+#   x = camada do material (-1 = sem array, usa texture1)
+#   y, z, w = 1.0 se o material tem mapa normal / especular / de emissão
+#
+# As imagens são decodificadas em paralelo (threads) e redimensionadas para
+# o tamanho comum do array; mapas ausentes ficam com a cor neutra do tipo.
+
+MATERIAL_KINDS = ("diffuse", "normal", "specular", "emission")
+
+# Unidade de textura e nome do sampler2DArray no shader de cada tipo
+MATERIAL_UNITS = {"diffuse": 3, "normal": 4, "specular": 5, "emission": 6}
+MATERIAL_SAMPLERS = {
+    "diffuse": "materialDiffuse",
+    "normal": "materialNormal",
+    "specular": "materialSpecular",
+    "emission": "materialEmission",
+}
+
+# Cor de um mapa ausente: não altera o resultado do shader
+NEUTRAL_COLORS = {
+    "diffuse": (200, 200, 200, 255),
+    "normal": (128, 128, 255, 255),
+    "specular": (0, 0, 0, 255),
+    "emission": (0, 0, 0, 255),
+}
+
+NO_MATERIAL = (-1.0, 0.0, 0.0, 0.0)
+
+
+def _load_layer(path, size, pixels=None):
+    """Imagem RGBA (size, size, 4) uint8 para uma camada; roda nas threads"""
+    from PIL import Image
+    img = Image.fromarray(pixels) if pixels is not None else Image.open(path).convert("RGBA")
+    if img.size != (size, size):
+        img = img.resize((size, size), Image.LANCZOS)
+    return np.asarray(img, dtype=np.uint8)
+
+
+class MaterialArray:
+    """
+    materials: lista de dicionários {tipo: caminho} (formato de load_fbx_model).
+    diffuse_pixels: mapas difusos já decodificados (ex.: pelo asset_pipeline),
+    na mesma ordem, ou None onde não houver.
+    Materiais iguais (mesmos caminhos) dividem a camada.
+    """
+    def __init__(self, materials, diffuse_pixels=None, size=1024, max_workers=4):
+        start = time.perf_counter()
+        self.size = size
+        self.layers = []          # dicionário de caminhos de cada camada
+        self.textures = {}        # tipo -> id do GL_TEXTURE_2D_ARRAY
+        self.nbytes = 0
+        diffuse_pixels = diffuse_pixels or [None] * len(materials)
+
+        # Camada de cada material de entrada (com deduplicação)
+        self.layer_of = []
+        pixels_by_layer = {}
+        for material, pixels in zip(materials, diffuse_pixels):
+            material = {kind: (material or {}).get(kind) for kind in MATERIAL_KINDS}
+            if material in self.layers:
+                layer = self.layers.index(material)
+            else:
+                layer = len(self.layers)
+                self.layers.append(material)
+            if pixels is not None:
+                pixels_by_layer.setdefault(layer, pixels)
+            self.layer_of.append(layer)
+
+        # Decodificação + redimensionamento de todos os mapas em paralelo
+        jobs = {}
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="material") as pool:
+            for layer, material in enumerate(self.layers):
+                for kind in MATERIAL_KINDS:
+                    path = material[kind]
+                    pixels = pixels_by_layer.get(layer) if kind == "diffuse" else None
+                    if path or pixels is not None:
+                        jobs[(layer, kind)] = pool.submit(_load_layer, path, size, pixels)
+            images = {}
+            for key, future in jobs.items():
+                try:
+                    images[key] = future.result()
+                except (OSError, ValueError) as e:
+                    print(f"⚠️ Mapa '{self.layers[key[0]][key[1]]}' ignorado: {e}")
+
+        # Quais mapas cada camada realmente tem (y, z, w de aInstanceMaterial)
+        self.flags = np.array([[float((layer, kind) in images) for kind in MATERIAL_KINDS[1:]]
+                               for layer in range(len(self.layers))], dtype=np.float32).reshape(-1, 3)
+
+        for kind in MATERIAL_KINDS:
+            self.textures[kind] = self._create_array(kind, images)
+        gl_state.invalidate()
+
+        print(f"🎨 Materiais: {len(self.layers)} camadas {size}x{size} x {len(MATERIAL_KINDS)} mapas "
+              f"({self.nbytes / 2**20:.1f} MB) em {time.perf_counter() - start:.2f}s")
+
+    def _create_array(self, kind, images):
+        layer_count = max(len(self.layers), 1)
+        neutral = np.empty((self.size, self.size, 4), dtype=np.uint8)
+        neutral[:] = NEUTRAL_COLORS[kind]
+
+        tex = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, tex)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_S, GL_REPEAT)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_T, GL_REPEAT)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexImage3D(GL_TEXTURE_2D_ARRAY, 0, GL_RGBA8, self.size, self.size, layer_count, 0,
+                     GL_RGBA, GL_UNSIGNED_BYTE, None)
+        for layer in range(layer_count):
+            pixels = images.get((layer, kind), neutral)
+            glTexSubImage3D(GL_TEXTURE_2D_ARRAY, 0, 0, 0, layer, self.size, self.size, 1,
+                            GL_RGBA, GL_UNSIGNED_BYTE, np.ascontiguousarray(pixels))
+        glGenerateMipmap(GL_TEXTURE_2D_ARRAY)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, 0)
+
+        self.nbytes += self.size * self.size * 4 * layer_count * 4 // 3
+        return tex
+
+    def instance_material(self, index):
+        """vec4 por instância do material de entrada index: (camada, tem normal, tem especular, tem emissão)"""
+        layer = self.layer_of[index]
+        return (float(layer),) + tuple(float(f) for f in self.flags[layer])
+
+    def bind(self, program):
+        """Liga os 4 arrays (um bind para todos os personagens) e aponta os samplers do programa"""
+        for kind in MATERIAL_KINDS:
+            program.set_int(MATERIAL_SAMPLERS[kind], MATERIAL_UNITS[kind])
+            gl_state.bind_texture(GL_TEXTURE_2D_ARRAY, self.textures[kind], MATERIAL_UNITS[kind])
+
+    def print_report(self):
+        print("🎨 Camadas de material:")
+        for layer, material in enumerate(self.layers):
+            maps = ", ".join(f"{kind}={os.path.basename(path)}" for kind, path in material.items() if path)
+            print(f"   [{layer}] {maps or 'sem mapas'}")
+
+    def cleanup(self):
+        if self.textures:
+            glDeleteTextures(len(self.textures), list(self.textures.values()))
+            self.textures = {}
@@ -0,0 +1,146 @@
+import ctypes
+import numpy as np
+from OpenGL.GL import *
+from gl_state import gl_state, gl_version, has_extension
+from cenario import LoteInstancias
+from personagem import bind_mesh_attributes, bind_instance_attributes
+
+# ==========================================
+# TODOS OS PERSONAGENS EM UM ÚNICO DRAW
+# ==========================================
+#
+# As malhas de todos os PersonagemFBX vão para um único VBO/EBO; cada malha
+# guarda sua faixa (first_index, index_count) e o base_vertex. Os mapas já
+# estão em texture arrays (MaterialArray), então o estado é o mesmo para
+# todos os personagens e o passe inteiro vira um desenho:
+#
+#   - GL 4.3 / ARB_multi_draw_indirect: um glMultiDrawElementsIndirect com um
+#     comando por malha visível (baseInstance aponta o início das instâncias
+#     da malha no VBO de instâncias, ordenado por modelo);
+#   - senão: um glDrawElementsInstancedBaseVertex por malha, reapontando os
+#     atributos de instância para o primeiro registro da malha.
+
+# DrawElementsIndirectCommand: count, instanceCount, firstIndex, baseVertex, baseInstance
+COMMAND_DTYPE = np.dtype([("count", "<u4"), ("instance_count", "<u4"), ("first_index", "<u4"),
+                          ("base_vertex", "<i4"), ("base_instance", "<u4")])
+
+
+def supports_multi_draw_indirect():
+    return gl_version() >= (4, 3) or has_extension("GL_ARB_multi_draw_indirect")
+
+
+class MeshBatch:
+    """
+    personagens: lista na ordem dos model_ids do Cenario (Cenario.modelos).
+    Por passe guarda um LoteInstancias (instâncias ordenadas por modelo) e
+    um buffer de comandos indiretos.
+    """
+    def __init__(self, personagens, use_indirect=None):
+        self.personagens = list(personagens)
+        self.use_indirect = supports_multi_draw_indirect() if use_indirect is None else use_indirect
+
+        vertex_blocks, index_blocks = [], []
+        self.index_counts = np.zeros(len(self.personagens), dtype=np.uint32)
+        self.first_indices = np.zeros(len(self.personagens), dtype=np.uint32)
+        self.base_vertices = np.zeros(len(self.personagens), dtype=np.int32)
+        vertex_total = index_total = 0
+        for i, p in enumerate(self.personagens):
+            vertex_blocks.append(np.hstack([p.positions, p.normals, p.uvs]).astype(np.float32))
+            index_blocks.append(np.asarray(p.indices, dtype=np.uint32))
+            self.first_indices[i], self.index_counts[i] = index_total, len(p.indices)
+            self.base_vertices[i] = vertex_total
+            vertex_total += len(p.positions)
+            index_total += len(p.indices)
+
+        vertices = np.concatenate(vertex_blocks)
+        indices = np.concatenate(index_blocks)
+        self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+        self.ebo = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        self.lotes = {}
+        self.command_buffers = {}
+        self.commands = {}
+
+        mode = "glMultiDrawElementsIndirect" if self.use_indirect else "glDrawElementsInstancedBaseVertex por malha"
+        print(f"🧩 Lote único: {len(self.personagens)} malhas, {vertex_total} vértices, "
+              f"{index_total // 3} triângulos ({mode})")
+
+    def create_instanced_vao(self, instance_vbo):
+        """VAO com o VBO/EBO compartilhados + atributos de instância (usado pelo LoteInstancias)"""
+        vao = glGenVertexArrays(1)
+        gl_state.bind_vertex_array(vao)
+        bind_mesh_attributes(self.vbo, self.ebo)
+        bind_instance_attributes(instance_vbo)
+        gl_state.bind_vertex_array(0)
+        return vao
+
+    def build_commands(self, instance_counts):
+        """Um comando por malha com instâncias; base_instance = soma das contagens anteriores"""
+        base_instances = np.cumsum(instance_counts) - instance_counts
+        drawn = np.flatnonzero(instance_counts)
+        commands = np.zeros(len(drawn), dtype=COMMAND_DTYPE)
+        commands["count"] = self.index_counts[drawn]
+        commands["instance_count"] = instance_counts[drawn]
+        commands["first_index"] = self.first_indices[drawn]
+        commands["base_vertex"] = self.base_vertices[drawn]
+        commands["base_instance"] = base_instances[drawn]
+        return commands
+
+    def submit(self, draw_list, program, store, visible, pass_name="main"):
+        """
+        Envia o passe inteiro como um único item da DrawList. As instâncias
+        visíveis são ordenadas por modelo (ordem estável), então a seleção só
+        muda quando a visibilidade muda e o reenvio parcial do LoteInstancias
+        continua valendo.
+        """
+        if len(visible) == 0:
+            return
+        models = store.model_ids[visible]
+        order = visible[np.argsort(models, kind="stable")]
+        commands = self.build_commands(np.bincount(models, minlength=len(self.personagens)).astype(np.uint32))
+
+        lote = self.lotes.get(pass_name)
+        if lote is None:
+            lote = LoteInstancias(self)
+            self.lotes[pass_name] = lote
+        lote.upload(store, order)
+        self.commands[pass_name] = commands
+
+        if self.use_indirect:
+            buffer = self.command_buffers.get(pass_name)
+            if buffer is None:
+                buffer = glGenBuffers(1)
+                self.command_buffers[pass_name] = buffer
+            glBindBuffer(GL_DRAW_INDIRECT_BUFFER, buffer)
+            glBufferData(GL_DRAW_INDIRECT_BUFFER, commands.nbytes, commands, GL_STREAM_DRAW)
+            glBindBuffer(GL_DRAW_INDIRECT_BUFFER, 0)
+            draw = lambda: self._draw_indirect(buffer, len(commands))
+        else:
+            draw = lambda: self._draw_base_vertex(lote.instance_vbo, commands)
+
+        draw_list.submit(program, lote.vao, None, draw,
+                         setup=lambda: program.set_int("useInstancing", 1))
+
+    def _draw_indirect(self, buffer, count):
+        glBindBuffer(GL_DRAW_INDIRECT_BUFFER, buffer)
+        glMultiDrawElementsIndirect(GL_TRIANGLES, GL_UNSIGNED_INT, None, count, 0)
+        glBindBuffer(GL_DRAW_INDIRECT_BUFFER, 0)
+
+    def _draw_base_vertex(self, instance_vbo, commands):
+        # Sem baseInstance: os atributos de instância são reapontados a cada malha
+        for i, cmd in enumerate(commands):
+            bind_instance_attributes(instance_vbo, int(cmd["base_instance"]))
+            glDrawElementsInstancedBaseVertex(GL_TRIANGLES, int(cmd["count"]), GL_UNSIGNED_INT,
+                                              ctypes.c_void_p(int(cmd["first_index"]) * 4),
+                                              int(cmd["instance_count"]), int(cmd["base_vertex"]))
+            if i > 0:
+                gl_state.draw_call()
+
+    def cleanup(self):
+        buffers = [self.vbo, self.ebo] + list(self.command_buffers.values())
+        glDeleteBuffers(len(buffers), buffers)
@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+import numpy as np
+
+# ==========================================
+# CACHE BINÁRIO DE MALHAS CONVERTIDAS
+# ==========================================
+#
+# Cada malha convertida (FBX/OBJ) vira dois arquivos em CACHE_DIR:
+#   <chave>.bin  -> arrays float32/uint32 concatenados, alinhados em 64 bytes
+#   <chave>.json -> cabeçalho: origem (caminho, mtime, tamanho), versão do
+#                   loader, e offset/dtype/shape de cada array
+#
+# A chave depende só do caminho absoluto, do tipo de loader e da variante
+# (opções do loader), então cada origem ocupa sempre o mesmo "slot".
+#
+# Regra de invalidação: a entrada só é usada se mtime, tamanho e versão do
+# loader gravados no cabeçalho forem iguais aos atuais. Qualquer diferença
+# faz o loader reconverter a malha e sobrescrever o slot.
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+_ALIGN = 64
+
+
+def source_stamp(source_path):
+    """Identificação do arquivo de origem usada para invalidar o cache"""
+    st = os.stat(source_path)
+    return {
+        "path": os.path.abspath(source_path),
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+    }
+
+
+def cache_paths(source_path, kind, variant=""):
+    """Retorna (caminho .bin, caminho .json) do slot de uma origem"""
+    key_src = f"{os.path.abspath(source_path)}|{kind}|{variant}"
+    key = hashlib.sha1(key_src.encode("utf-8")).hexdigest()[:20]
+    base = os.path.join(CACHE_DIR, f"{kind}_{key}")
+    return base + ".bin", base + ".json"
+
+
+def load(source_path, kind, version, variant=""):
+    """
+    Busca a malha no cache.
+
+    Retorna (arrays, extra) ou None se não houver entrada válida.
+    Os arrays são np.memmap em modo copy-on-write: podem ser passados
+    direto ao glBufferData e alterados em memória sem tocar no arquivo.
+    """
+    bin_path, header_path = cache_paths(source_path, kind, variant)
+    if not os.path.exists(header_path) or not os.path.exists(bin_path):
+        return None
+
+    try:
+        with open(header_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        stamp = source_stamp(source_path)
+    except (OSError, ValueError):
+        return None
+
+    if header.get("version") != version or header.get("source") != stamp:
+        return None
+
+    arrays = {}
+    for name, info in header["arrays"].items():
+        shape = tuple(info["shape"])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.zeros(shape, dtype=info["dtype"])
+        else:
+            arrays[name] = np.memmap(bin_path, dtype=info["dtype"], mode="c",
+                                     offset=info["offset"], shape=shape)
+    return arrays, header.get("extra", {})
+
+
+def store(source_path, kind, version, arrays, extra=None, variant=""):
+    """Grava os arrays da malha no slot da origem (escrita atômica)"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    bin_path, header_path = cache_paths(source_path, kind, variant)
+
+    header = {
+        "version": version,
+        "kind": kind,
+        "variant": variant,
+        "source": source_stamp(source_path),
+        "extra": extra or {},
+        "arrays": {},
+    }
+
+    tmp_bin = bin_path + ".tmp"
+    with open(tmp_bin, "wb") as f:
+        offset = 0
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            pad = (-offset) % _ALIGN
+            f.write(b"\0" * pad)
+            offset += pad
+            header["arrays"][name] = {"offset": offset, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+            f.write(arr.tobytes())
+            offset += arr.nbytes
+
+    tmp_header = header_path + ".tmp"
+    with open(tmp_header, "w", encoding="utf-8") as f:
+        json.dump(header, f, indent=1)
+
+    # O .bin entra primeiro: um cabeçalho novo nunca aponta para dados velhos
+    os.replace(tmp_bin, bin_path)
+    os.replace(tmp_header, header_path)
+
+
+def prune():
+    """Remove entradas cuja origem sumiu ou mudou. Retorna quantas removeu."""
+    if not os.path.isdir(CACHE_DIR):
+        return 0
+    removed = 0
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith(".json"):
+            continue
+        header_path = os.path.join(CACHE_DIR, name)
+        try:
+            with open(header_path, "r", encoding="utf-8") as f:
+                header = json.load(f)
+            source = header["source"]["path"]
+            stale = not os.path.exists(source) or source_stamp(source) != header["source"]
+        except (OSError, ValueError, KeyError):
+            stale = True
+        if stale:
+            for path in (header_path, header_path[:-5] + ".bin"):
+                if os.path.exists(path):
+                    os.remove(path)
+            removed += 1
+    return removed
+
+
+# ==========================================
+# CLI: PRÉ-CONSTRUÇÃO DO CACHE
+# ==========================================
+
+def prebuild(models_dir, force=False, weld=True):
+    """Converte todos os .fbx/.obj de um diretório e grava no cache (mesma variante usada pelo renderer)"""
+    sources = []
+    for root, _, files in os.walk(models_dir):
+        for file in sorted(files):
+            if file.lower().endswith((".fbx", ".obj")):
+                sources.append(os.path.join(root, file))
+
+    ok = 0
+    for path in sources:
+        try:
+            if path.lower().endswith(".obj"):
+                from obj_loader import load_obj
+                result = load_obj(path, use_cache=True, rebuild_cache=force, weld=weld, optimize=weld)
+                success = result[0] is not None
+            else:
+                from fbx_loader import load_fbx_model
+                success = load_fbx_model(path, use_cache=True, rebuild_cache=force, weld=weld, optimize=weld) is not None
+        except ImportError as e:
+            print(f"⚠️ Loader indisponível para {path}: {e}")
+            continue
+
+        if success:
+            ok += 1
+            print(f"✅ Cache pronto: {path}")
+        else:
+            print(f"❌ Falha ao converter: {path}")
+
+    print(f"📦 {ok}/{len(sources)} malhas em cache ({CACHE_DIR})")
+    return ok == len(sources)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pré-constrói o cache binário das malhas FBX/OBJ.")
+    parser.add_argument("models_dir", nargs="?", default="FBX models", help="Diretório com os modelos")
+    parser.add_argument("--forcar", action="store_true", help="Reconverte mesmo com cache válido")
+    parser.add_argument("--limpar", action="store_true", help="Remove entradas obsoletas antes")
+    parser.add_argument("--sem-soldar", action="store_true", help="Gera a variante sem soldagem de vértices")
+    args = parser.parse_args()
+
+    if args.limpar:
+        print(f"🧹 {prune()} entradas obsoletas removidas.")
+    sys.exit(0 if prebuild(args.models_dir, force=args.forcar, weld=not args.sem_soldar) else 1)
@@ -0,0 +1,265 @@
+import numpy as np
+
+# ==========================================
+# SOLDAGEM DE VÉRTICES (GEOMETRIA INDEXADA)
+# ==========================================
+
+def weld_vertices(attributes, indices=None, tolerances=(1e-5, 1e-3, 1e-5)):
+    """
+    Junta vértices iguais (posição, normal, uv...) e gera um index buffer real.
+
+    attributes : lista de arrays (N, k) por canto de triângulo (malha "desenrolada")
+    indices    : índices opcionais que referenciam os atributos; se None usa 0..N-1
+    tolerances : tolerância de quantização por atributo (ou um único valor)
+
+    Cada atributo é quantizado pela sua tolerância e a tupla inteira vira uma
+    chave binária (view estruturada) para o np.unique. A ordem dos vértices
+    resultantes segue a primeira ocorrência, preservando a localidade da malha.
+
+    Retorna (lista de atributos compactos, indices uint32).
+    """
+    attributes = [np.asarray(a) for a in attributes]
+    if indices is not None:
+        attributes = [a[np.asarray(indices, dtype=np.int64)] for a in attributes]
+
+    corner_count = len(attributes[0])
+    if corner_count == 0:
+        return attributes, np.zeros(0, dtype=np.uint32)
+
+    if np.isscalar(tolerances):
+        tolerances = [tolerances] * len(attributes)
+
+    quantized = np.hstack([
+        np.round(a.reshape(corner_count, -1).astype(np.float64) / tol).astype(np.int64)
+        for a, tol in zip(attributes, tolerances)
+    ])
+    quantized = np.ascontiguousarray(quantized)
+    keys = quantized.view(np.dtype((np.void, quantized.dtype.itemsize * quantized.shape[1]))).ravel()
+
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+    # Renumera os vértices únicos na ordem da primeira ocorrência
+    order = np.argsort(first, kind="stable")
+    remap = np.empty_like(order)
+    remap[order] = np.arange(len(order))
+
+    welded = [a[first[order]] for a in attributes]
+    welded_indices = remap[inverse.ravel()].astype(np.uint32)
+    return welded, welded_indices
+
+
+# ==========================================
+# OTIMIZAÇÃO DO CACHE PÓS-TRANSFORMAÇÃO (TIPSIFY)
+# ==========================================
+
+def _vertex_triangle_adjacency(triangles, vertex_count):
+    """Lista de triângulos por vértice no formato CSR (offsets, tri_ids)"""
+    flat = triangles.ravel()
+    counts = np.bincount(flat, minlength=vertex_count)
+    offsets = np.zeros(vertex_count + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    tri_ids = np.repeat(np.arange(len(triangles)), 3)[np.argsort(flat, kind="stable")]
+    return offsets, tri_ids, counts
+
+
+def tipsify(indices, vertex_count, cache_size=16):
+    """
+    Reordena os triângulos para o cache de vértices da GPU (Sander et al., 2007).
+
+    Percorre a malha "em leque" a partir de um vértice, emitindo todos os seus
+    triângulos ainda não emitidos e escolhendo como próximo leque o vértice
+    que continuará no cache. Roda em tempo linear e não depende do tamanho
+    exato do cache do hardware.
+
+    Retorna (novos índices uint32, offsets dos clusters em triângulos).
+    Os clusters são os trechos entre "dead-ends", usados pelo reordenamento
+    de overdraw.
+    """
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    tri_count = len(triangles)
+    if tri_count == 0:
+        return np.zeros(0, dtype=np.uint32), [0]
+
+    offsets, adj, counts = _vertex_triangle_adjacency(triangles, vertex_count)
+    offsets = offsets.tolist()
+    adj = adj.tolist()
+    tris = triangles.tolist()
+    live = counts.tolist()
+    cache_time = [0] * vertex_count
+    emitted = bytearray(tri_count)
+
+    output = []
+    clusters = [0]
+    dead_end = []
+    time = cache_size + 1
+    cursor = 0
+
+    # Primeiro leque: primeiro vértice realmente usado
+    fanning = int(triangles[0, 0])
+
+    while fanning >= 0:
+        candidates = []
+        for t in adj[offsets[fanning]:offsets[fanning + 1]]:
+            if emitted[t]:
+                continue
+            for v in tris[t]:
+                output.append(v)
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if time - cache_time[v] > cache_size:
+                    cache_time[v] = time
+                    time += 1
+            emitted[t] = 1
+
+        # Próximo leque: candidato que ainda estará no cache
+        best, best_priority = -1, -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = 0
+                if time - cache_time[v] + 2 * live[v] <= cache_size:
+                    priority = time - cache_time[v]
+                if priority > best_priority:
+                    best, best_priority = v, priority
+
+        if best == -1:
+            # Dead-end: volta pela pilha de vértices recentes ou avança o cursor
+            if len(output) // 3 < tri_count:
+                clusters.append(len(output) // 3)
+            while dead_end:
+                d = dead_end.pop()
+                if live[d] > 0:
+                    best = d
+                    break
+            while best == -1 and cursor < vertex_count:
+                if live[cursor] > 0:
+                    best = cursor
+                cursor += 1
+        fanning = best
+
+    return np.array(output, dtype=np.uint32), clusters
+
+
+def optimize_overdraw(indices, positions, clusters):
+    """
+    Ordena os clusters do Tipsify de fora para dentro (Sander et al., 2007).
+
+    Clusters cuja normal média aponta para fora do centro da malha tendem a
+    ocultar os demais, então são desenhados primeiro. É independente da
+    câmera e preserva a localidade de cache dentro de cada cluster.
+    """
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    if len(clusters) <= 1:
+        return np.asarray(indices, dtype=np.uint32)
+
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    p0, p1, p2 = (positions[triangles[:, k]] for k in range(3))
+    area_normals = np.cross(p1 - p0, p2 - p0)
+    centroids = (p0 + p1 + p2) / 3.0
+    areas = np.linalg.norm(area_normals, axis=1)
+
+    starts = np.asarray(clusters, dtype=np.int64)
+    cluster_normal = np.add.reduceat(area_normals, starts, axis=0)
+    cluster_area = np.add.reduceat(areas, starts)[:, None]
+    cluster_centroid = np.add.reduceat(centroids * areas[:, None], starts, axis=0)
+    cluster_centroid /= np.maximum(cluster_area, 1e-12)
+
+    mesh_centroid = (centroids * areas[:, None]).sum(axis=0) / max(areas.sum(), 1e-12)
+    score = np.einsum("ij,ij->i", cluster_centroid - mesh_centroid, cluster_normal)
+
+    bounds = np.append(starts, len(triangles))
+    order = np.argsort(-score, kind="stable")
+    reordered = np.concatenate([triangles[bounds[c]:bounds[c + 1]] for c in order])
+    return reordered.ravel().astype(np.uint32)
+
+
+def optimize_vertex_fetch(indices, vertex_count):
+    """
+    Renumera os vértices na ordem em que o index buffer os usa.
+
+    Retorna (novos índices, remap) onde atributo_novo = atributo[remap].
+    Vértices não referenciados são descartados.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    used, first = np.unique(indices, return_index=True)
+    remap = used[np.argsort(first, kind="stable")]
+    new_index = np.full(vertex_count, -1, dtype=np.int64)
+    new_index[remap] = np.arange(len(remap))
+    return new_index[indices].astype(np.uint32), remap
+
+
+def optimize_mesh(attributes, indices, cache_size=16):
+    """
+    Pipeline completo: Tipsify -> overdraw -> vertex fetch.
+
+    attributes : lista de arrays (V, k); o primeiro deve ser a posição
+    Retorna (atributos reordenados, índices uint32).
+    """
+    vertex_count = len(attributes[0])
+    indices, clusters = tipsify(indices, vertex_count, cache_size)
+    indices = optimize_overdraw(indices, attributes[0], clusters)
+    indices, remap = optimize_vertex_fetch(indices, vertex_count)
+    return [np.asarray(a)[remap] for a in attributes], indices
+
+
+# ==========================================
+# MÉTRICAS (ACMR / ATVR)
+# ==========================================
+
+def simulate_vertex_cache(indices, cache_size=16):
+    """Simula um cache FIFO de vértices e retorna o número de misses"""
+    indices = np.asarray(indices, dtype=np.int64)
+    if len(indices) == 0:
+        return 0
+    stamp = [-cache_size - 1] * (int(indices.max()) + 1)
+    misses = 0
+    for v in indices.tolist():
+        # Com FIFO, v está no cache se entrou há menos de cache_size misses
+        if misses - stamp[v] > cache_size:
+            stamp[v] = misses
+            misses += 1
+    return misses
+
+
+def cache_metrics(indices, cache_size=16):
+    """
+    ACMR: vértices transformados por triângulo (ideal ~0.5, pior caso 3.0)
+    ATVR: vértices transformados por vértice único (ideal 1.0)
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    tri_count = max(len(indices) // 3, 1)
+    unique = max(len(np.unique(indices)), 1)
+    misses = simulate_vertex_cache(indices, cache_size)
+    return {"acmr": misses / tri_count, "atvr": misses / unique, "misses": misses}
+
+
+def print_cache_report(name, before, after, cache_sizes=(16, 32)):
+    """Imprime ACMR/ATVR antes e depois da otimização para vários tamanhos de cache"""
+    print(f"📊 {name}: {len(before) // 3} triângulos")
+    for size in cache_sizes:
+        b = cache_metrics(before, size)
+        a = cache_metrics(after, size)
+        print(f"   cache {size:2d}: ACMR {b['acmr']:.3f} -> {a['acmr']:.3f} | "
+              f"ATVR {b['atvr']:.3f} -> {a['atvr']:.3f}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Relatório offline: python mesh_optimizer.py "FBX models/Mutant.fbx" ...
+    for path in sys.argv[1:]:
+        if path.lower().endswith(".obj"):
+            from obj_loader import load_obj
+            vertices, uvs, normals, indices = load_obj(path, weld=True)
+            if vertices is None:
+                continue
+            positions = vertices.reshape(-1, 3)
+        else:
+            from fbx_loader import load_fbx_model
+            mesh_data = load_fbx_model(path, weld=True)
+            if not mesh_data:
+                continue
+            positions, indices = mesh_data[0], mesh_data[3]
+
+        (_,), optimized = optimize_mesh([positions], indices)
+        print_cache_report(path, indices, optimized)
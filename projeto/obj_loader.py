@@ -1,49 +1,59 @@
 import numpy as np
 from OpenGL.GL import *
 import ctypes
+import os
+import mesh_cache
+from mesh_optimizer import weld_vertices, optimize_mesh
+from obj_reader import read_obj
 
-def load_obj(filename):
+# Incrementar sempre que a saída do loader mudar (invalida o cache em disco)
+LOADER_VERSION = 2
+
+def load_obj(filename, use_cache=True, rebuild_cache=False, weld=False, optimize=False):
     """
     Função independente para carregar dados do OBJ.
     Retorna arrays planos (flat) prontos para OpenGL.
     Resolve o erro de importação no terreno.py.
-    """
-    v_list = []
-    vt_list = []
-    vn_list = []
     
-    final_vertices = []
-    final_uvs = []
-    final_normals = []
-    final_indices = []
+    Com use_cache, reaproveita a conversão gravada pelo mesh_cache e evita
+    reler o texto do arquivo; rebuild_cache força a releitura.
+    Com weld, vértices repetidos são soldados e os índices passam a ser reais;
+    com optimize (requer weld), os índices são reordenados para o cache de
+    vértices da GPU (mesh_optimizer.optimize_mesh).
+    """
+    variant = ("weld+opt" if optimize else "weld") if weld else ""
+    if use_cache and not rebuild_cache and os.path.exists(filename):
+        cached = mesh_cache.load(filename, "obj", LOADER_VERSION, variant)
+        if cached:
+            arrays, _ = cached
+            return arrays["vertices"], arrays["uvs"], arrays["normals"], arrays["indices"]
+
+    vertices, uvs, normals, indices = _parse_obj(filename)
+
+    if vertices is not None and weld:
+        corner_count = len(indices)
+        (vertices, uvs, normals), indices = weld_vertices(
+            [vertices.reshape(-1, 3), uvs.reshape(-1, 2), normals.reshape(-1, 3)], indices,
+            tolerances=(1e-5, 1e-5, 1e-3))
+        print(f"🔗 Vértices soldados: {corner_count} -> {len(vertices)}")
+        if optimize:
+            (vertices, uvs, normals), indices = optimize_mesh([vertices, uvs, normals], indices)
+        vertices, uvs, normals = vertices.flatten(), uvs.flatten(), normals.flatten()
+
+    if vertices is not None and use_cache:
+        mesh_cache.store(filename, "obj", LOADER_VERSION,
+                         {"vertices": vertices, "uvs": uvs, "normals": normals, "indices": indices},
+                         variant=variant)
+    return vertices, uvs, normals, indices
 
+def _parse_obj(filename):
+    """
+    Leitura do texto do OBJ (caminho frio, sem cache) via obj_reader.read_obj.
+    Desenrola os índices em arrays planos por canto de triângulo; sem vt os
+    UVs ficam zerados e sem vn usa a normal da face.
+    """
     try:
-        with open(filename, 'r') as f:
-            for line in f:
-                if line.startswith('v '):
-                    _, x, y, z = line.split()
-                    v_list.append([float(x), float(y), float(z)])
-                elif line.startswith('vt '):
-                    _, u, v = line.split()
-                    vt_list.append([float(u), float(v)])
-                elif line.startswith('vn '):
-                    _, nx, ny, nz = line.split()
-                    vn_list.append([float(nx), float(ny), float(nz)])
-                elif line.startswith('f '):
-                    parts = line.split()[1:]
-                    for p in parts:
-                        # O formato é v/vt/vn
-                        vals = p.split('/')
-                        v_i = int(vals[0])
-                        vt_i = int(vals[1])
-                        vn_i = int(vals[2])
-                        
-                        # Adiciona os dados na ordem correta (desenrolando índices)
-                        final_vertices.append(v_list[v_i - 1])
-                        final_uvs.append(vt_list[vt_i - 1])
-                        final_normals.append(vn_list[vn_i - 1])
-                        
-                        final_indices.append(len(final_indices)) 
+        positions, texcoords, normals, corners = read_obj(filename)
     except FileNotFoundError:
         print(f"❌ ERRO: Arquivo {filename} não encontrado.")
         return None, None, None, None
@@ -51,13 +61,21 @@ def load_obj(filename):
         print(f"❌ ERRO ao ler OBJ: {e}")
         return None, None, None, None
 
-    # Converte listas para arrays numpy float32 planos
-    vertices = np.array(final_vertices, dtype=np.float32).flatten()
-    uvs = np.array(final_uvs, dtype=np.float32).flatten()
-    normals = np.array(final_normals, dtype=np.float32).flatten()
-    indices = np.array(final_indices, dtype=np.uint32)
-    
-    return vertices, uvs, normals, indices
+    vertices = positions[corners[:, 0]]
+    if len(corners) and corners[0, 1] >= 0:
+        uvs = texcoords[corners[:, 1]]
+    else:
+        uvs = np.zeros((len(corners), 2), dtype=np.float32)
+    if len(corners) and corners[0, 2] >= 0:
+        corner_normals = normals[corners[:, 2]]
+    else:
+        tris = vertices.reshape(-1, 3, 3)
+        face_n = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+        face_n /= np.maximum(np.linalg.norm(face_n, axis=1, keepdims=True), 1e-12)
+        corner_normals = np.repeat(face_n, 3, axis=0).astype(np.float32)
+
+    indices = np.arange(len(corners), dtype=np.uint32)
+    return vertices.flatten(), uvs.flatten(), corner_normals.flatten(), indices
 
 class OBJModel:
     """
@@ -123,10 +141,8 @@ class OBJModel:
         glBindVertexArray(0)
 
     def draw(self, program, model_matrix):
-        # Define a matriz de modelo no shader
-        loc = glGetUniformLocation(program, "model")
-        if loc != -1:
-            glUniformMatrix4fv(loc, 1, GL_FALSE, model_matrix)
+        # Define a matriz de modelo no shader (program: ShaderProgram)
+        program.set_mat4("model", model_matrix)
             
         glBindVertexArray(self.vao)
         glDrawElements(GL_TRIANGLES, len(self.indices), GL_UNSIGNED_INT, None)
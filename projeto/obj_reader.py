@@ -0,0 +1,228 @@
+import os
+import sys
+import tempfile
+import numpy as np
+
+# ==========================================
+# LEITOR RÁPIDO DE OBJ (BLOCOS + NUMPY)
+# ==========================================
+#
+# O arquivo é lido em blocos grandes (chunk_size bytes, cortados no último
+# '\n'). Em cada bloco as linhas são classificadas pelos dois primeiros
+# bytes, as linhas de um mesmo tipo são copiadas juntas para um buffer
+# (com a palavra-chave trocada por espaço) e convertidas de uma vez com
+# np.fromstring. Nenhuma linha vira objeto Python.
+#
+# Suporta faces v, v/vt, v//vn e v/vt/vn, índices negativos (relativos ao
+# que já foi lido) e polígonos com n lados (triangulados em leque).
+# Linhas de outros tipos (o, g, s, usemtl, mtllib, vp, comentários) são ignoradas.
+#
+# python obj_reader.py --teste   -> autoteste (larguras de linha e formatos de face misturados)
+
+_SPACE, _TAB, _CR, _LF, _SLASH = 32, 9, 13, 10, 47
+
+
+def _gather_lines(data, starts, lengths, mask, keyword_len):
+    """
+    Concatena as linhas selecionadas (com o '\\n') trocando a palavra-chave
+    por espaços. Retorna (bytes, comprimento de cada linha).
+    """
+    sel_starts, sel_lengths = starts[mask], lengths[mask]
+    if len(sel_starts) == 0:
+        return np.zeros(0, dtype=np.uint8), sel_lengths
+    line_offsets = np.cumsum(sel_lengths) - sel_lengths
+    idx = np.repeat(sel_starts - line_offsets, sel_lengths) + np.arange(int(sel_lengths.sum()))
+    out = data[idx]
+    for k in range(keyword_len):
+        out[line_offsets + k] = _SPACE
+    return out, sel_lengths
+
+
+def _token_starts(out):
+    """Máscara do primeiro byte de cada token (números separados por espaço, tab ou fim de linha)"""
+    separators = (out == _SPACE) | (out == _TAB) | (out == _CR) | (out == _LF)
+    return ~separators & np.r_[True, separators[:-1]]
+
+
+def _parse_floats(out, lengths, components):
+    """Converte as linhas de um tipo em (N, components), ignorando colunas extras (w, cores)"""
+    line_count = len(lengths)
+    if line_count == 0:
+        return np.zeros((0, components), dtype=np.float32)
+    # Tokens por linha: o reshape direto só vale se todas as linhas têm a mesma largura
+    line_id = np.repeat(np.arange(line_count), lengths)
+    tokens = np.bincount(line_id[_token_starts(out)], minlength=line_count)
+    cols = int(tokens[0])
+    if cols >= components and np.all(tokens == cols):
+        values = np.fromstring(out.tobytes(), dtype=np.float64, sep=" ")
+        if len(values) == cols * line_count:
+            return values.reshape(line_count, cols)[:, :components].astype(np.float32)
+
+    # Número de colunas variando entre linhas: caminho lento, linha a linha
+    # (componentes ausentes, como o v de "vt u", valem 0)
+    rows = [line.split()[:components] for line in out.tobytes().splitlines() if line.strip()]
+    return np.array([row + [b"0"] * (components - len(row)) for row in rows], dtype=np.float32)
+
+
+def _parse_faces(out, lengths):
+    """
+    Retorna (valores por canto (C, m), cantos por face, m, tem_vt).
+    m = 1 (v), 2 (v/vt ou v//vn) ou 3 (v/vt/vn). Cada canto é conferido: o
+    número de barras (e de "//") tem que ser o mesmo em todos.
+    """
+    face_count = len(lengths)
+    token_start = _token_starts(out)
+    line_id = np.repeat(np.arange(face_count), lengths)
+    corners_per_face = np.bincount(line_id[token_start], minlength=face_count)
+    corner_count = int(corners_per_face.sum())
+
+    # Barras e "//" de cada canto (byte -> índice do token em que está)
+    token_id = np.cumsum(token_start) - 1
+    slash = out == _SLASH
+    double = np.r_[slash[:-1] & slash[1:], False]
+    slashes = np.bincount(token_id[slash], minlength=corner_count)
+    doubles = np.bincount(token_id[double], minlength=corner_count)
+    per_corner = slashes + 1 - doubles
+    m = int(per_corner[0]) if corner_count else 1
+    mixed = corner_count and (np.any(per_corner != m) or np.any(doubles != doubles[0]))
+    if mixed or m not in (1, 2, 3):
+        raise ValueError("formatos de face misturados no mesmo arquivo (v, v/vt, v//vn, v/vt/vn)")
+
+    out = out.copy()
+    out[slash] = _SPACE
+    values = np.fromstring(out.tobytes(), dtype=np.int64, sep=" ")
+    if len(values) != m * corner_count:
+        raise ValueError("face com índice inválido")
+    has_vt = m == 3 or (m == 2 and not (corner_count and doubles[0]))
+    return values.reshape(corner_count, m), corners_per_face, m, has_vt
+
+
+def _fan_triangulate(corners_per_face):
+    """Índices dos cantos (em ordem de arquivo) dos triângulos em leque de cada face"""
+    tri_per_face = np.maximum(corners_per_face - 2, 0)
+    first_corner = np.cumsum(corners_per_face) - corners_per_face
+    total = int(tri_per_face.sum())
+    face_of_tri = np.repeat(np.arange(len(corners_per_face)), tri_per_face)
+    local = np.arange(total) - np.repeat(np.cumsum(tri_per_face) - tri_per_face, tri_per_face)
+    a = first_corner[face_of_tri]
+    b = a + local + 1
+    return np.stack([a, b, b + 1], axis=1).ravel()
+
+
+def read_obj(filename, chunk_size=1 << 25):
+    """
+    Lê um OBJ em blocos e retorna a geometria indexada:
+
+        positions (V,3) float32, texcoords (T,2) float32, normals (N,3) float32,
+        corners (3*F, 3) int64 -> [v, vt, vn] de cada canto de triângulo,
+        base 0, com -1 quando o atributo não existe no arquivo.
+
+    Lança FileNotFoundError se o arquivo não existir.
+    """
+    pos_blocks, uv_blocks, normal_blocks, corner_blocks = [], [], [], []
+    counts = np.zeros(3, dtype=np.int64)  # v, vt, vn lidos até o bloco atual
+    attribute_columns = None
+
+    with open(filename, "rb") as f:
+        tail = b""
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                if not tail:
+                    break
+                buf, tail = tail + b"\n", b""
+            else:
+                buf = tail + block
+                cut = buf.rfind(b"\n")
+                if cut < 0:
+                    tail = buf
+                    continue
+                buf, tail = buf[:cut + 1], buf[cut + 1:]
+
+            data = np.frombuffer(buf, dtype=np.uint8)
+            newlines = np.flatnonzero(data == _LF)
+            starts = np.r_[0, newlines[:-1] + 1]
+            lengths = newlines + 1 - starts
+
+            padded = np.r_[data, _LF, _LF]
+            c0, c1, c2 = padded[starts], padded[starts + 1], padded[np.minimum(starts + 2, len(padded) - 1)]
+            ws1 = (c1 == _SPACE) | (c1 == _TAB)
+            ws2 = (c2 == _SPACE) | (c2 == _TAB)
+            is_v = (c0 == ord("v")) & ws1
+            is_vt = (c0 == ord("v")) & (c1 == ord("t")) & ws2
+            is_vn = (c0 == ord("v")) & (c1 == ord("n")) & ws2
+            is_f = (c0 == ord("f")) & ws1
+
+            for mask, keyword_len, components, blocks in ((is_v, 1, 3, pos_blocks),
+                                                           (is_vt, 2, 2, uv_blocks),
+                                                           (is_vn, 2, 3, normal_blocks)):
+                out, line_lengths = _gather_lines(data, starts, lengths, mask, keyword_len)
+                blocks.append(_parse_floats(out, line_lengths, components))
+
+            if is_f.any():
+                out, face_lengths = _gather_lines(data, starts, lengths, is_f, 1)
+                values, corners_per_face, m, has_vt = _parse_faces(out, face_lengths)
+
+                columns = [0] + ([1] if has_vt else []) + ([2] if m == 3 or (m == 2 and not has_vt) else [])
+                if attribute_columns is None:
+                    attribute_columns = columns
+                elif attribute_columns != columns:
+                    raise ValueError("formatos de face misturados no mesmo arquivo (v, v/vt, v//vn, v/vt/vn)")
+
+                # Índices negativos contam a partir do que foi lido antes da face
+                before = np.cumsum(np.stack([is_v, is_vt, is_vn], axis=1), axis=0)[is_f] + counts
+                before = np.repeat(before, corners_per_face, axis=0)
+
+                corners = np.full((len(values), 3), -1, dtype=np.int64)
+                for k, col in enumerate(columns):
+                    idx = values[:, k]
+                    corners[:, col] = np.where(idx < 0, idx + before[:, col], idx - 1)
+                corner_blocks.append(corners[_fan_triangulate(corners_per_face)])
+
+            counts += [int(is_v.sum()), int(is_vt.sum()), int(is_vn.sum())]
+
+    positions = np.concatenate(pos_blocks) if pos_blocks else np.zeros((0, 3), dtype=np.float32)
+    texcoords = np.concatenate(uv_blocks) if uv_blocks else np.zeros((0, 2), dtype=np.float32)
+    normals = np.concatenate(normal_blocks) if normal_blocks else np.zeros((0, 3), dtype=np.float32)
+    corners = np.concatenate(corner_blocks) if corner_blocks else np.zeros((0, 3), dtype=np.int64)
+    return positions, texcoords, normals, corners
+
+
+def self_test():
+    """Larguras de linha diferentes (xyz, xyzw, xyzrgb) e formatos de face; retorna True se passou"""
+    cases = [
+        # (conteúdo, posições esperadas, vt esperados, cantos esperados ou None = ValueError)
+        ("v 0 0 0\nv 1 2 3 .5 .5\nv 1 1 0 .5 .5\nv 7 7 7\nf 1 2 3\nf 1 3 4\n",
+         [[0, 0, 0], [1, 2, 3], [1, 1, 0], [7, 7, 7]], [], [[0, -1, -1], [1, -1, -1], [2, -1, -1],
+                                                           [0, -1, -1], [2, -1, -1], [3, -1, -1]]),
+        ("v 0 0 0 1\nv 1 0 0\nv 0 1 0 1 0.2 0.3\nvt 0.5\nvt 1 1\nvt 0 1 0\nf 1/1 2/2 3/3\n",
+         [[0, 0, 0], [1, 0, 0], [0, 1, 0]], [[0.5, 0], [1, 1], [0, 1]], [[0, 0, -1], [1, 1, -1], [2, 2, -1]]),
+        ("v 0 0 0\nv 1 0 0\nv 0 1 0\nvn 0 0 1\nf 1//1 2//1 3//1\n",
+         [[0, 0, 0], [1, 0, 0], [0, 1, 0]], [], [[0, -1, 0], [1, -1, 0], [2, -1, 0]]),
+        ("v 0 0 0\nv 1 0 0\nv 0 1 0\nvt 0 0\nvn 0 0 1\nf 1/1 2//1 3/1/1\n", None, None, None),
+        ("v 0 0 0\nv 1 0 0\nv 0 1 0\nv 1 1 0\nvt 0 0\nf 1/1 2/1 3/1\nf 2 4 3\n", None, None, None),
+    ]
+    ok = True
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "teste.obj")
+        for i, (text, positions, texcoords, corners) in enumerate(cases):
+            with open(path, "w") as f:
+                f.write(text)
+            try:
+                got = read_obj(path)
+            except ValueError:
+                passed = corners is None
+            else:
+                passed = (corners is not None and np.allclose(got[0], np.reshape(positions, (-1, 3)))
+                          and np.allclose(got[1], np.reshape(texcoords, (-1, 2)))
+                          and np.array_equal(got[3], corners))
+            print(f"{'✅' if passed else '❌'} caso {i + 1}")
+            ok = ok and passed
+    return ok
+
+
+if __name__ == "__main__":
+    if "--teste" not in sys.argv:
+        print("Uso: python obj_reader.py --teste")
+        sys.exit(2)
+    sys.exit(0 if self_test() else 1)
@@ -2,29 +2,95 @@ import numpy as np
 import ctypes
 from OpenGL.GL import *
 from PIL import Image
+from gl_state import gl_state
+from texture_baker import load_baked
+from texture_manager import s3tc_supported, create_baked_texture
+from geometry_utils import compute_bounding_box, get_bounding_box_center
+from material_array import NO_MATERIAL
+from cenario import INSTANCE_STRIDE
 
-def load_texture(path):
-    if path is None:
+def load_texture(path, pixels=None):
+    """
+    Cria a textura GL. pixels (altura, largura, 4) uint8 já decodificados
+    (ex.: pelo asset_pipeline em outro processo) evitam abrir a imagem aqui.
+    """
+    if path is None and pixels is None:
         print("⚠ Modelo sem textura.")
         return None
     
-    img = Image.open(path).convert("RGBA")
-    data = img.tobytes()
+    # Versão pré-processada (texture_baker): mipmaps completos, BC1/BC3 se o driver suportar
+    baked = load_baked(path, allow_compressed=s3tc_supported()) if pixels is None else None
+    if baked is not None:
+        tex = create_baked_texture(baked)
+        print(f"✔ Textura carregada ({baked.format.upper()}, {len(baked.levels)} níveis):", path)
+        return tex
+    
+    if pixels is None:
+        pixels = np.asarray(Image.open(path).convert("RGBA"), dtype=np.uint8)
+    height, width = pixels.shape[:2]
     
     tex = glGenTextures(1)
     glBindTexture(GL_TEXTURE_2D, tex)
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, img.width, img.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, data)
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, np.ascontiguousarray(pixels))
     glBindTexture(GL_TEXTURE_2D, 0)
     
     print("✔ Textura carregada:", path)
     return tex
 
+def bind_mesh_attributes(vbo, ebo):
+    """Liga VBO intercalado (pos, normal, uv) e EBO ao VAO atual (Loc 0 = pos, 1 = normal, 2 = uv)"""
+    glBindBuffer(GL_ARRAY_BUFFER, vbo)
+    glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, ebo)
+    
+    stride = 8 * 4
+    glEnableVertexAttribArray(0)
+    glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(0))
+    glEnableVertexAttribArray(1)
+    glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(12))
+    glEnableVertexAttribArray(2)
+    glVertexAttribPointer(2, 2, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(24))
+
+def bind_instance_attributes(instance_vbo, first_instance=0):
+    """
+    Aponta as locations 3..7 (mat4 + vec4 de material, divisor 1) para o
+    VBO de instâncias, começando no registro first_instance.
+    """
+    glBindBuffer(GL_ARRAY_BUFFER, instance_vbo)
+    base = first_instance * INSTANCE_STRIDE
+    for col in range(5):
+        loc = 3 + col
+        glEnableVertexAttribArray(loc)
+        glVertexAttribPointer(loc, 4, GL_FLOAT, GL_FALSE, INSTANCE_STRIDE, ctypes.c_void_p(base + col * 16))
+        glVertexAttribDivisor(loc, 1)
+
 class PersonagemFBX:
-    def __init__(self, mesh_data):
-        self.positions, self.normals, self.uvs, self.indices, self.texture_path = mesh_data
-        self.texture_id = load_texture(self.texture_path)
+    def __init__(self, mesh_data, texture_pixels=None, textures=None, material=None):
+        self.positions, self.normals, self.uvs, self.indices, materials = mesh_data
+        if not isinstance(materials, dict):
+            materials = {"diffuse": materials}
+        self.materials = materials
+        self.texture_path = materials.get("diffuse")
+        
+        # material: vec4 de um MaterialArray (camada + mapas presentes). Com ele
+        # os mapas vêm do array compartilhado e o personagem não cria textura própria
+        self.material = tuple(material) if material is not None else NO_MATERIAL
+        
+        # Com um TextureManager a textura chega de forma assíncrona (placeholder
+        # até ficar residente) e é compartilhada entre personagens do mesmo arquivo
+        self.texture_handle = None
+        self._texture_id = None
+        if self.material_layer < 0:
+            if textures is not None and self.texture_path:
+                self.texture_handle = textures.request(self.texture_path, pixels=texture_pixels)
+            else:
+                self._texture_id = load_texture(self.texture_path, texture_pixels)
+        
+        # Esfera envolvente local (usada no frustum culling das instâncias)
+        self.bounding_box = compute_bounding_box(self.positions, self.indices.reshape(-1, 3, 1))
+        self.bounding_center = get_bounding_box_center(self.bounding_box)
+        self.bounding_radius = float(np.linalg.norm(self.bounding_box[1] - self.bounding_center))
         
         self.vao = glGenVertexArrays(1)
         glBindVertexArray(self.vao)
@@ -39,22 +105,51 @@ class PersonagemFBX:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
         glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
         
-        stride = 8 * 4
-        glEnableVertexAttribArray(0)
-        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(1)
-        glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(12))
-        glEnableVertexAttribArray(2)
-        glVertexAttribPointer(2, 2, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(24))
-        
+        self._bind_mesh_attributes()
         glBindVertexArray(0)
         self.count = len(self.indices)
 
+    @property
+    def material_layer(self):
+        return int(self.material[0])
+
+    @property
+    def texture_id(self):
+        return self.texture_handle.id if self.texture_handle is not None else self._texture_id
+
+    def _bind_mesh_attributes(self):
+        bind_mesh_attributes(self.vbo, self.ebo)
+
+    def create_instanced_vao(self, instance_vbo):
+        """
+        Cria um VAO com a malha + registro por instância (divisor 1):
+        a mat4 ocupa as locations 3..6 (uma coluna vec4 cada) e o vec4 de
+        material a location 7.
+        """
+        # Pode ser criado no meio do frame: o bind passa pelo rastreador de estado
+        vao = glGenVertexArrays(1)
+        gl_state.bind_vertex_array(vao)
+        self._bind_mesh_attributes()
+        bind_instance_attributes(instance_vbo)
+        
+        gl_state.bind_vertex_array(0)
+        return vao
+
     def draw(self, program, model_matrix):
-        loc = glGetUniformLocation(program, "model")
-        glUniformMatrix4fv(loc, 1, GL_TRUE, model_matrix)
+        program.set_mat4("model", model_matrix, transpose=True)
         
-        glBindTexture(GL_TEXTURE_2D, self.texture_id)
-        glBindVertexArray(self.vao)
+        gl_state.bind_texture(GL_TEXTURE_2D, self.texture_id, 0)
+        gl_state.bind_vertex_array(self.vao)
         glDrawElements(GL_TRIANGLES, self.count, GL_UNSIGNED_INT, None)
-        glBindVertexArray(0)
\ No newline at end of file
+        gl_state.draw_call()
+
+    def submit_instanced(self, draw_list, program, vao, instance_count, bind_textures=True):
+        """
+        Envia o draw instanciado para a DrawList (textura na unidade 0 se
+        bind_textures). Com MaterialArray não há textura própria: os arrays
+        são ligados uma vez para todos (MaterialArray.bind).
+        """
+        texture = self.texture_id if bind_textures and self.material_layer < 0 else None
+        draw_list.submit(program, vao, texture,
+                         lambda: glDrawElementsInstanced(GL_TRIANGLES, self.count, GL_UNSIGNED_INT, None, instance_count),
+                         setup=lambda: program.set_int("useInstancing", 1))
\ No newline at end of file
@@ -0,0 +1,268 @@
+import time
+import argparse
+import numpy as np
+
+# ==========================================
+# DISTRIBUIÇÃO PROCEDURAL (POISSON-DISK) DAS INSTÂNCIAS
+# ==========================================
+#
+# Cada instância é um disco em XZ de raio (raio do modelo * escala +
+# spacing / 2) e dois discos nunca se sobrepõem. Os candidatos são sorteados
+# como no algoritmo de Bridson (grade de fundo + até `attempts` tentativas
+# por célula antes de desistir dela), mas em lote:
+#
+#   - a grade tem células de lado 2 * maior raio, então um candidato só
+#     conflita com amostras das 3x3 células vizinhas;
+#   - as células são divididas em 9 fases (i % 3, j % 3); células da mesma
+#     fase estão a pelo menos 2 células de distância e recebem um candidato
+#     cada ao mesmo tempo, testado contra os vizinhos de uma vez com NumPy.
+#
+# Restrições por candidato: limites, zonas de exclusão (círculos e
+# retângulos), mapa de densidade (probabilidade de aceitar), inclinação
+# máxima do terreno. Com terrain, y vem de terrain.height_at.
+# Mesma seed + mesmos parâmetros = mesma distribuição (exportador e renderer).
+#
+# python scatter.py --quantidade 100000   -> tempo e verificação do espaçamento
+
+# Distribuição dos personagens, comum a spawn_personagens e SceneRenderer
+CHARACTER_LAYOUT = {
+    "seed": 2024,
+    "count_per_model": 20,
+    "bounds": (-140.0, -140.0, 140.0, 140.0),
+    "scale_range": (1.3, 1.5),
+    "spacing": 1.0,
+    "exclusions": [(0.0, 10.0, 6.0)],   # ponto de partida da câmera livre
+}
+
+
+class Placements:
+    """Resultado de scatter: positions (N, 3), yaw (N,) em graus, scale (N,), model_ids (N,)"""
+    def __init__(self, positions, yaw, scale, model_ids, radii):
+        self.positions = positions
+        self.yaw = yaw
+        self.scale = scale
+        self.model_ids = model_ids
+        self.radii = radii
+
+    def __len__(self):
+        return len(self.positions)
+
+    def of_model(self, model_id):
+        """Índices das instâncias de um modelo"""
+        return np.flatnonzero(self.model_ids == model_id)
+
+
+def footprint_radius(positions):
+    """Raio em XZ do modelo em torno da sua origem (onde a instância é posicionada)"""
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+    return float(np.sqrt(positions[:, 0] ** 2 + positions[:, 2] ** 2).max()) if len(positions) else 0.0
+
+
+def _excluded(x, z, exclusions):
+    """Máscara dos pontos dentro de alguma zona: (x, z, raio) ou (xmin, zmin, xmax, zmax)"""
+    mask = np.zeros(len(x), dtype=bool)
+    for zone in exclusions:
+        if len(zone) == 3:
+            cx, cz, r = zone
+            mask |= (x - cx) ** 2 + (z - cz) ** 2 < r * r
+        else:
+            x0, z0, x1, z1 = zone
+            mask |= (x >= x0) & (x <= x1) & (z >= z0) & (z <= z1)
+    return mask
+
+
+def _density_at(density, bounds, x, z):
+    """Amostra (mais próxima) do mapa de densidade (linhas = z) que cobre bounds"""
+    rows, cols = density.shape
+    x0, z0, x1, z1 = bounds
+    j = np.clip(((x - x0) / (x1 - x0) * cols).astype(np.int64), 0, cols - 1)
+    i = np.clip(((z - z0) / (z1 - z0) * rows).astype(np.int64), 0, rows - 1)
+    return density[i, j]
+
+
+def _model_quotas(count, n_models, weights):
+    """Quantas instâncias de cada modelo: count * weights arredondado pelo maior resto (soma = count)"""
+    weights = np.full(n_models, 1.0 / n_models) if weights is None else weights
+    exact = count * weights
+    quotas = np.floor(exact).astype(np.int64)
+    quotas[np.argsort(quotas - exact, kind="stable")[:count - quotas.sum()]] += 1
+    return quotas
+
+
+def scatter(count, model_radii, bounds=(-150.0, -150.0, 150.0, 150.0), seed=0, weights=None,
+            scale_range=(1.0, 1.0), spacing=0.0, exclusions=(), density=None, terrain=None,
+            max_slope=None, attempts=30):
+    """
+    Até count instâncias sem sobreposição dentro de bounds (xmin, zmin, xmax, zmax).
+    model_radii: raio em XZ de cada modelo (footprint_radius); weights: fração
+    de cada modelo no total (iguais se None). As cotas por modelo são exatas:
+    cada candidato sorteia o modelo pela cota que ainda falta x raio^4, então
+    os maiores (mais rejeitados) entram primeiro, enquanto há espaço, e os
+    menores preenchem as sobras. density: array
+    (linhas, colunas) em [0, 1] sobre bounds. max_slope: graus (requer terrain
+    com normal_at). Se a área encher antes, retorna menos instâncias (com aviso).
+    """
+    rng = np.random.default_rng(seed)
+    model_radii = np.asarray(model_radii, dtype=np.float64)
+    weights = None if weights is None else np.asarray(weights, dtype=np.float64) / np.sum(weights)
+    x0, z0, x1, z1 = bounds
+    half_spacing = spacing / 2.0
+    r_max = model_radii.max() * scale_range[1] + half_spacing
+    r_min = max(model_radii.min() * scale_range[0] + half_spacing, 1e-3)
+
+    # Grade de fundo: células de lado 2 * r_max, até `capacity` amostras por célula
+    cell = max(2.0 * r_max, 1e-3)
+    nx, nz = max(1, int(np.ceil((x1 - x0) / cell))), max(1, int(np.ceil((z1 - z0) / cell)))
+    n_cells = nx * nz
+    capacity = int((cell + 2 * r_min) ** 2 * 0.9069 / (np.pi * r_min ** 2)) + 1  # empacotamento hexagonal
+    cell_xz = np.full((n_cells + 1, capacity, 2), 1e9, dtype=np.float32)   # célula extra: vizinho fora da grade
+    cell_r = np.zeros((n_cells + 1, capacity), dtype=np.float32)
+    cell_n = np.zeros(n_cells + 1, dtype=np.int64)
+
+    ci, cj = np.divmod(np.arange(n_cells), nx)
+    neighbors = np.empty((n_cells, 9), dtype=np.int64)
+    for k, (di, dj) in enumerate((di, dj) for di in (-1, 0, 1) for dj in (-1, 0, 1)):
+        ni, nj = ci + di, cj + dj
+        inside = (ni >= 0) & (ni < nz) & (nj >= 0) & (nj < nx)
+        neighbors[:, k] = np.where(inside, ni * nx + nj, n_cells)
+    phase = (ci % 3) * 3 + (cj % 3)
+    failures = np.zeros(n_cells, dtype=np.int64)
+    live = np.ones(n_cells, dtype=bool)
+
+    out_xz, out_r, out_scale, out_model = [], [], [], []
+    remaining = _model_quotas(count, len(model_radii), weights)
+    priority = np.maximum(model_radii, 1e-3) ** 4
+    total = 0
+    acceptance = 1.0
+    while total < count and live.any():
+        # Só uma fração das células por rodada quando faltam poucas amostras:
+        # assim as primeiras não se concentram nas células da fase 0. A fração
+        # acompanha a taxa de aceitação da rodada anterior, senão o fim (área
+        # cheia, só modelos grandes faltando) leva milhares de rodadas
+        fraction = min(1.0, (count - total) / max(live.sum() * acceptance, 1) * 2.0)
+        chosen = live & (rng.random(n_cells) < fraction)
+        tried, placed = 0, 0
+        for p in rng.permutation(9):
+            cells = np.flatnonzero(chosen & (phase == p))
+            if len(cells) == 0 or total >= count:
+                continue
+            m = len(cells)
+            xz = np.stack([x0 + (cj[cells] + rng.random(m)) * cell,
+                           z0 + (ci[cells] + rng.random(m)) * cell], axis=1).astype(np.float32)
+            need = remaining * priority
+            model = rng.choice(len(model_radii), m, p=need / need.sum())
+            scale = rng.uniform(scale_range[0], scale_range[1], m)
+            radius = (model_radii[model] * scale + half_spacing).astype(np.float32)
+
+            ok = (xz[:, 0] <= x1) & (xz[:, 1] <= z1)
+            if exclusions:
+                ok &= ~_excluded(xz[:, 0], xz[:, 1], exclusions)
+            if density is not None:
+                ok &= rng.random(m) < _density_at(density, bounds, xz[:, 0], xz[:, 1])
+            if max_slope is not None and terrain is not None:
+                ok &= terrain.normal_at(xz[:, 0], xz[:, 1])[:, 1] >= np.cos(np.radians(max_slope))
+
+            # Conflito com as amostras das 3x3 células vizinhas (as da mesma fase estão longe)
+            # (só as primeiras `filled` posições de cada célula podem estar ocupadas)
+            near = neighbors[cells]
+            filled = max(int(cell_n[near].max()), 1)
+            gap = ((cell_xz[:, :filled][near] - xz[:, None, None, :]) ** 2).sum(axis=-1)
+            ok &= ~np.any(gap < (cell_r[:, :filled][near] + radius[:, None, None]) ** 2, axis=(1, 2))
+
+            # Sem passar da cota de nenhum modelo: sobra sorteada dentro de cada modelo
+            accepted = rng.permutation(np.flatnonzero(ok))
+            accepted = accepted[np.argsort(model[accepted], kind="stable")]
+            groups = model[accepted]
+            rank = np.arange(len(accepted)) - np.searchsorted(groups, groups)
+            accepted = np.sort(accepted[rank < remaining[groups]])
+            rejected = np.ones(m, dtype=bool)
+            rejected[accepted] = False
+
+            target = cells[accepted]
+            slot = cell_n[target]
+            cell_xz[target, slot] = xz[accepted]
+            cell_r[target, slot] = radius[accepted]
+            cell_n[target] += 1
+            failures[target] = 0
+            failures[cells[rejected]] += 1
+            out_xz.append(xz[accepted]); out_r.append(radius[accepted])
+            out_scale.append(scale[accepted]); out_model.append(model[accepted])
+            remaining -= np.bincount(model[accepted], minlength=len(remaining))
+            total += len(accepted)
+            tried += m
+            placed += int(ok.sum())
+        live = (failures < attempts) & (cell_n[:n_cells] < capacity)
+        acceptance = max(placed / max(tried, 1), 0.01)
+
+    if total < count:
+        print(f"⚠️ Área cheia: {total} de {count} instâncias couberam com esse espaçamento "
+              f"(faltaram por modelo: {remaining.tolist()}).")
+
+    xz = np.concatenate(out_xz) if out_xz else np.zeros((0, 2))
+    positions = np.zeros((len(xz), 3), dtype=np.float32)
+    positions[:, [0, 2]] = xz
+    if terrain is not None and len(xz):
+        positions[:, 1] = terrain.height_at(xz[:, 0], xz[:, 1])
+    return Placements(positions,
+                      rng.uniform(0.0, 360.0, len(xz)).astype(np.float32),
+                      (np.concatenate(out_scale) if out_scale else np.zeros(0)).astype(np.float32),
+                      (np.concatenate(out_model) if out_model else np.zeros(0)).astype(np.int32),
+                      (np.concatenate(out_r) if out_r else np.zeros(0)).astype(np.float32))
+
+
+def character_layout(model_radii, terrain=None, **overrides):
+    """Distribuição padrão dos personagens (CHARACTER_LAYOUT), igual no exportador e no renderer"""
+    params = dict(CHARACTER_LAYOUT, **overrides)
+    count = params.pop("count_per_model") * len(model_radii)
+    return scatter(count, model_radii, terrain=terrain, **params)
+
+
+def min_gap(placements):
+    """Menor (distância - soma dos raios) entre instâncias; >= 0 se não há sobreposição (só para conferência)"""
+    n = len(placements)
+    if n < 2:
+        return np.inf
+    xz = placements.positions[:, [0, 2]].astype(np.float64)
+    radii = placements.radii.astype(np.float64)
+    cell = 2.0 * radii.max()
+    ij = np.floor((xz - xz.min(axis=0)) / cell).astype(np.int64) + 1
+    nx = ij[:, 0].max() + 2
+    keys = ij[:, 1] * nx + ij[:, 0]
+
+    # Tabela (célula, k) -> índice da instância (-1 = vazio), como em scatter
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    first = np.searchsorted(sorted_keys, sorted_keys, side="left")
+    rank = np.arange(n) - first
+    table = np.full((int(keys.max()) + nx + 2, rank.max() + 1), -1, dtype=np.int64)
+    table[sorted_keys, rank] = order
+
+    best = np.inf
+    for di in (-1, 0, 1):
+        for dj in (-1, 0, 1):
+            other = table[keys + di * nx + dj]                      # (n, k)
+            valid = (other >= 0) & (other != np.arange(n)[:, None])
+            other = np.where(valid, other, 0)
+            gap = np.linalg.norm(xz[other] - xz[:, None], axis=-1) - radii[other] - radii[:, None]
+            if valid.any():
+                best = min(best, float(gap[valid].min()))
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede a distribuição Poisson-disk e confere o espaçamento.")
+    parser.add_argument("--quantidade", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--raios", type=float, nargs="+", default=[0.4, 0.6, 0.9], help="Raio de cada modelo")
+    parser.add_argument("--lado", type=float, default=600.0, help="Lado da área quadrada (m)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    half = args.lado / 2.0
+    for count in args.quantidade:
+        start = time.perf_counter()
+        result = scatter(count, args.raios, bounds=(-half, -half, half, half), seed=args.seed,
+                         scale_range=(0.9, 1.1), exclusions=[(0.0, 0.0, 20.0)])
+        elapsed = time.perf_counter() - start
+        gap = min_gap(result)
+        per_model = np.bincount(result.model_ids, minlength=len(args.raios))
+        print(f"🌲 {len(result):>7} instâncias em {elapsed * 1000:7.1f} ms | menor folga {gap:.4f} m {'✅' if gap >= -1e-4 else '❌'} | por modelo {per_model.tolist()}")
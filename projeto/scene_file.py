@@ -0,0 +1,121 @@
+import os
+import json
+import numpy as np
+
+# ==========================================
+# ARQUIVO DE CENA (JSON + NPY)
+# ==========================================
+#
+# Uma cena gerada pelo spawn_personagens vira dois arquivos lado a lado:
+#   <nome>.json -> cabeçalho: versão, tabela de modelos (nome + caminho),
+#                  referência do terreno, parâmetros de iluminação e de onde
+#                  veio a distribuição
+#   <nome>.npy  -> transformações das instâncias, float32 (N, 6) compactado:
+#                  x, y, z, yaw (graus), escala, id do modelo
+#
+# As posições já estão apoiadas no terreno referenciado (base do modelo no
+# chão), então o renderer só precisa copiar as colunas para o InstanceStore.
+# O .npy é aberto com mmap: carregar a cena é uma leitura sequencial do arquivo,
+# sem parsing por instância.
+
+SCENE_VERSION = 1
+INSTANCE_COLUMNS = ("x", "y", "z", "yaw", "scale", "model_id")
+DEFAULT_SCENE = "cenario_final.json"
+
+# Valores iniciais do ciclo dia/noite e da névoa (SceneRenderer)
+DEFAULT_LIGHTING = {
+    "time_of_day": 8.0,
+    "day_speed": 1.0 / 60.0,
+    "fog_density": 0.01,
+}
+
+
+def pack_instances(positions, yaw, scale, model_ids):
+    """Registros (N, 6) float32 no layout de INSTANCE_COLUMNS"""
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+    records = np.empty((len(positions), len(INSTANCE_COLUMNS)), dtype=np.float32)
+    records[:, :3] = positions
+    records[:, 3] = yaw
+    records[:, 4] = scale
+    records[:, 5] = model_ids
+    return records
+
+
+class SceneFile:
+    """
+    models: [{"name", "path"}], instances: (N, 6) float32 (ver INSTANCE_COLUMNS),
+    terrain: {"obj", "scale", "heightmap"}, lighting: chaves de DEFAULT_LIGHTING.
+    """
+    def __init__(self, models, instances, terrain=None, lighting=None, layout=None):
+        self.models = list(models)
+        self.instances = instances
+        self.terrain = dict(terrain or {})
+        self.lighting = dict(DEFAULT_LIGHTING, **(lighting or {}))
+        self.layout = dict(layout or {})
+
+    def __len__(self):
+        return len(self.instances)
+
+    @property
+    def positions(self):
+        return self.instances[:, :3]
+
+    @property
+    def yaw(self):
+        return self.instances[:, 3]
+
+    @property
+    def scale(self):
+        return self.instances[:, 4]
+
+    @property
+    def model_ids(self):
+        return self.instances[:, 5].astype(np.int32)
+
+    def of_model(self, model_id):
+        """Índices das instâncias de um modelo"""
+        return np.flatnonzero(self.model_ids == model_id)
+
+    def save(self, path=DEFAULT_SCENE):
+        """Grava <path> (.json) e o .npy ao lado; escrita atômica como o mesh_cache"""
+        npy_path = os.path.splitext(path)[0] + ".npy"
+        header = {
+            "version": SCENE_VERSION,
+            "models": self.models,
+            "instances": {"file": os.path.basename(npy_path), "count": len(self),
+                          "columns": list(INSTANCE_COLUMNS)},
+            "terrain": self.terrain,
+            "lighting": self.lighting,
+            "layout": self.layout,
+        }
+
+        tmp_npy = npy_path + ".tmp"
+        with open(tmp_npy, "wb") as f:
+            np.save(f, np.ascontiguousarray(self.instances, dtype=np.float32))
+        tmp_header = path + ".tmp"
+        with open(tmp_header, "w", encoding="utf-8") as f:
+            json.dump(header, f, indent=1)
+
+        # O .npy entra primeiro: um cabeçalho novo nunca aponta para dados velhos
+        os.replace(tmp_npy, npy_path)
+        os.replace(tmp_header, path)
+        return path
+
+    @classmethod
+    def load(cls, path=DEFAULT_SCENE):
+        """
+        Lê o cabeçalho e mapeia o .npy (somente leitura). None se o arquivo não
+        existir, for de outra versão ou estiver inconsistente.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                header = json.load(f)
+            if header.get("version") != SCENE_VERSION:
+                return None
+            info = header["instances"]
+            instances = np.load(os.path.join(os.path.dirname(path), info["file"]), mmap_mode="r")
+        except (OSError, ValueError, KeyError):
+            return None
+        if instances.dtype != np.float32 or instances.shape != (info["count"], len(INSTANCE_COLUMNS)):
+            return None
+        return cls(header["models"], instances, header.get("terrain"), header.get("lighting"), header.get("layout"))
@@ -1,21 +1,36 @@
 import pygame
 from OpenGL.GL import *
-from OpenGL.GL.shaders import compileProgram, compileShader
 import glm
 import numpy as np
 import math
 import os
 import random
+import time
 
 # --- IMPORTS ---
 from terreno import Terreno
 from shadow_renderer import ShadowRenderer
+from shader_program import ShaderProgram, FrameUniforms
+from gl_state import gl_state, DrawList
+from texture_manager import TextureManager
+from culling import extract_frustum_planes
+from scene_file import SceneFile, DEFAULT_SCENE, DEFAULT_LIGHTING
+from material_array import MATERIAL_KINDS, MATERIAL_SAMPLERS, MATERIAL_UNITS
+
+# Unidade de cada sampler do terrain.frag: tipos diferentes (sampler2D x
+# sampler2DArray) não podem dividir unidade, nem quando não há nada ligado nela
+SCENE_SAMPLER_UNITS = {"texture1": 0, "shadowMap": 1, "shadowMapArray": 2,
+                       **{MATERIAL_SAMPLERS[kind]: MATERIAL_UNITS[kind] for kind in MATERIAL_KINDS}}
 
 # Tenta importar seus módulos de personagem
 try:
-    from cenario import Cenario, Instancia
+    from cenario import Cenario
     from personagem import PersonagemFBX
-    from fbx_loader import load_fbx_model
+    from asset_pipeline import load_assets, print_asset_report
+    from material_array import MaterialArray
+    from mesh_batch import MeshBatch
+    from gpu_culling import GpuCuller, HiZBuffer, compute_supported
+    from scatter import character_layout, footprint_radius
     HAS_CHARACTERS = True
 except ImportError:
     HAS_CHARACTERS = False
@@ -55,8 +70,7 @@ class VisualStars:
         # Shader simples para as estrelas (pontos brancos que desaparecem)
         vs = """#version 330 core
         layout (location = 0) in vec3 aPos;
-        uniform mat4 view;
-        uniform mat4 projection;
+        #include "frame_data.glsl"
         void main() { 
             gl_Position = projection * view * vec4(aPos, 1.0); 
             gl_PointSize = 2.0; // Tamanho da estrela
@@ -66,9 +80,9 @@ class VisualStars:
         uniform float alpha;
         void main() { FragColor = vec4(1.0, 1.0, 1.0, alpha); }"""
         
-        self.shader = compileProgram(compileShader(vs, GL_VERTEX_SHADER), compileShader(fs, GL_FRAGMENT_SHADER))
+        self.shader = ShaderProgram(vs, fs)
 
-    def draw(self, view, proj, alpha):
+    def draw(self, alpha):
         if alpha <= 0.0: return
         
         # Habilita mistura para o fade in/out das estrelas
@@ -77,14 +91,13 @@ class VisualStars:
         # Habilita tamanho de ponto programável (necessário em alguns drivers)
         glEnable(0x8642) # GL_PROGRAM_POINT_SIZE
         
-        glUseProgram(self.shader)
-        glUniformMatrix4fv(glGetUniformLocation(self.shader, "view"), 1, GL_FALSE, glm.value_ptr(view))
-        glUniformMatrix4fv(glGetUniformLocation(self.shader, "projection"), 1, GL_FALSE, glm.value_ptr(proj))
-        glUniform1f(glGetUniformLocation(self.shader, "alpha"), alpha)
+        # view/projection vêm do bloco FrameData
+        self.shader.use()
+        self.shader.set_float("alpha", alpha)
         
-        glBindVertexArray(self.vao)
+        gl_state.bind_vertex_array(self.vao)
         glDrawArrays(GL_POINTS, 0, self.count)
-        glBindVertexArray(0)
+        gl_state.draw_call()
         
         glDisable(GL_BLEND)
 
@@ -134,35 +147,39 @@ class VisualOrb:
         # Shader simples apenas para pintar o orbe de uma cor sólida
         vs = """#version 330 core
         layout (location = 0) in vec3 aPos;
+        #include "frame_data.glsl"
         uniform mat4 model;
-        uniform mat4 view;
-        uniform mat4 projection;
         void main() { gl_Position = projection * view * model * vec4(aPos, 1.0); }"""
         fs = """#version 330 core
         out vec4 FragColor;
         uniform vec3 color;
         void main() { FragColor = vec4(color, 1.0); }"""
-        self.shader = compileProgram(compileShader(vs, GL_VERTEX_SHADER), compileShader(fs, GL_FRAGMENT_SHADER))
+        self.shader = ShaderProgram(vs, fs)
 
-    def draw(self, pos, view, proj, color, scale=8.0):
-        glUseProgram(self.shader)
+    def draw(self, pos, color, scale=8.0):
+        self.shader.use()
         # Posiciona o orbe e aumenta a escala para ser visível de longe
         model = glm.translate(glm.mat4(1.0), pos)
         model = glm.scale(model, glm.vec3(scale)) 
         
-        glUniformMatrix4fv(glGetUniformLocation(self.shader, "model"), 1, GL_FALSE, glm.value_ptr(model))
-        glUniformMatrix4fv(glGetUniformLocation(self.shader, "view"), 1, GL_FALSE, glm.value_ptr(view))
-        glUniformMatrix4fv(glGetUniformLocation(self.shader, "projection"), 1, GL_FALSE, glm.value_ptr(proj))
-        glUniform3f(glGetUniformLocation(self.shader, "color"), color.x, color.y, color.z)
+        self.shader.set_mat4("model", model)
+        self.shader.set_vec3("color", color)
         
-        glBindVertexArray(self.vao)
+        gl_state.bind_vertex_array(self.vao)
         glDrawElements(GL_TRIANGLES, self.count, GL_UNSIGNED_INT, None)
-        glBindVertexArray(0)
+        gl_state.draw_call()
 
 class SceneRenderer:
-    def __init__(self, width=1200, height=800):
+    def __init__(self, width=1200, height=800, terrain_heightmap=None, scene_path=DEFAULT_SCENE):
         self.width = width
         self.height = height
+        # Cena gerada pelo spawn_personagens (modelos, instâncias, terreno, luz); None = distribuição padrão
+        self.scene = SceneFile.load(scene_path) if scene_path else None
+        # None = o da cena (ou terreno.obj); caminho .npy/imagem ou "procedural" = mapa de alturas em blocos com LOD
+        self.terrain_from_scene = self.scene is not None and terrain_heightmap is None
+        if self.terrain_from_scene:
+            terrain_heightmap = self.scene.terrain.get("heightmap")
+        self.terrain_heightmap = terrain_heightmap
         self.clock = pygame.time.Clock()
         self.running = False
         
@@ -184,20 +201,41 @@ class SceneRenderer:
         
         self.eye_height = 1.8 
         
+        # Projeção da câmera (também usada pelo culling do passe de sombra)
+        self.fov = 60.0
+        self.near = 0.1
+        self.far = 500.0
+        
         # --- Variáveis do Ambiente ---
-        self.time_of_day = 8.0
-        self.day_speed = 1.0 / 60.0
-        self.fog_density = 0.01
+        lighting = self.scene.lighting if self.scene else DEFAULT_LIGHTING
+        self.time_of_day = lighting["time_of_day"]
+        self.day_speed = lighting["day_speed"]
+        self.fog_density = lighting["fog_density"]
         
         # Objetos da cena
         self.terrain = None
         self.shader = None
+        self.frame_uniforms = None # UBO com view/proj/luz/fog, comum a todos os programas
+        self.draw_list = DrawList() # Desenhos do passe principal, ordenados por estado
+        self.textures = None # TextureManager (decodificação em threads + upload por PBO)
+        self.textures_reported = False
+        self.materials = None # MaterialArray: mapas de todos os personagens em texture arrays
         self.cenario = None 
+        self.hiz = None # Pirâmide Hi-Z do frame anterior (culling por oclusão na GPU)
         self.visual_orb = None # Usado para Sol e Lua
         self.visual_stars = None # Estrelas
         
         # Sombra
-        self.shadow_renderer = ShadowRenderer()
+        # 3 cascatas de 1024² (3 Mpx) no lugar do mapa único de 2048² (4 Mpx)
+        # Cache: redesenha só quando o sol gira > 0.5°, o cenário muda ou a
+        # câmera gira > 5° / anda > 4 m (os projetores seguem recortados pela
+        # extrusão da câmera); no máximo 2 cascatas por frame (a mais próxima + uma em rodízio)
+        self.shadow_renderer = ShadowRenderer(shadow_width=1024, shadow_height=1024, cascades=3,
+                                              angle_threshold=0.5, max_cascade_updates=2)
+        
+        # Estatísticas impressas no terminal a cada stats_interval segundos
+        self.stats_interval = 5.0
+        self.stats_timer = 0.0
 
     def init_gl(self):
         pygame.init()
@@ -217,7 +255,9 @@ class SceneRenderer:
         pygame.mouse.set_visible(False)
         pygame.event.set_grab(True)
         
-        # Inicializa Orbe (Sol/Lua) e Estrelas
+        # Dados por frame (bloco FrameData) e Orbe (Sol/Lua) e Estrelas
+        self.frame_uniforms = FrameUniforms()
+        self.textures = TextureManager()
         self.visual_orb = VisualOrb()
         self.visual_stars = VisualStars()
         
@@ -233,11 +273,14 @@ class SceneRenderer:
         try:
             # --- MELHORIA DE TEXTURA (TILING) ---
             # Alterado para 1000.0 para garantir máxima nitidez e detalhes no chão.
+            terrain_ref = self.scene.terrain if self.scene else {}
             self.terrain = Terreno(
-                obj_path="FBX models/terreno.obj", 
+                obj_path=terrain_ref.get("obj", "FBX models/terreno.obj"), 
                 texture_path="Textures/Grass005_2K-PNG_Color.png", 
-                scale=300.0,
-                uv_repeat=60.0
+                scale=terrain_ref.get("scale", 300.0),
+                uv_repeat=60.0,
+                textures=self.textures,
+                heightmap=self.terrain_heightmap
             )
             print("✅ Terreno carregado.")
         except Exception as e:
@@ -254,9 +297,8 @@ class SceneRenderer:
         vert_path = os.path.join('shaders', 'terrain.vert')
         frag_path = os.path.join('shaders', 'terrain.frag')
         try:
-            with open(vert_path, 'r') as f: vert_src = f.read()
-            with open(frag_path, 'r') as f: frag_src = f.read()
-            self.shader = compileProgram(compileShader(vert_src, GL_VERTEX_SHADER), compileShader(frag_src, GL_FRAGMENT_SHADER))
+            self.shader = ShaderProgram.from_files(vert_path, frag_path)
+            self.shader.assign_samplers(SCENE_SAMPLER_UNITS)
             return True
         except Exception as e:
             print(f"❌ Erro shader: {e}")
@@ -265,27 +307,94 @@ class SceneRenderer:
     def load_mixamo_characters(self):
         print("🎯 Carregando personagens...")
         self.cenario = Cenario()
-        personagens_mixamo = [
-            "FBX models/Mutant.fbx","FBX models/Warrok W Kurniawan.fbx", 
-            "FBX models/Vampire A Lusth.fbx","FBX models/Pumpkinhulk L Shaw.fbx"
-        ]
+        if self.scene:
+            personagens_mixamo = [model["path"] for model in self.scene.models]
+        else:
+            personagens_mixamo = [
+                "FBX models/Mutant.fbx","FBX models/Warrok W Kurniawan.fbx", 
+                "FBX models/Vampire A Lusth.fbx","FBX models/Pumpkinhulk L Shaw.fbx"
+            ]
+        # Conversão + decodificação das texturas em paralelo; aqui só os uploads GL
         loaded_chars = []
-        for path in personagens_mixamo:
-            try:
-                md = load_fbx_model(path)
-                if md: loaded_chars.append(PersonagemFBX(md))
-            except: pass
+        results = load_assets(personagens_mixamo, weld=True, optimize=True)
+        ok_results = [result for result in results if result.ok]
+        # Índice na tabela de modelos -> personagem carregado
+        char_of_model = {}
+        
+        # Mapas de todos os personagens em texture arrays: um bind para todos,
+        # camada por instância. Se falhar, cada personagem usa a própria textura.
+        try:
+            self.materials = MaterialArray([r.mesh_data[4] for r in ok_results], [r.texture for r in ok_results])
+            self.materials.print_report()
+        except Exception as e:
+            print(f"⚠️ Texture arrays de material indisponíveis ({e}); usando uma textura por personagem.")
+            self.materials = None
         
+        for i, result in enumerate(ok_results):
+            start = time.perf_counter()
+            try:
+                material = self.materials.instance_material(i) if self.materials else None
+                loaded_chars.append(PersonagemFBX(result.mesh_data, result.texture, textures=self.textures,
+                                                  material=material))
+                char_of_model[results.index(result)] = loaded_chars[-1]
+            except Exception as e:
+                # Registrado no relatório em vez de descartado
+                result.error = f"upload GL: {type(e).__name__}: {e}"
+            result.timings["upload"] = time.perf_counter() - start
+        print_asset_report(results)
+        
+        if loaded_chars and self.scene:
+            self.load_scene_instances(char_of_model)
+        elif loaded_chars:
+            # Mesma distribuição (seed, espaçamento pelo raio de cada modelo) do spawn_personagens
+            layout = character_layout([footprint_radius(char.positions) for char in loaded_chars], terrain=self.terrain)
+            for model_id, char in enumerate(loaded_chars):
+                sel = layout.of_model(model_id)
+                if len(sel):
+                    self.cenario.add_many(char, layout.positions[sel], layout.yaw[sel], layout.scale[sel])
+            # Pés no chão: altura do terreno + base de cada modelo, todas de uma vez
+            if self.terrain: self.cenario.snap_to_ground(self.terrain)
+            print(f"✅ {len(layout)} personagens distribuídos (Poisson-disk).")
+
         if loaded_chars:
-            for i in range(25): 
-                char = random.choice(loaded_chars)
-                x = random.uniform(-140, 140)
-                z = random.uniform(-140, 140)
-                instancia = Instancia(char, [x, 0.95, z], random.uniform(0, 360), random.uniform(1.3, 1.5))
-                self.cenario.add(instancia)
-            print(f"✅ Personagens distribuídos.")
+            # Com os mapas em texture arrays, todas as malhas cabem num único desenho
+            if self.materials:
+                try:
+                    self.cenario.set_batch(MeshBatch(self.cenario.modelos))
+                except Exception as e:
+                    print(f"⚠️ Lote único indisponível ({e}); um draw por personagem.")
+
+            # Culling do passe principal na GPU (frustum + Hi-Z); sem GL 4.3 fica na CPU
+            if self.cenario.batch and self.cenario.batch.use_indirect and compute_supported():
+                try:
+                    self.cenario.set_gpu_culler(GpuCuller(self.cenario.batch))
+                    self.hiz = HiZBuffer(self.width, self.height)
+                    print("✅ Culling na GPU (compute shader + Hi-Z).")
+                except Exception as e:
+                    print(f"⚠️ Culling na GPU indisponível ({e}); usando a CPU.")
+                    self.cenario.set_gpu_culler(None)
+                    self.hiz = None
         return True
 
+    def load_scene_instances(self, char_of_model):
+        """
+        Instâncias do arquivo de cena: uma leitura do .npy mapeado e uma
+        cópia das colunas por modelo para o InstanceStore. As posições já vêm
+        no chão; só são reapoiadas se o terreno não for o referenciado na cena.
+        """
+        start = time.perf_counter()
+        records = np.array(self.scene.instances)
+        model_ids = records[:, 5].astype(np.int32)
+        for model_id, char in char_of_model.items():
+            sel = np.flatnonzero(model_ids == model_id)
+            if len(sel):
+                self.cenario.add_many(char, records[sel, :3], records[sel, 3], records[sel, 4])
+        if self.terrain and not self.terrain_from_scene:
+            self.cenario.snap_to_ground(self.terrain)
+        skipped = len(records) - self.cenario.store.count
+        print(f"✅ {self.cenario.store.count} personagens carregados do arquivo de cena "
+              f"em {(time.perf_counter() - start) * 1000:.1f} ms" + (f" ({skipped} sem modelo)" if skipped else "") + ".")
+
     def update_day_night_cycle(self):
         # Movimento Leste (X+) para Oeste (X-)
         angle = np.radians((self.time_of_day - 6.0) * 15.0)
@@ -339,6 +448,12 @@ class SceneRenderer:
         # Retorna: Direção da Luz Ativa, Cor da Luz, Cor do Céu, Cor do Fog, Pos Sol, Pos Lua, Pos Luz Ativa
         return glm.normalize(light_dir), light_color, sky_color, fog_color, sun_pos, moon_pos, light_source_pos, ambient_strength
 
+    def camera_matrices(self):
+        """Retorna (view, projection) da câmera no estado atual"""
+        view = glm.lookAt(self.camera_pos, self.camera_pos + self.camera_front, self.camera_up)
+        proj = glm.perspective(glm.radians(self.fov), self.width/self.height, self.near, self.far)
+        return view, proj
+
     def handle_input(self, dt):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -377,19 +492,33 @@ class SceneRenderer:
         if keys[pygame.K_a]: self.camera_pos -= speed * right
         if keys[pygame.K_d]: self.camera_pos += speed * right
 
+        # Altura dos olhos acima do terreno no ponto atual (consulta O(1) na grade)
+        ground = float(self.terrain.height_at(self.camera_pos.x, self.camera_pos.z)) if self.terrain else 0.0
+        eye_level = ground + self.eye_height
         if self.is_jumping or not self.on_ground:
             self.camera_pos.y += self.jump_velocity * dt
             self.jump_velocity += self.gravity * dt
-            if self.camera_pos.y <= self.eye_height:
-                self.camera_pos.y = self.eye_height; self.is_jumping = False; self.on_ground = True; self.jump_velocity = 0
+            if self.camera_pos.y <= eye_level:
+                self.camera_pos.y = eye_level; self.is_jumping = False; self.on_ground = True; self.jump_velocity = 0
+        else:
+            self.camera_pos.y = eye_level
     def render(self):
         dt = self.clock.tick(60) / 1000.0
+        gl_state.begin_frame()
+        
+        # Texturas que terminaram de decodificar/enviar substituem os placeholders
+        self.textures.update()
         self.time_of_day += dt * self.day_speed
         if self.time_of_day >= 24: self.time_of_day = 0
         
         self.handle_input(dt)
         light_dir, light_color, sky_color, fog_color, sun_pos, moon_pos, active_light_pos, ambient_strength = self.update_day_night_cycle()
         
+        # Matrizes das instâncias: recalculadas uma vez e usadas pelos dois passes
+        if self.cenario: self.cenario.update()
+        # Nível de detalhe dos blocos do terreno (também usado no passe de sombra)
+        if self.terrain: self.terrain.update_lod(self.camera_pos, self.fov, self.height)
+        
         # 1. Shadow Pass
         self.shadow_renderer.render_depth_map(self, active_light_pos)
         
@@ -398,10 +527,14 @@ class SceneRenderer:
         glClearColor(sky_color.r, sky_color.g, sky_color.b, 1.0)
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         
-        # Desenha o Sol e Estrelas
-        view = glm.lookAt(self.camera_pos, self.camera_pos + self.camera_front, self.camera_up)
-        proj = glm.perspective(glm.radians(60.0), self.width/self.height, 0.1, 500.0)
+        view, proj = self.camera_matrices()
         
+        # Dados por frame de todos os programas: um único glBufferSubData
+        self.frame_uniforms.update(view, proj, self.shadow_renderer.scene_light_matrix(),
+                                   light_dir, light_color, ambient_strength,
+                                   self.camera_pos, fog_color, self.fog_density, self.time_of_day)
+        
+        # Desenha o Sol e Estrelas
         # Lógica para desenhar estrelas
         star_alpha = 0.0
         normalized_sun_y = sun_pos.y / 100.0
@@ -410,51 +543,87 @@ class SceneRenderer:
             star_alpha = min(1.0, star_alpha)
             
         if star_alpha > 0.0:
-            self.visual_stars.draw(view, proj, star_alpha)
+            self.visual_stars.draw(star_alpha)
 
         # Desenha Sol (Amarelo) se estiver visível
         if sun_pos.y > -20.0: 
-            self.visual_orb.draw(sun_pos, view, proj, glm.vec3(1.0, 1.0, 0.6), scale=8.0)
+            self.visual_orb.draw(sun_pos, glm.vec3(1.0, 1.0, 0.6), scale=8.0)
             
         # Desenha Lua (Cinza/Branca) se estiver visível
         if moon_pos.y > -20.0:
-            self.visual_orb.draw(moon_pos, view, proj, glm.vec3(0.9, 0.9, 1.0), scale=5.0)
+            self.visual_orb.draw(moon_pos, glm.vec3(0.9, 0.9, 1.0), scale=5.0)
 
-        glUseProgram(self.shader)
-        glUniformMatrix4fv(glGetUniformLocation(self.shader, "view"), 1, GL_FALSE, glm.value_ptr(view))
-        glUniformMatrix4fv(glGetUniformLocation(self.shader, "projection"), 1, GL_FALSE, glm.value_ptr(proj))
-        glUniform3f(glGetUniformLocation(self.shader, "viewPos"), self.camera_pos.x, self.camera_pos.y, self.camera_pos.z)
-        
-        # Passa a direção da luz ativa para o shader
-        glUniform3f(glGetUniformLocation(self.shader, "lightDir"), light_dir.x, light_dir.y, light_dir.z)
-        
-        # Passa a cor da luz ativa para o shader
-        glUniform3f(glGetUniformLocation(self.shader, "lightColor"), light_color.x, light_color.y, light_color.z)
-        
-        # Passa a força da luz ambiente para o shader
-        glUniform1f(glGetUniformLocation(self.shader, "ambientStrength"), ambient_strength)
-        
-        # Passa a cor do nevoeiro para o shader
-        glUniform3f(glGetUniformLocation(self.shader, "fogColor"), fog_color.x, fog_color.y, fog_color.z)
-        
-        # Passa a densidade do nevoeiro para o shader
-        glUniform1f(glGetUniformLocation(self.shader, "fogDensity"), self.fog_density)
+        self.shader.use()
 
-        # Passa a matriz de transformação de luz para o shader
-        light_space_matrix = self.shadow_renderer.get_light_space_matrix(active_light_pos)
-        glUniformMatrix4fv(glGetUniformLocation(self.shader, "lightSpaceMatrix"), 1, GL_FALSE, glm.value_ptr(light_space_matrix))
-        
-        glActiveTexture(GL_TEXTURE1)
-        glBindTexture(GL_TEXTURE_2D, self.shadow_renderer.shadow_map)
-        glUniform1i(glGetUniformLocation(self.shader, "shadowMap"), 1)
+        # Passa as matrizes de luz e os mapas de sombra (único ou cascatas) para o shader
+        self.shadow_renderer.bind_for_scene(self.shader)
+        if self.materials: self.materials.bind(self.shader)
 
-        if self.terrain: self.terrain.draw(self.shader)
-        if self.cenario: self.cenario.draw(self.shader)
+        # Terreno + personagens numa DrawList ordenada por (programa, textura, VAO)
+        if self.terrain: self.terrain.submit(self.draw_list, self.shader, planes=extract_frustum_planes(np.array(proj * view)))
+        if self.cenario:
+            # Frustum culling (e oclusão, na GPU): só as instâncias visíveis vão para o draw instanciado
+            self.cenario.submit_frustum(self.draw_list, self.shader, np.array(proj * view), hiz=self.hiz)
+        self.draw_list.execute()
+
+        # Profundidade deste frame -> Hi-Z usado pelo culling do próximo
+        if self.hiz and self.cenario.gpu_culler:
+            try:
+                self.hiz.capture(np.array(proj * view))
+            except GLError as e:
+                print(f"⚠️ Hi-Z desativado ({e}).")
+                self.hiz.cleanup()
+                self.hiz = None
 
         pygame.display.flip()
+        
+        self.stats_timer += dt
+        if self.stats_timer >= self.stats_interval:
+            self.stats_timer = 0.0
+            self.report_stats()
+
+    def report_stats(self):
+        """Resumo periódico de desempenho no terminal"""
+        fps = self.clock.get_fps()
+        print(f"📈 FPS: {fps:.1f}")
+        if self.cenario and self.cenario.gpu_culler:
+            # Leitura dos comandos sincroniza com a GPU: só aqui, a cada stats_interval
+            st = self.cenario.gpu_culler.stats()
+            print(f"   👁️ Culling (GPU{' + Hi-Z' if self.hiz else ''}): {st['visible']} visíveis / "
+                  f"{st['culled']} descartadas de {st['tested']}")
+        elif self.cenario:
+            st = self.cenario.cull_stats
+            print(f"   👁️ Culling: {st['visible']} visíveis / {st['culled']} descartadas "
+                  f"de {st['tested']} (esferas testadas: {st['sphere_tests']})")
+        if self.cenario:
+            st = self.shadow_renderer.caster_stats
+            print(f"   🌑 Sombra: {st['visible']} projetores desenhados / {st['culled']} descartados")
+        if self.terrain and self.terrain.heightfield is not None:
+            st = self.terrain.stats
+            print(f"   ⛰️ Terreno: {st['chunks']} blocos, {st['triangles']} triângulos "
+                  f"(resolução completa: {self.terrain.heightfield.full_triangles})")
+        st = gl_state.last_frame
+        print(f"   🎛️ Estado GL (último frame): {st['issued']} chamadas feitas / {st['skipped']} evitadas, "
+              f"{st['draws']} draws")
+        st = self.shadow_renderer.cache_stats
+        print(f"   🗺️ Shadow map: {st['frames_cached']} frames do cache / {st['frames_rendered']} redesenhados "
+              f"(camadas: {st['layers_cached']} reaproveitadas / {st['layers_rendered']} desenhadas, "
+              f"{st['layers_camera']} só pela câmera)")
+        self.shadow_renderer.cache_stats = dict.fromkeys(st, 0)
+        if self.textures.busy:
+            print(f"   🖼️ Texturas: {len(self.textures.decoding)} decodificando / "
+                  f"{len(self.textures.uploading)} enviando")
+        elif not self.textures_reported:
+            self.textures.print_report()
+            self.textures_reported = True
 
     def run(self):
         if self.init_gl():
             self.running = True
             while self.running: self.render()
+            self.textures.cleanup()
+            if self.materials: self.materials.cleanup()
+            if self.hiz: self.hiz.cleanup()
+            if self.cenario and self.cenario.gpu_culler: self.cenario.gpu_culler.cleanup()
+            if self.cenario and self.cenario.batch: self.cenario.batch.cleanup()
         pygame.quit()
\ No newline at end of file
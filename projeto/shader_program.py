@@ -0,0 +1,215 @@
+import os
+import re
+import numpy as np
+import glm
+from OpenGL.GL import *
+from OpenGL.GL.shaders import compileShader, ShaderLinkError
+from gl_state import gl_state
+
+SHADER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shaders")
+
+# Ponto de ligação do bloco de uniforms por frame (mesmo em todos os programas)
+FRAME_DATA_BINDING = 0
+FRAME_DATA_BLOCK = "FrameData"
+
+_INCLUDE = re.compile(r'^\s*#include\s+"([^"]+)"\s*$', re.MULTILINE)
+
+
+def preprocess(source, base_dir=SHADER_DIR):
+    """
+    Resolve linhas #include "arquivo.glsl" (relativas a shaders/).
+    O GLSL 330 não tem include; é assim que todos os programas declaram o
+    mesmo bloco FrameData a partir de um único arquivo.
+    """
+    def include(match):
+        with open(os.path.join(base_dir, match.group(1)), "r", encoding="utf-8") as f:
+            return preprocess(f.read(), base_dir)
+    return _INCLUDE.sub(include, source)
+
+
+def link_program(shaders):
+    """
+    Liga os shaders compilados num programa. Não usa o compileProgram do
+    PyOpenGL porque ele chama glValidateProgram logo após o link: nesse
+    momento todo sampler está na unidade 0, e samplers de tipos diferentes
+    (sampler2D x sampler2DArray) na mesma unidade reprovam a validação,
+    embora as unidades certas sejam definidas antes de cada desenho.
+    """
+    program = glCreateProgram()
+    for shader in shaders:
+        glAttachShader(program, shader)
+    glLinkProgram(program)
+    linked = glGetProgramiv(program, GL_LINK_STATUS)
+    log = glGetProgramInfoLog(program)
+    for shader in shaders:
+        glDetachShader(program, shader)
+        glDeleteShader(shader)
+    if not linked:
+        glDeleteProgram(program)
+        raise ShaderLinkError(log.decode() if isinstance(log, bytes) else log)
+    return program
+
+
+class ShaderProgram:
+    """
+    Programa GLSL com as localizações dos uniforms em cache.
+
+    Na criação lista os uniforms ativos (glGetActiveUniform) e guarda a
+    localização de cada um; durante o frame nenhum glGetUniformLocation por
+    string é feito. Arrays ficam pelo nome base ("cascadeMatrices").
+    Se o programa declara o bloco FrameData ele é ligado ao FRAME_DATA_BINDING.
+    Inteiros e floats guardam o último valor enviado (o valor de um uniform
+    pertence ao programa e persiste), então reenviar o mesmo valor não chama o GL.
+    """
+    def __init__(self, vertex_src, fragment_src):
+        self._link([(vertex_src, GL_VERTEX_SHADER), (fragment_src, GL_FRAGMENT_SHADER)])
+
+    def _link(self, stages):
+        self.id = link_program([compileShader(preprocess(src), stage) for src, stage in stages])
+        self.locations = {}
+        self._values = {}
+        self._introspect()
+        self.bind_block(FRAME_DATA_BLOCK, FRAME_DATA_BINDING)
+
+    @classmethod
+    def from_files(cls, vertex_path, fragment_path):
+        with open(vertex_path, "r", encoding="utf-8") as f: vertex_src = f.read()
+        with open(fragment_path, "r", encoding="utf-8") as f: fragment_src = f.read()
+        return cls(vertex_src, fragment_src)
+
+    @classmethod
+    def compute(cls, source):
+        """Programa só com compute shader (GL 4.3)"""
+        program = cls.__new__(cls)
+        program._link([(source, GL_COMPUTE_SHADER)])
+        return program
+
+    @classmethod
+    def compute_from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f: source = f.read()
+        return cls.compute(source)
+
+    def _introspect(self):
+        count = glGetProgramiv(self.id, GL_ACTIVE_UNIFORMS)
+        for i in range(count):
+            name, _, _ = glGetActiveUniform(self.id, i)
+            name = name.decode() if isinstance(name, bytes) else name
+            name = name.split("[")[0]
+            # Membros de blocos também aparecem na lista, mas com localização -1
+            loc = glGetUniformLocation(self.id, name)
+            if loc != -1:
+                self.locations[name] = loc
+
+    def assign_samplers(self, units):
+        """
+        Fixa a unidade de textura de cada sampler ({nome: unidade}) logo após o
+        link, para que samplers de tipos diferentes nunca fiquem juntos na
+        unidade 0, mesmo os que nenhum bind chega a apontar (ex.: sem MaterialArray).
+        """
+        self.use()
+        for name, unit in units.items():
+            self.set_int(name, unit)
+
+    def bind_block(self, block_name, binding):
+        index = glGetUniformBlockIndex(self.id, block_name)
+        if index != GL_INVALID_INDEX:
+            glUniformBlockBinding(self.id, index, binding)
+            return True
+        return False
+
+    def use(self):
+        gl_state.use_program(self.id)
+
+    def location(self, name):
+        """Localização em cache (-1 se o uniform não existe ou foi otimizado)"""
+        return self.locations.get(name, -1)
+
+    # --- Atalhos: ignoram uniforms inexistentes, como o GL faz com -1 ---
+    def _changed(self, loc, value):
+        """Registra o valor e diz se é preciso enviá-lo (programa deve estar em uso)"""
+        if self._values.get(loc) == value:
+            gl_state.stats["skipped"] += 1
+            return False
+        self._values[loc] = value
+        gl_state.stats["issued"] += 1
+        return True
+
+    def set_int(self, name, value):
+        loc = self.locations.get(name, -1)
+        if loc != -1 and self._changed(loc, int(value)): glUniform1i(loc, value)
+
+    def set_float(self, name, value):
+        loc = self.locations.get(name, -1)
+        if loc != -1 and self._changed(loc, float(value)): glUniform1f(loc, value)
+
+    def set_floats(self, name, values):
+        loc = self.locations.get(name, -1)
+        if loc != -1: glUniform1fv(loc, len(values), np.asarray(values, dtype=np.float32))
+
+    def set_vec4s(self, name, values):
+        """Array de vec4 (N, 4), ex.: planos do frustum"""
+        loc = self.locations.get(name, -1)
+        if loc != -1:
+            values = np.asarray(values, dtype=np.float32).reshape(-1, 4)
+            glUniform4fv(loc, len(values), values)
+
+    def set_vec3(self, name, v):
+        loc = self.locations.get(name, -1)
+        if loc != -1: glUniform3f(loc, v[0], v[1], v[2])
+
+    def set_mat4(self, name, matrix, transpose=False, count=1):
+        """matrix: glm.mat4 ou array NumPy (count matrizes); transpose=True para arrays por linhas"""
+        loc = self.locations.get(name, -1)
+        if loc == -1:
+            return
+        if isinstance(matrix, glm.mat4):
+            glUniformMatrix4fv(loc, 1, GL_FALSE, glm.value_ptr(matrix))
+        else:
+            glUniformMatrix4fv(loc, count, GL_TRUE if transpose else GL_FALSE, np.asarray(matrix, dtype=np.float32))
+
+    def delete(self):
+        glDeleteProgram(self.id)
+
+
+class FrameUniforms:
+    """
+    Uniform buffer (std140) com os dados comuns a todos os programas no frame.
+
+    Layout (ver shaders/frame_data.glsl), 256 bytes:
+        mat4 view | mat4 projection | mat4 lightSpaceMatrix
+        vec3 lightDir  + float ambientStrength
+        vec3 lightColor + float fogDensity
+        vec3 viewPos   + float time
+        vec3 fogColor  + float (livre)
+    Cada vec3 seguido de float ocupa exatamente um slot de 16 bytes no std140.
+    Um único glBufferSubData por frame atualiza terreno, personagens, sol/lua e estrelas.
+    """
+    SIZE = 256
+
+    def __init__(self, binding=FRAME_DATA_BINDING):
+        self.binding = binding
+        self.data = np.zeros(self.SIZE // 4, dtype=np.float32)
+        self.ubo = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.ubo)
+        glBufferData(GL_UNIFORM_BUFFER, self.SIZE, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, binding, self.ubo)
+
+    def update(self, view, projection, light_space, light_dir, light_color, ambient_strength,
+               view_pos, fog_color, fog_density, time=0.0):
+        d = self.data
+        # np.array(glm.mat4) vem por linhas; o std140 espera colunas
+        d[0:16] = np.asarray(view, dtype=np.float32).T.ravel()
+        d[16:32] = np.asarray(projection, dtype=np.float32).T.ravel()
+        d[32:48] = np.asarray(light_space, dtype=np.float32).T.ravel()
+        d[48:51], d[51] = tuple(light_dir), ambient_strength
+        d[52:55], d[55] = tuple(light_color), fog_density
+        d[56:59], d[59] = tuple(view_pos), time
+        d[60:63] = tuple(fog_color)
+
+        glBindBuffer(GL_UNIFORM_BUFFER, self.ubo)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, self.data.nbytes, self.data)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+
+    def delete(self):
+        glDeleteBuffers(1, [self.ubo])
@@ -0,0 +1,15 @@
+// Dados por frame compartilhados por todos os programas (uniform buffer, binding 0).
+// Mesmo layout de FrameUniforms em shader_program.py: cada vec3 + float = 16 bytes.
+layout (std140) uniform FrameData
+{
+    mat4 view;
+    mat4 projection;
+    mat4 lightSpaceMatrix;
+    vec3 lightDir;
+    float ambientStrength;
+    vec3 lightColor;
+    float fogDensity;
+    vec3 viewPos;
+    float time;
+    vec3 fogColor;
+};
@@ -1,10 +1,13 @@
 #version 330 core
 
 layout (location = 0) in vec3 aPos;
+layout (location = 3) in mat4 aInstanceModel; // locations 3..6, divisor 1
 
 uniform mat4 lightSpaceMatrix;
 uniform mat4 model;
+uniform bool useInstancing;
 
 void main() {
-    gl_Position = lightSpaceMatrix * model * vec4(aPos, 1.0);
+    mat4 modelMatrix = useInstancing ? aInstanceModel : model;
+    gl_Position = lightSpaceMatrix * modelMatrix * vec4(aPos, 1.0);
 }
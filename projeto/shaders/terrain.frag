@@ -4,19 +4,28 @@ in vec3 FragPos;
 in vec3 Normal;
 in vec2 TexCoord;
 in vec4 FragPosLightSpace; 
+flat in vec4 Material;   // x = camada (-1 = usa texture1), y/z/w = tem mapa normal/especular/emissão
 
 out vec4 FragColor;
 
 uniform sampler2D texture1;
 uniform sampler2D shadowMap;
+uniform sampler2DArray shadowMapArray;
 
-uniform vec3 lightDir;        
-uniform vec3 lightColor;
-uniform float ambientStrength;
-uniform vec3 viewPos;
+// Mapas de material dos personagens (MaterialArray), uma camada por material
+uniform sampler2DArray materialDiffuse;
+uniform sampler2DArray materialNormal;
+uniform sampler2DArray materialSpecular;
+uniform sampler2DArray materialEmission;
+
+// Cascaded Shadow Maps (cascadeCount = 0 -> mapa único em shadowMap)
+uniform int cascadeCount;
+uniform mat4 cascadeMatrices[4];
+uniform float cascadeSplits[4];   // profundidade (espaço da câmera) do fim de cada cascata
+
+// view, lightDir, lightColor, ambientStrength, viewPos, fogColor, fogDensity
+#include "frame_data.glsl"
 
-uniform vec3 fogColor;
-uniform float fogDensity;
 uniform float specularStrength; 
 
 float ShadowCalculation(vec4 fragPosLightSpace, vec3 normal, vec3 lightDir, bool isTerrain)
@@ -45,17 +54,77 @@ float ShadowCalculation(vec4 fragPosLightSpace, vec3 normal, vec3 lightDir, bool
     return shadow;
 }
 
+float ShadowCalculationCascaded(vec3 fragPos, vec3 normal, vec3 lightDir, bool isTerrain)
+{
+    // Escolhe a cascata pela profundidade do fragmento no espaço da câmera
+    float depthView = -(view * vec4(fragPos, 1.0)).z;
+    int layer = -1;
+    for(int i = 0; i < cascadeCount; ++i)
+    {
+        if(depthView < cascadeSplits[i]) { layer = i; break; }
+    }
+    if(layer < 0) return 0.0;
+
+    vec4 fragPosLightSpace = cascadeMatrices[layer] * vec4(fragPos, 1.0);
+    vec3 projCoords = fragPosLightSpace.xyz / fragPosLightSpace.w;
+    projCoords = projCoords * 0.5 + 0.5;
+
+    if(projCoords.z > 1.0) return 0.0;
+
+    float minBias = isTerrain ? 0.005 : 0.0002;
+    float bias = max(0.005 * (1.0 - dot(normal, lightDir)), minBias);
+
+    float shadow = 0.0;
+    vec2 texelSize = 1.0 / vec2(textureSize(shadowMapArray, 0).xy);
+
+    for(int x = -1; x <= 1; ++x)
+    {
+        for(int y = -1; y <= 1; ++y)
+        {
+            float pcfDepth = texture(shadowMapArray, vec3(projCoords.xy + vec2(x, y) * texelSize, layer)).r;
+            shadow += (projCoords.z - bias > pcfDepth ? 1.0 : 0.0);
+        }
+    }
+    shadow /= 9.0;
+
+    return shadow;
+}
+
+// Base tangente a partir das derivadas de posição e UV (a malha não tem tangentes)
+mat3 CotangentFrame(vec3 N, vec3 p, vec2 uv)
+{
+    vec3 dp1 = dFdx(p);
+    vec3 dp2 = dFdy(p);
+    vec2 duv1 = dFdx(uv);
+    vec2 duv2 = dFdy(uv);
+
+    vec3 dp2perp = cross(dp2, N);
+    vec3 dp1perp = cross(N, dp1);
+    vec3 T = dp2perp * duv1.x + dp1perp * duv2.x;
+    vec3 B = dp2perp * duv1.y + dp1perp * duv2.y;
+
+    float invmax = inversesqrt(max(max(dot(T, T), dot(B, B)), 1e-12));
+    return mat3(T * invmax, B * invmax, N);
+}
+
 void main()
 {
-    vec4 texColor = texture(texture1, TexCoord);
+    bool useMaterial = Material.x >= 0.0;
+    vec3 layerCoord = vec3(TexCoord, Material.x);
+
+    vec4 texColor = useMaterial ? texture(materialDiffuse, layerCoord) : texture(texture1, TexCoord);
     if(texColor.a < 0.1) discard;
 
-    bool isTerrain = (Normal.y > 0.9);
+    bool isTerrain = !useMaterial && (Normal.y > 0.9);
 
     vec3 norm = normalize(Normal);
     if (isTerrain) {
          norm = vec3(0.0, 1.0, 0.0); // Força normal para cima (Garante que o terreno receba luz)
     }
+    if (useMaterial && Material.y > 0.5) {
+        vec3 mapNormal = texture(materialNormal, layerCoord).xyz * 2.0 - 1.0;
+        norm = normalize(CotangentFrame(norm, FragPos, TexCoord) * mapNormal);
+    }
 
     vec3 lightDirection = normalize(-lightDir); 
     
@@ -77,12 +146,20 @@ void main()
         vec3 viewDir = normalize(viewPos - FragPos);
         vec3 halfwayDir = normalize(lightDirection + viewDir);
         float spec = pow(max(dot(norm, halfwayDir), 0.0), 32.0);
-        specular = specularStrength * spec * lightColor;
+        vec3 specColor = (useMaterial && Material.z > 0.5)
+            ? texture(materialSpecular, layerCoord).rgb
+            : vec3(specularStrength);
+        specular = specColor * spec * lightColor;
     }
 
-    float shadow = ShadowCalculation(FragPosLightSpace, norm, lightDirection, isTerrain);
+    // Emissão não depende da luz nem da sombra
+    vec3 emission = (useMaterial && Material.w > 0.5) ? texture(materialEmission, layerCoord).rgb : vec3(0.0);
+
+    float shadow = cascadeCount > 0
+        ? ShadowCalculationCascaded(FragPos, norm, lightDirection, isTerrain)
+        : ShadowCalculation(FragPosLightSpace, norm, lightDirection, isTerrain);
 
-    vec3 lighting = (ambient + (1.0 - shadow) * (diffuse + specular));
+    vec3 lighting = (ambient + (1.0 - shadow) * (diffuse + specular)) + emission;
 
     float distance = length(viewPos - FragPos);
     float fogFactor = 1.0 - exp(-pow(distance * fogDensity, 2.0));
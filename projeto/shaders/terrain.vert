@@ -2,24 +2,32 @@
 layout (location = 0) in vec3 aPos;
 layout (location = 1) in vec3 aNormal;
 layout (location = 2) in vec2 aTexCoord;
+layout (location = 3) in mat4 aInstanceModel; // locations 3..6, divisor 1
+layout (location = 7) in vec4 aInstanceMaterial; // camada do MaterialArray + mapas presentes
 
 out vec3 FragPos;
 out vec3 Normal;
 out vec2 TexCoord;
 out vec4 FragPosLightSpace; 
+flat out vec4 Material;
+
+#include "frame_data.glsl"
 
 uniform mat4 model;
-uniform mat4 view;
-uniform mat4 projection;
-uniform mat4 lightSpaceMatrix; 
+uniform bool useInstancing;
 
 void main()
 {
-    FragPos = vec3(model * vec4(aPos, 1.0));
+    mat4 modelMatrix = useInstancing ? aInstanceModel : model;
+
+    FragPos = vec3(modelMatrix * vec4(aPos, 1.0));
     
-    Normal = mat3(transpose(inverse(model))) * aNormal;
+    Normal = mat3(transpose(inverse(modelMatrix))) * aNormal;
     
     TexCoord = aTexCoord;
+
+    // Sem instancing (terreno, desenho legado): sem material em array
+    Material = useInstancing ? aInstanceMaterial : vec4(-1.0, 0.0, 0.0, 0.0);
     
     FragPosLightSpace = lightSpaceMatrix * vec4(FragPos, 1.0);
     
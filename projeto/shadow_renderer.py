@@ -2,17 +2,80 @@ import pygame
 import numpy as np
 import glm
 from OpenGL.GL import *
-from OpenGL.GL.shaders import compileShader, compileProgram
 import os
+import math
+from shader_program import ShaderProgram
+from gl_state import gl_state, DrawList
+from culling import frustum_corners, shadow_caster_planes
+
+MAX_CASCADES = 4
 
 class ShadowRenderer:
-    def __init__(self, shadow_width=2048, shadow_height=2048):
+    """
+    Shadow mapping da luz direcional.
+    
+    cascades=1 : mapa único cobrindo o volume fixo ortho_bounds (modo original)
+    cascades>1 : Cascaded Shadow Maps (2 a 4 cascatas em um GL_TEXTURE_2D_ARRAY),
+                 cada uma ajustada a uma fatia do frustum da câmera
+    
+    Com cache_enabled o mapa (ou cada cascata) só é redesenhado quando muda:
+    a direção da luz girou mais que angle_threshold graus, o Cenario mudou
+    (versão), o volume ajustado da cascata andou ou a câmera girou mais que
+    camera_angle_threshold graus / andou mais que camera_move_threshold
+    metros desde o desenho. max_cascade_updates limita quantas cascatas
+    atrasadas são redesenhadas por frame.
+    
+    Os projetores continuam recortados pela extrusão do frustum da câmera;
+    com cache, o frustum usado é alargado por esses limites (fov + 2x o
+    ângulo, extensão + a distância), então nada some enquanto a câmera não
+    passar deles.
+    """
+    def __init__(self, shadow_width=2048, shadow_height=2048, cascades=1, split_lambda=0.75, shadow_distance=200.0,
+                 cache_enabled=True, angle_threshold=0.5, max_cascade_updates=None,
+                 camera_angle_threshold=5.0, camera_move_threshold=4.0):
         self.shadow_width = shadow_width
         self.shadow_height = shadow_height
         self.shadow_fbo = None
         self.shadow_map = None
+        self.shadow_map_array = None
+        
+        # --- Cascatas ---
+        # split_lambda mistura a divisão logarítmica (1.0) e a uniforme (0.0)
+        self.cascades = max(1, min(MAX_CASCADES, cascades))
+        self.split_lambda = split_lambda
+        self.shadow_distance = shadow_distance
+        self.light_distance = 500.0
+        self.caster_margin = 300.0
+        self.cascade_splits = []
+        self.cascade_matrices = []
+        self.cascade_bounds = []
+        self.cascade_corners = []
+        self.cascade_caster_corners = []
         self.depth_shader = None
         self.light_space_matrix = None
+        self.light_view = None
+        
+        # Volume ortográfico da luz: (left, right, bottom, top, near, far)
+        self.ortho_bounds = (-200.0, 200.0, -200.0, 200.0, 1.0, 1000.0)
+        self.caster_stats = {"visible": 0, "culled": 0}
+        
+        # --- Cache ---
+        # cached_light_pos: posição da luz usada nos mapas atuais
+        # layer_keys[i]: o que foi desenhado na camada i (volume + versão do cenário)
+        # layer_cameras[i]: (posição, direção) da câmera cujo frustum recortou os projetores da camada i
+        # rendered_matrices[i]: matriz com que a camada i foi desenhada (usada na amostragem)
+        self.cache_enabled = cache_enabled
+        self.angle_threshold = angle_threshold
+        self.max_cascade_updates = max_cascade_updates
+        self.camera_angle_threshold = camera_angle_threshold
+        self.camera_move_threshold = camera_move_threshold
+        self.cached_light_pos = None
+        self.layer_keys = [None] * self.cascades
+        self.layer_cameras = [None] * self.cascades
+        self.rendered_matrices = [None] * self.cascades
+        self._next_cascade = 0
+        self.cache_stats = {"frames_cached": 0, "frames_rendered": 0, "layers_cached": 0, "layers_rendered": 0,
+                            "layers_camera": 0}
         
     def initialize(self):
         """Inicializa o sistema de shadow mapping"""
@@ -39,11 +102,8 @@ class ShadowRenderer:
             if not os.path.exists(vertex_path):
                 self.create_default_shadow_shaders()
             
-            # Usa UTF-8 para evitar erro de charmap
-            with open(vertex_path, 'r', encoding='utf-8') as f: vertex_src = f.read()
-            with open(fragment_path, 'r', encoding='utf-8') as f: fragment_src = f.read()
-                
-            self.depth_shader = compileProgram(compileShader(vertex_src, GL_VERTEX_SHADER), compileShader(fragment_src, GL_FRAGMENT_SHADER))
+            # Lido em UTF-8 (evita erro de charmap); localizações dos uniforms em cache
+            self.depth_shader = ShaderProgram.from_files(vertex_path, fragment_path)
             return True
         except Exception as e:
             print(f"❌ Erro shader sombra: {e}")
@@ -51,11 +111,13 @@ class ShadowRenderer:
     
     def create_default_shadow_shaders(self):
         with open("shaders/shadow_vertex.glsl", 'w', encoding='utf-8') as f:
-            f.write("#version 330 core\nlayout (location = 0) in vec3 aPos;\nuniform mat4 lightSpaceMatrix;\nuniform mat4 model;\nvoid main() { gl_Position = lightSpaceMatrix * model * vec4(aPos, 1.0); }")
+            f.write("#version 330 core\nlayout (location = 0) in vec3 aPos;\nlayout (location = 3) in mat4 aInstanceModel;\nuniform mat4 lightSpaceMatrix;\nuniform mat4 model;\nuniform bool useInstancing;\nvoid main() { mat4 m = useInstancing ? aInstanceModel : model; gl_Position = lightSpaceMatrix * m * vec4(aPos, 1.0); }")
         with open("shaders/shadow_fragment.glsl", 'w', encoding='utf-8') as f:
             f.write("#version 330 core\nvoid main() {}")
     
     def create_shadow_fbo(self):
+        if self.cascades > 1:
+            return self.create_cascade_fbo()
         try:
             self.shadow_fbo = glGenFramebuffers(1)
             self.shadow_map = glGenTextures(1)
@@ -91,76 +153,302 @@ class ShadowRenderer:
             print(f"❌ Erro ao criar FBO: {e}")
             return False
     
+    def create_cascade_fbo(self):
+        """Um FBO de profundidade cujo alvo é trocado entre as camadas do array"""
+        try:
+            self.shadow_fbo = glGenFramebuffers(1)
+            self.shadow_map_array = glGenTextures(1)
+            
+            glBindTexture(GL_TEXTURE_2D_ARRAY, self.shadow_map_array)
+            glTexImage3D(GL_TEXTURE_2D_ARRAY, 0, GL_DEPTH_COMPONENT,
+                         self.shadow_width, self.shadow_height, self.cascades, 0,
+                         GL_DEPTH_COMPONENT, GL_FLOAT, None)
+            
+            glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_BORDER)
+            glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_BORDER)
+            
+            border_color = np.array([1.0, 1.0, 1.0, 1.0], dtype=np.float32)
+            glTexParameterfv(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_BORDER_COLOR, border_color)
+            
+            glBindFramebuffer(GL_FRAMEBUFFER, self.shadow_fbo)
+            glFramebufferTextureLayer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, self.shadow_map_array, 0, 0)
+            glDrawBuffer(GL_NONE)
+            glReadBuffer(GL_NONE)
+            
+            status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+            glBindFramebuffer(GL_FRAMEBUFFER, 0)
+            
+            if status != GL_FRAMEBUFFER_COMPLETE:
+                print(f"❌ Framebuffer das cascatas incompleto: {status}")
+                return False
+            
+            print(f"🌓 Cascaded Shadow Maps: {self.cascades} x {self.shadow_width}x{self.shadow_height}")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Erro ao criar FBO das cascatas: {e}")
+            return False
+    
+    def compute_split_distances(self, near, far):
+        """Esquema "prático": mistura das divisões logarítmica e uniforme"""
+        splits = []
+        for i in range(1, self.cascades + 1):
+            f = i / self.cascades
+            log_split = near * (far / near) ** f
+            uniform_split = near + (far - near) * f
+            splits.append(self.split_lambda * log_split + (1.0 - self.split_lambda) * uniform_split)
+        return splits
+    
+    def compute_cascades(self, scene_renderer, light_pos):
+        """
+        Ajusta uma projeção ortográfica a cada fatia do frustum da câmera.
+        
+        Cada fatia é envolvida por uma esfera (raio não muda ao girar a câmera)
+        e o centro é alinhado à grade de texels no espaço da luz, evitando que
+        as bordas das sombras "tremam" quando a câmera anda.
+        """
+        view, _ = scene_renderer.camera_matrices()
+        near = scene_renderer.near
+        far = min(scene_renderer.far, self.shadow_distance)
+        aspect = scene_renderer.width / scene_renderer.height
+        
+        # Orientação da luz ancorada na origem (só depende da direção)
+        light_dir = glm.normalize(glm.vec3(light_pos))
+        self.light_view = glm.lookAt(light_dir * self.light_distance, glm.vec3(0.0), glm.vec3(0.0, 0.0, 1.0))
+        light_view = np.array(self.light_view)
+        
+        self.cascade_splits = self.compute_split_distances(near, far)
+        self.cascade_matrices, self.cascade_bounds, self.cascade_corners = [], [], []
+        self.cascade_caster_corners = []
+        
+        slice_near = near
+        for slice_far in self.cascade_splits:
+            self.cascade_caster_corners.append(self.caster_corners(scene_renderer, slice_near, slice_far))
+            slice_proj = glm.perspective(glm.radians(scene_renderer.fov), aspect, slice_near, slice_far)
+            corners = frustum_corners(np.array(slice_proj * view))
+            center = corners.mean(axis=0)
+            radius = np.linalg.norm(corners - center, axis=1).max()
+            radius = np.ceil(radius * 16.0) / 16.0
+            
+            # Snap do centro (no espaço da luz) em múltiplos do tamanho do texel
+            texel = 2.0 * radius / self.shadow_width
+            cx, cy, cz, _ = light_view @ np.append(center, 1.0)
+            cx = np.floor(cx / texel) * texel
+            cy = np.floor(cy / texel) * texel
+            depth = -cz
+            
+            bounds = (cx - radius, cx + radius, cy - radius, cy + radius,
+                      max(0.1, depth - radius - self.caster_margin), depth + radius)
+            self.cascade_bounds.append(bounds)
+            self.cascade_matrices.append(glm.ortho(*[float(b) for b in bounds]) * self.light_view)
+            self.cascade_corners.append(corners)
+            slice_near = slice_far
+    
     def get_light_space_matrix(self, light_pos):
         # Projeção Ortográfica: Aumentada para cobrir todo o terreno (-200 a 200)
         # Far plane 1000.0 para capturar sombras quando o sol está longe
-        light_projection = glm.ortho(-200.0, 200.0, -200.0, 200.0, 1.0, 1000.0)
+        light_projection = glm.ortho(*self.ortho_bounds)
         
         # CORREÇÃO DE MATRIZ:
         # Usamos UP = (0,0,1) (Eixo Z). 
         # Como o sol gira em X/Y, ele nunca alinha com Z, evitando travamento (Gimbal Lock).
-        light_view = glm.lookAt(light_pos, glm.vec3(0.0), glm.vec3(0.0, 0.0, 1.0))
+        self.light_view = glm.lookAt(light_pos, glm.vec3(0.0), glm.vec3(0.0, 0.0, 1.0))
         
-        self.light_space_matrix = light_projection * light_view
+        self.light_space_matrix = light_projection * self.light_view
         return self.light_space_matrix
     
+    def caster_corners(self, scene_renderer, near, far):
+        """
+        Cantos do frustum da câmera (entre near e far) que recortam os
+        projetores. Com cache o fov cresce 2x camera_angle_threshold: o mapa
+        continua certo enquanto a câmera não girar mais que isso.
+        """
+        view, _ = scene_renderer.camera_matrices()
+        fov = scene_renderer.fov
+        if self.cache_enabled:
+            fov = min(fov + 2.0 * self.camera_angle_threshold, 179.0)
+        proj = glm.perspective(glm.radians(fov), scene_renderer.width / scene_renderer.height, near, far)
+        return frustum_corners(np.array(proj * view))
+    
+    def cull_shadow_casters(self, scene_renderer, ortho_bounds, camera_corners):
+        """
+        Instâncias dentro do volume da luz intersectado com a extrusão do
+        frustum da câmera na direção da luz (mesma grade espacial do passe principal).
+        """
+        # Com cache a extrusão também cobre a câmera andar até camera_move_threshold
+        margin = self.camera_move_threshold if self.cache_enabled else 0.0
+        planes = shadow_caster_planes(np.array(self.light_view), ortho_bounds, camera_corners, margin)
+        if planes is None:
+            return np.zeros(0, dtype=np.int64)
+        return scene_renderer.cenario.cull_planes(planes)
+    
+    def draw_casters(self, scene_renderer, light_space_matrix, ortho_bounds, camera_corners, pass_name):
+        """Desenha terreno e personagens no mapa de profundidade atual"""
+        self.depth_shader.set_mat4("lightSpaceMatrix", light_space_matrix)
+        
+        # Terreno e personagens (um draw instanciado por modelo, sem texturas)
+        # ordenados por estado na mesma DrawList
+        draw_list = DrawList()
+        if scene_renderer.terrain:
+            # Mesma matriz model do render principal (o mapa de alturas usa os níveis escolhidos para a câmera)
+            scene_renderer.terrain.submit(draw_list, self.depth_shader, bind_texture=False)
+        
+        # Só os personagens que podem projetar sombra dentro do que a câmera enxerga
+        if scene_renderer.cenario:
+            casters = self.cull_shadow_casters(scene_renderer, ortho_bounds, camera_corners)
+            scene_renderer.cenario.submit(draw_list, self.depth_shader, casters, bind_textures=False, pass_name=pass_name)
+            self.caster_stats["visible"] += len(casters)
+            self.caster_stats["culled"] += scene_renderer.cenario.store.count - len(casters)
+        draw_list.execute()
+    
+    def throttled_light_pos(self, light_pos):
+        """
+        Posição da luz a usar neste frame: a do último mapa desenhado enquanto
+        a direção não girar mais que angle_threshold graus (o sol anda devagar).
+        """
+        light_pos = glm.vec3(light_pos)
+        if self.cache_enabled and self.cached_light_pos is not None:
+            cos_angle = glm.dot(glm.normalize(light_pos), glm.normalize(self.cached_light_pos))
+            angle = math.degrees(math.acos(max(-1.0, min(1.0, cos_angle))))
+            if angle < self.angle_threshold:
+                return self.cached_light_pos
+        self.cached_light_pos = light_pos
+        return light_pos
+    
+    def camera_moved(self, layer, camera):
+        """A câmera saiu do que o recorte de projetores da camada cobre?"""
+        if self.layer_cameras[layer] is None:
+            return True
+        position, front = camera
+        cached_position, cached_front = self.layer_cameras[layer]
+        if glm.length(position - cached_position) > self.camera_move_threshold:
+            return True
+        cos_angle = glm.dot(glm.normalize(front), glm.normalize(cached_front))
+        return math.degrees(math.acos(max(-1.0, min(1.0, cos_angle)))) > self.camera_angle_threshold
+    
+    def stale_layers(self, keys, camera):
+        """
+        Camadas que precisam ser redesenhadas, dadas as chaves e a câmera
+        (posição, direção) do frame atual. A cascata 0 (a mais próxima) nunca
+        espera; as demais entram em rodízio até max_cascade_updates por frame.
+        """
+        if not self.cache_enabled:
+            return list(range(len(keys)))
+        stale = [i for i, key in enumerate(keys) if self.layer_keys[i] != key or self.camera_moved(i, camera)]
+        limit = self.max_cascade_updates
+        # Sem nada desenhado ainda, todas as camadas saem no primeiro frame
+        if limit is None or len(stale) <= limit or None in self.layer_keys:
+            return stale
+        
+        # Rodízio: começa pela cascata seguinte à última atualizada
+        n = len(keys)
+        others = sorted((i for i in stale if i != 0), key=lambda i: (i - self._next_cascade) % n)
+        selected = ([0] if 0 in stale else []) + others
+        selected = selected[:max(1, limit)]
+        if selected[-1] != 0:
+            self._next_cascade = (selected[-1] + 1) % n
+        return selected
+    
     def render_depth_map(self, scene_renderer, light_pos):
-        """Renderiza o depth map (Passo da Sombra)"""
+        """Renderiza o depth map (Passo da Sombra), reaproveitando o cache quando possível"""
         if not self.depth_shader or not self.shadow_fbo: return
+        
+        light_pos = self.throttled_light_pos(light_pos)
+        version = scene_renderer.cenario.version if scene_renderer.cenario else 0
+        
+        if self.cascades > 1:
+            self.compute_cascades(scene_renderer, light_pos)
+            keys = [(tuple(float(b) for b in bounds), version) for bounds in self.cascade_bounds]
+            matrices = self.cascade_matrices
+        else:
+            self.get_light_space_matrix(light_pos)
+            keys = [(tuple(light_pos), version)]
+            matrices = [self.light_space_matrix]
+        
+        camera = (glm.vec3(scene_renderer.camera_pos), glm.vec3(scene_renderer.camera_front))
+        layers = self.stale_layers(keys, camera)
+        self.cache_stats["layers_cached"] += len(keys) - len(layers)
+        self.cache_stats["layers_rendered"] += len(layers)
+        if self.cache_enabled:
+            # Redesenhos que só a câmera pediu: o custo de manter o recorte pela extrusão
+            self.cache_stats["layers_camera"] += sum(1 for i in layers if self.layer_keys[i] == keys[i])
+        if not layers:
+            self.cache_stats["frames_cached"] += 1
+            return
+        self.cache_stats["frames_rendered"] += 1
             
         glViewport(0, 0, self.shadow_width, self.shadow_height)
         glBindFramebuffer(GL_FRAMEBUFFER, self.shadow_fbo)
-        glClear(GL_DEPTH_BUFFER_BIT)
         
         # --- CORREÇÃO DE SOMBRA (FRONT FACE CULLING) ---
         # Renderiza as "costas" dos objetos para o mapa de sombra.
         # Isso corrige o problema da "mão preta" (Shadow Acne) nos personagens.
         glCullFace(GL_FRONT)
         
-        glUseProgram(self.depth_shader)
+        self.depth_shader.use()
+        self.caster_stats = {"visible": 0, "culled": 0}
         
-        # Configurar Matriz da Luz
-        light_matrix_glm = self.get_light_space_matrix(light_pos)
-        loc_space = glGetUniformLocation(self.depth_shader, "lightSpaceMatrix")
-        glUniformMatrix4fv(loc_space, 1, GL_FALSE, glm.value_ptr(light_matrix_glm))
+        if self.cascades > 1:
+            # Uma passada por cascata atrasada, cada uma em uma camada do array
+            for i in layers:
+                glFramebufferTextureLayer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, self.shadow_map_array, 0, i)
+                glClear(GL_DEPTH_BUFFER_BIT)
+                self.draw_casters(scene_renderer, self.cascade_matrices[i], self.cascade_bounds[i],
+                                  self.cascade_caster_corners[i], f"shadow{i}")
+        else:
+            glClear(GL_DEPTH_BUFFER_BIT)
+            
+            corners = self.caster_corners(scene_renderer, scene_renderer.near, scene_renderer.far)
+            self.draw_casters(scene_renderer, self.light_space_matrix, self.ortho_bounds, corners, "shadow")
         
-        # Desenhar Terreno
-        if scene_renderer.terrain:
-            # Aplica a mesma escala usada no render principal
-            model = glm.scale(glm.mat4(1.0), glm.vec3(scene_renderer.terrain.scale))
-            loc_model = glGetUniformLocation(self.depth_shader, "model")
-            glUniformMatrix4fv(loc_model, 1, GL_FALSE, glm.value_ptr(model))
-            
-            glBindVertexArray(scene_renderer.terrain.vao)
-            glDrawElements(GL_TRIANGLES, len(scene_renderer.terrain.indices), GL_UNSIGNED_INT, None)
-            glBindVertexArray(0)
-        
-        # Desenhar Personagens
-        if scene_renderer.cenario and hasattr(scene_renderer.cenario, 'instancias'):
-            for inst in scene_renderer.cenario.instancias:
-                model = glm.translate(glm.mat4(1.0), glm.vec3(inst.pos[0], inst.pos[1], inst.pos[2]))
-                model = glm.rotate(model, glm.radians(inst.rot), glm.vec3(0, 1, 0))
-                model = glm.scale(model, glm.vec3(inst.scale))
-                
-                loc_model = glGetUniformLocation(self.depth_shader, "model")
-                glUniformMatrix4fv(loc_model, 1, GL_FALSE, glm.value_ptr(model))
-                
-                if hasattr(inst.personagem, 'vao'):
-                    count = 0
-                    if hasattr(inst.personagem, 'indices'): count = len(inst.personagem.indices)
-                    elif hasattr(inst.personagem, 'count'): count = inst.personagem.count
-                    
-                    if count > 0:
-                        glBindVertexArray(inst.personagem.vao)
-                        glDrawElements(GL_TRIANGLES, count, GL_UNSIGNED_INT, None)
-                        glBindVertexArray(0)
+        for i in layers:
+            self.layer_keys[i] = keys[i]
+            self.layer_cameras[i] = camera
+            self.rendered_matrices[i] = matrices[i]
 
         # RESTAURAR CULLING
         # Importante: Voltar para GL_BACK para a cena normal ser desenhada corretamente
         glCullFace(GL_BACK)
         
         glBindFramebuffer(GL_FRAMEBUFFER, 0)
+    
+    def invalidate(self):
+        """Força o redesenho de todas as camadas no próximo frame"""
+        self.layer_keys = [None] * self.cascades
+    
+    def scene_light_matrix(self):
+        """Matriz do mapa único (lightSpaceMatrix do bloco FrameData); identidade com cascatas"""
+        if self.cascades == 1 and self.rendered_matrices[0] is not None:
+            return self.rendered_matrices[0]
+        return glm.mat4(1.0)
+    
+    def bind_for_scene(self, program):
+        """
+        Passa para o ShaderProgram da cena as cascatas e os mapas de sombra.
+        A lightSpaceMatrix do mapa único vai no bloco FrameData (scene_light_matrix).
+        shadowMap (unidade 1) e shadowMapArray (unidade 2) ficam sempre em
+        unidades diferentes: samplers de tipos distintos não podem dividir unidade.
+        """
+        program.set_int("shadowMap", 1)
+        program.set_int("shadowMapArray", 2)
+        
+        # Amostra com as matrizes com que cada camada foi de fato desenhada
+        if self.cascades > 1 and all(m is not None for m in self.rendered_matrices):
+            count = len(self.rendered_matrices)
+            matrices = np.array([np.array(m) for m in self.rendered_matrices], dtype=np.float32)
+            program.set_int("cascadeCount", count)
+            program.set_mat4("cascadeMatrices", matrices, transpose=True, count=count)
+            program.set_floats("cascadeSplits", self.cascade_splits)
+            
+            gl_state.bind_texture(GL_TEXTURE_2D_ARRAY, self.shadow_map_array, 2)
+        else:
+            program.set_int("cascadeCount", 0)
+            
+            gl_state.bind_texture(GL_TEXTURE_2D, self.shadow_map, 1)
         
     def cleanup(self):
         if self.shadow_fbo: glDeleteFramebuffers(1, [self.shadow_fbo])
-        if self.shadow_map: glDeleteTextures(1, [self.shadow_map])
\ No newline at end of file
+        if self.shadow_map: glDeleteTextures(1, [self.shadow_map])
+        if self.shadow_map_array: glDeleteTextures(1, [self.shadow_map_array])
\ No newline at end of file
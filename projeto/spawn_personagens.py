@@ -1,49 +1,248 @@
 import os
-import random
+import math
+import time
+import argparse
+import tempfile
+import numpy as np
 from FbxCommon import *
 from fbx_loader import load_fbx_model
-from terreno import Terreno
+from scatter import CHARACTER_LAYOUT, character_layout, footprint_radius
+from terrain_query import height_grid_from_obj
+from scene_file import SceneFile, pack_instances
+
+# ==========================================
+# EXPORTAÇÃO DA CENA FINAL (FBX COM INSTÂNCIAS)
+# ==========================================
+#
+# python spawn_personagens.py                           -> cenario_final.fbx + cenario_final.json/.npy
+# python spawn_personagens.py --benchmark               -> tempo e tamanho com 100, 1k e 10k instâncias
+# python spawn_personagens.py --benchmark --quantidades 50000
+#
+# Cada modelo vira UM FbxMesh (e um material); todos os nós das suas
+# instâncias apontam para ele como node attribute compartilhado. No arquivo a
+# geometria aparece uma vez e cada instância custa só um Model com
+# translação/rotação/escala e duas conexões, então o tempo e o tamanho crescem
+# com o número de nós, não com vértices x instâncias. Por padrão grava FBX
+# binário (o ASCII do SaveScene é ~3x maior e mais lento).
+#
+# A mesma distribuição é gravada no arquivo de cena (scene_file), que o
+# SceneRenderer carrega direto no InstanceStore sem abrir o FBX.
 
 
 MODELS_DIR = "FBX models"
 PERSONAGENS = [
     "Mutant.fbx",
-    "Warrok W Kurniawan.fbx", 
-    "Vampire A Lusth.fbx"
+    "Warrok W Kurniawan.fbx",
+    "Vampire A Lusth.fbx",
     "Pumpkinhulk L Shaw.fbx"
 ]
 OUTPUT = "cenario_final.fbx"
-INSTANCES_PER_MODEL = 20
-TERRAIN_EXTENT = 150.0
+SCENE_OUTPUT = "cenario_final.json"
+TERRAIN_OBJ = os.path.join(MODELS_DIR, "terreno.obj")
+TERRAIN_SCALE = 300.0
 
-def main():
-    out_manager, out_scene = InitializeSdkObjects()
-    root = out_scene.GetRootNode()
-    
-    for nome in PERSONAGENS:
+def load_models(names=PERSONAGENS):
+    """[(nome, mesh_data)] dos modelos que carregaram (mesmas opções do renderer: cache compartilhado)"""
+    loaded = []
+    for nome in names:
         path = os.path.join(MODELS_DIR, nome)
         if not os.path.exists(path):
             print(f"❌ Arquivo não encontrado: {path}")
             continue
-        
-        models = load_fbx_model(path)
+
+        models = load_fbx_model(path, weld=True, optimize=True)
         if not models:
             print(f"❌ Erro carregando: {path}")
             continue
-        
-        for i in range(INSTANCES_PER_MODEL):
-            node = FbxNode.Create(out_manager, f"{nome}_inst_{i}")
-            tx = random.uniform(-TERRAIN_EXTENT, TERRAIN_EXTENT)
-            tz = random.uniform(-TERRAIN_EXTENT, TERRAIN_EXTENT)
-            node.LclTranslation.Set(FbxDouble3(tx, 0.0, tz))
+        loaded.append((nome, models))
+    return loaded
+
+def create_fbx_mesh(manager, name, mesh_data):
+    """
+    FbxMesh indexado com normais e UVs por ponto de controle, a partir do
+    formato de load_fbx_model (vértices soldados -> um ponto por vértice).
+    """
+    positions, normals, uvs, indices, _ = mesh_data
+    mesh = FbxMesh.Create(manager, name)
+    mesh.InitControlPoints(len(positions))
+    for i, (x, y, z) in enumerate(positions.tolist()):
+        mesh.SetControlPointAt(FbxVector4(x, y, z), i)
+
+    normal_element = mesh.CreateElementNormal()
+    normal_element.SetMappingMode(FbxLayerElement.EMappingMode.eByControlPoint)
+    normal_element.SetReferenceMode(FbxLayerElement.EReferenceMode.eDirect)
+    normal_array = normal_element.GetDirectArray()
+    for x, y, z in normals.tolist():
+        normal_array.Add(FbxVector4(x, y, z))
+
+    uv_element = mesh.CreateElementUV("UVChannel_1")
+    uv_element.SetMappingMode(FbxLayerElement.EMappingMode.eByControlPoint)
+    uv_element.SetReferenceMode(FbxLayerElement.EReferenceMode.eDirect)
+    uv_array = uv_element.GetDirectArray()
+    for u, v in uvs.tolist():
+        uv_array.Add(FbxVector2(u, v))
+
+    # Um único material para a malha toda
+    material_element = mesh.CreateElementMaterial()
+    material_element.SetMappingMode(FbxLayerElement.EMappingMode.eAllSame)
+    material_element.SetReferenceMode(FbxLayerElement.EReferenceMode.eIndexToDirect)
+    material_element.GetIndexArray().Add(0)
+
+    for a, b, c in indices.reshape(-1, 3).tolist():
+        mesh.BeginPolygon()
+        mesh.AddPolygon(a)
+        mesh.AddPolygon(b)
+        mesh.AddPolygon(c)
+        mesh.EndPolygon()
+    return mesh
+
+def create_fbx_material(manager, name, materials):
+    """FbxSurfacePhong com a textura difusa do modelo (se houver)"""
+    material = FbxSurfacePhong.Create(manager, f"{name}_material")
+    diffuse = (materials or {}).get("diffuse")
+    if diffuse:
+        texture = FbxFileTexture.Create(manager, f"{name}_diffuse")
+        texture.SetFileName(os.path.abspath(diffuse))
+        texture.SetTextureUse(FbxTexture.ETextureUse.eStandard)
+        texture.SetMappingType(FbxTexture.EMappingType.eUV)
+        material.Diffuse.ConnectSrcObject(texture)
+    return material
+
+def grounded_positions(loaded, layout):
+    """Como Cenario.snap_to_ground: a base do modelo (menor y) apoiada no chão"""
+    bottoms = np.array([models[0][:, 1].min() for _, models in loaded], dtype=np.float32)
+    positions = layout.positions.copy()
+    positions[:, 1] -= bottoms[layout.model_ids] * layout.scale
+    return positions
+
+def build_scene(manager, scene, loaded, layout, positions):
+    """
+    Uma malha + um material por modelo; um nó por instância do layout com o
+    node attribute e o material compartilhados. Retorna quantos nós criou.
+    """
+    root = scene.GetRootNode()
+    created = 0
+    for model_id, (nome, models) in enumerate(loaded):
+        sel = layout.of_model(model_id)
+        if not len(sel):
+            continue
+        base = os.path.splitext(nome)[0]
+        mesh = create_fbx_mesh(manager, f"{base}_mesh", models)
+        material = create_fbx_material(manager, base, models[4])
+
+        # Nó nomeado pelo índice da instância no layout (a mesma linha do arquivo de cena)
+        yaws = layout.yaw[sel].tolist()
+        scales = layout.scale[sel].tolist()
+        for index, (tx, ty, tz), yaw, s in zip(sel.tolist(), positions[sel].tolist(), yaws, scales):
+            node = FbxNode.Create(manager, f"{base}_inst_{index}")
+            node.SetNodeAttribute(mesh)
+            node.AddMaterial(material)
+            node.LclTranslation.Set(FbxDouble3(tx, ty, tz))
+            node.LclRotation.Set(FbxDouble3(0.0, yaw, 0.0))
+            node.LclScaling.Set(FbxDouble3(s, s, s))
             root.AddChild(node)
-    
-    if SaveScene(out_manager, out_scene, OUTPUT):
-        print("✅ Cena final salva ->", OUTPUT)
+        created += len(sel)
+    return created
+
+def writer_format(manager, ascii=False):
+    """Índice do writer FBX binário (nativo) ou ASCII"""
+    registry = manager.GetIOPluginRegistry()
+    if not ascii:
+        return registry.GetNativeWriterFormat()
+    for index in range(registry.GetWriterFormatCount()):
+        if registry.WriterIsFBX(index) and "ascii" in registry.GetWriterFormatDescription(index):
+            return index
+    return -1
+
+def export(loaded, layout, output, ascii=False):
+    """Monta e salva a cena; retorna (ok, nós, tempo de montagem, tempo de gravação)"""
+    out_manager, out_scene = InitializeSdkObjects()
+    start = time.perf_counter()
+    nodes = build_scene(out_manager, out_scene, loaded, layout, grounded_positions(loaded, layout))
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ok = SaveScene(out_manager, out_scene, output, writer_format(out_manager, ascii))
+    save_time = time.perf_counter() - start
+    out_manager.Destroy()
+    return ok, nodes, build_time, save_time
+
+def benchmark(loaded, terrain, counts, ascii=False):
+    """Tempo de montagem/gravação e tamanho do arquivo para cada total de instâncias"""
+    radii = [footprint_radius(models[0]) for _, models in loaded]
+    print(f"{'instâncias':>10} | {'malhas':>6} | {'montagem (s)':>12} | {'gravação (s)':>12} | "
+          f"{'arquivo (MB)':>12} | {'bytes/inst.':>11}")
+    print("-" * 80)
+    with tempfile.TemporaryDirectory() as folder:
+        for count in counts:
+            per_model = math.ceil(count / len(loaded))
+            # Área proporcional à quantidade para caber sem sobreposição
+            half = max(CHARACTER_LAYOUT["bounds"][2], 4.0 * max(radii) * math.sqrt(per_model * len(loaded)))
+            layout = character_layout(radii, terrain=terrain, count_per_model=per_model,
+                                      bounds=(-half, -half, half, half))
+            output = os.path.join(folder, f"cena_{count}.fbx")
+            ok, nodes, build_time, save_time = export(loaded, layout, output, ascii)
+            if not ok:
+                print(f"❌ Erro ao salvar {count} instâncias.")
+                continue
+            size = os.path.getsize(output)
+            print(f"{nodes:>10,d} | {len(loaded):>6d} | {build_time:12.3f} | {save_time:12.3f} | "
+                  f"{size / 2**20:12.2f} | {size / max(nodes, 1):11.0f}")
+
+def write_scene_file(loaded, layout, path=SCENE_OUTPUT):
+    """Tabela de modelos, transformações (já no chão), terreno e iluminação padrão"""
+    models = [{"name": os.path.splitext(nome)[0], "path": os.path.join(MODELS_DIR, nome)} for nome, _ in loaded]
+    instances = pack_instances(grounded_positions(loaded, layout), layout.yaw, layout.scale, layout.model_ids)
+    terrain = {"obj": TERRAIN_OBJ, "scale": TERRAIN_SCALE, "heightmap": None}
+    return SceneFile(models, instances, terrain, layout=CHARACTER_LAYOUT).save(path)
+
+def generate(output=OUTPUT, scene_output=SCENE_OUTPUT, ascii=False):
+    """
+    Gera a cena completa no processo atual (também chamado pelo main.py):
+    carrega os modelos, distribui, grava o arquivo de cena e o FBX.
+    Retorna o caminho do arquivo de cena (None se nenhum modelo carregou).
+    """
+    loaded = load_models()
+    if not loaded:
+        print("❌ Nenhum modelo carregado.")
+        return None
+
+    # Distribuição compartilhada com o renderer (scatter.CHARACTER_LAYOUT), no chão do terreno
+    terrain = height_grid_from_obj(TERRAIN_OBJ, TERRAIN_SCALE)
+    layout = character_layout([footprint_radius(models[0]) for _, models in loaded], terrain=terrain)
+    print(f"🌲 {len(layout)} instâncias distribuídas (Poisson-disk, seed {CHARACTER_LAYOUT['seed']}).")
+
+    scene_path = write_scene_file(loaded, layout, scene_output)
+    print(f"✅ Arquivo de cena salvo -> {scene_path}")
+
+    ok, nodes, build_time, save_time = export(loaded, layout, output, ascii)
+    if ok:
+        size = os.path.getsize(output) / 2**20
+        print(f"✅ Cena final salva -> {output} ({nodes} instâncias de {len(loaded)} malhas, "
+              f"{size:.2f} MB, montagem {build_time:.2f}s, gravação {save_time:.2f}s)")
     else:
         print("❌ Erro ao salvar cena.")
-    
-    out_manager.Destroy()
+    return scene_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta a cena final (FBX + arquivo de cena) com instâncias compartilhando a malha de cada modelo.")
+    parser.add_argument("--saida", default=OUTPUT, help="Arquivo FBX de saída")
+    parser.add_argument("--cena", default=SCENE_OUTPUT, help="Arquivo de cena (.json; o .npy é gravado ao lado)")
+    parser.add_argument("--ascii", action="store_true", help="Grava FBX ASCII em vez de binário")
+    parser.add_argument("--benchmark", action="store_true", help="Mede montagem, gravação e tamanho em vez de exportar a cena")
+    parser.add_argument("--quantidades", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="Totais de instâncias do benchmark")
+    args = parser.parse_args()
+
+    if not args.benchmark:
+        generate(args.saida, args.cena, args.ascii)
+        return
+
+    loaded = load_models()
+    if not loaded:
+        print("❌ Nenhum modelo carregado.")
+        return
+    benchmark(loaded, height_grid_from_obj(TERRAIN_OBJ, TERRAIN_SCALE), args.quantidades, args.ascii)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,303 @@
+import numpy as np
+
+# ==========================================
+# CONSULTAS DE ALTURA / NORMAL / RAIO NO TERRENO
+# ==========================================
+#
+# HeightGrid guarda as alturas do terreno numa grade regular em XZ. Cada
+# célula vira dois triângulos pela diagonal (i+1, j)-(i, j+1), a mesma
+# triangulação do ChunkedHeightfield: no modo mapa de alturas as consultas
+# batem exatamente com a malha de nível 0. Malhas OBJ são rasterizadas uma
+# vez na criação (a maior altura de cada ponto da grade).
+#
+# Todas as consultas são vetorizadas (arrays de pontos/raios) e custam O(1)
+# por ponto; fora da grade valem as alturas da borda.
+
+
+class HeightGrid:
+    """
+    heights: (linhas, colunas), linha = z, coluna = x.
+    origin: (x, z) da amostra [0, 0]; cell_size: espaçamento em metros.
+    """
+    def __init__(self, heights, origin, cell_size):
+        self.heights = np.ascontiguousarray(heights, dtype=np.float32)
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.cell_size = float(cell_size)
+        self.min_height = float(self.heights.min())
+        self.max_height = float(self.heights.max())
+        rows, cols = self.heights.shape
+        self.extent_min = self.origin
+        self.extent_max = self.origin + self.cell_size * np.array([cols - 1, rows - 1])
+
+    @classmethod
+    def from_heightfield(cls, heightfield):
+        """Usa a própria grade do ChunkedHeightfield (sem cópia)"""
+        return cls(heightfield.heights, heightfield.origin, heightfield.cell_size)
+
+    @classmethod
+    def from_mesh(cls, positions, triangles, resolution=1024, batch_points=1 << 22):
+        """
+        Rasteriza os triângulos (vistos de cima) numa grade de até
+        resolution amostras no lado maior; pontos sem triângulo ficam com a
+        menor altura da malha.
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+        low, high = positions[:, [0, 2]].min(axis=0), positions[:, [0, 2]].max(axis=0)
+        cell_size = max(float((high - low).max()) / (resolution - 1), 1e-6)
+        cols, rows = (np.ceil((high - low) / cell_size).astype(int) + 1)
+        heights = np.full((rows, cols), -np.inf)
+
+        # Triângulos em coordenadas da grade e o retângulo de amostras de cada um
+        tri = positions[triangles]
+        gx = (tri[:, :, 0] - low[0]) / cell_size
+        gz = (tri[:, :, 2] - low[1]) / cell_size
+        j0 = np.ceil(gx.min(axis=1) - 1e-6).astype(np.int64)
+        j1 = np.floor(gx.max(axis=1) + 1e-6).astype(np.int64)
+        i0 = np.ceil(gz.min(axis=1) - 1e-6).astype(np.int64)
+        i1 = np.floor(gz.max(axis=1) + 1e-6).astype(np.int64)
+        width = np.maximum(j1 - j0 + 1, 0)
+        counts = width * np.maximum(i1 - i0 + 1, 0)
+
+        # Em lotes de ~batch_points amostras: (triângulo, amostra) -> baricêntricas -> maior altura
+        cumulative = np.cumsum(counts)
+        start = 0
+        while start < len(triangles):
+            done = cumulative[start - 1] if start else 0
+            stop = max(start + 1, int(np.searchsorted(cumulative, done + batch_points, side="right")))
+            ids = np.arange(start, stop)
+            start = stop
+            if counts[ids].sum() == 0:
+                continue
+            owner = np.repeat(ids, counts[ids])
+            local = np.arange(len(owner)) - np.repeat(np.cumsum(counts[ids]) - counts[ids], counts[ids])
+            pi = i0[owner] + local // width[owner]
+            pj = j0[owner] + local % width[owner]
+
+            ax, az = gx[owner, 0], gz[owner, 0]
+            e1x, e1z = gx[owner, 1] - ax, gz[owner, 1] - az
+            e2x, e2z = gx[owner, 2] - ax, gz[owner, 2] - az
+            det = e1x * e2z - e2x * e1z
+            valid = np.abs(det) > 1e-12
+            det = np.where(valid, det, 1.0)
+            px, pz = pj - ax, pi - az
+            b1 = (px * e2z - e2x * pz) / det
+            b2 = (e1x * pz - px * e1z) / det
+            inside = valid & (b1 >= -1e-6) & (b2 >= -1e-6) & (b1 + b2 <= 1 + 1e-6)
+            y = tri[owner, 0, 1] + b1 * (tri[owner, 1, 1] - tri[owner, 0, 1]) + b2 * (tri[owner, 2, 1] - tri[owner, 0, 1])
+            np.maximum.at(heights, (pi[inside], pj[inside]), y[inside])
+
+        heights[~np.isfinite(heights)] = positions[:, 1].min()
+        return cls(heights, low, cell_size)
+
+    # ------------------------------------------
+    # Altura e normal
+    # ------------------------------------------
+
+    def _cells(self, x, z):
+        """Célula (i, j) e coordenadas locais (u, v) em [0, 1] de cada ponto (presas à grade)"""
+        rows, cols = self.heights.shape
+        gx = np.clip((np.asarray(x, dtype=np.float64) - self.origin[0]) / self.cell_size, 0, cols - 1)
+        gz = np.clip((np.asarray(z, dtype=np.float64) - self.origin[1]) / self.cell_size, 0, rows - 1)
+        j = np.minimum(gx.astype(np.int64), cols - 2)
+        i = np.minimum(gz.astype(np.int64), rows - 2)
+        return i, j, gx - j, gz - i
+
+    def surface_at(self, x, z):
+        """Altura e normal (da face) em (x, z); aceita escalares ou arrays de mesma forma"""
+        i, j, u, v = self._cells(x, z)
+        h = self.heights
+        h00, h01, h10, h11 = h[i, j], h[i, j + 1], h[i + 1, j], h[i + 1, j + 1]
+        lower = u + v <= 1.0
+        # Triângulo (00, 10, 01) abaixo da diagonal, (01, 10, 11) acima
+        height = np.where(lower, h00 + u * (h01 - h00) + v * (h10 - h00),
+                          h11 + (1 - u) * (h10 - h11) + (1 - v) * (h01 - h11))
+        dx = np.where(lower, h01 - h00, h11 - h10) / self.cell_size
+        dz = np.where(lower, h10 - h00, h11 - h01) / self.cell_size
+        normal = np.stack([-dx, np.ones_like(dx), -dz], axis=-1)
+        normal /= np.linalg.norm(normal, axis=-1, keepdims=True)
+        return height.astype(np.float32), normal.astype(np.float32)
+
+    def height_at(self, x, z):
+        return self.surface_at(x, z)[0]
+
+    def normal_at(self, x, z):
+        return self.surface_at(x, z)[1]
+
+    # ------------------------------------------
+    # Raios e segmentos
+    # ------------------------------------------
+
+    def raycast(self, origins, directions, max_distance=1000.0, steps_per_cell=2, chunk=256):
+        """
+        Primeira interseção de cada raio com a superfície.
+        origins/directions (N, 3) ou (3,); retorna (hit (N,), distância (N,), ponto (N, 3)).
+        O raio é recortado à caixa da grade e percorrido em passos de
+        cell_size / steps_per_cell; a troca de lado é refinada por secante +
+        bissecção (erro bem abaixo de 1 mm). Um raio que começa abaixo da
+        superfície acerta onde sai dela. Raios verticais custam uma única
+        consulta de altura; os demais amostram em blocos que dobram a cada
+        rodada (2, 4, ... até chunk), então quem acerta logo para cedo.
+        """
+        origins = np.atleast_2d(np.asarray(origins, dtype=np.float64))
+        directions = np.atleast_2d(np.asarray(directions, dtype=np.float64))
+        directions = directions / np.maximum(np.linalg.norm(directions, axis=1, keepdims=True), 1e-12)
+        n = len(origins)
+        max_distance = np.broadcast_to(np.asarray(max_distance, dtype=np.float64), (n,))
+
+        # Trecho do raio dentro da caixa (x, y, z) da grade
+        box_min = np.array([self.extent_min[0], self.min_height, self.extent_min[1]])
+        box_max = np.array([self.extent_max[0], self.max_height, self.extent_max[1]])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inv = 1.0 / directions
+            t0 = (box_min - origins) * inv
+            t1 = (box_max - origins) * inv
+        t_near = np.nan_to_num(np.minimum(t0, t1), nan=-np.inf).max(axis=1)
+        t_far = np.nan_to_num(np.maximum(t0, t1), nan=np.inf).min(axis=1)
+        t_near = np.maximum(t_near, 0.0)
+        t_far = np.minimum(t_far, max_distance)
+        active = t_near <= t_far
+
+        hit = np.zeros(n, dtype=bool)
+        distance = np.full(n, np.inf)
+
+        # Verticais: a altura não muda ao longo do raio, o cruzamento sai direto
+        vertical = active & (np.hypot(directions[:, 0], directions[:, 2]) < 1e-9)
+        if vertical.any():
+            ground = self.height_at(origins[vertical, 0], origins[vertical, 2]).astype(np.float64)
+            t = (ground - origins[vertical, 1]) / directions[vertical, 1]
+            ok = (t >= t_near[vertical]) & (t <= t_far[vertical])
+            ids = np.flatnonzero(vertical)[ok]
+            hit[ids], distance[ids] = True, t[ok]
+
+        # Lado de partida: procura a primeira amostra do outro lado da superfície
+        start_gap = self._gap(origins + directions * t_near[:, None])
+        touching = active & ~vertical & (start_gap == 0)
+        hit[touching], distance[touching] = True, t_near[touching]
+        side = np.where(start_gap < 0, -1.0, 1.0)
+
+        step = self.cell_size / steps_per_cell
+        pending = np.flatnonzero(active & ~vertical & ~touching)
+        lo_t, hi_t = t_near.copy(), t_near.copy()
+        offset, size = 0, 2
+        while len(pending):
+            # Próximas `size` amostras de todos os raios pendentes de uma vez
+            ts = t_near[pending, None] + step * (offset + np.arange(1, size + 1))[None, :]
+            ts = np.minimum(ts, t_far[pending, None])
+            points = origins[pending, None] + directions[pending, None] * ts[..., None]
+            across = self._gap(points) * side[pending, None] <= 0
+            crossed = across.any(axis=1)
+            first = across.argmax(axis=1)
+
+            found = pending[crossed]
+            hi_t[found] = ts[crossed, first[crossed]]
+            lo_t[found] = np.where(first[crossed] > 0, ts[crossed, np.maximum(first[crossed] - 1, 0)],
+                                   t_near[found] + step * offset)
+            hit[found] = True
+
+            exhausted = ts[:, -1] >= t_far[pending]
+            pending = pending[~crossed & ~exhausted]
+            offset += size
+            size = min(2 * size, chunk)
+
+        found = np.flatnonzero(hit & ~vertical & ~touching)
+        if len(found):
+            distance[found] = self._refine(origins[found], directions[found], lo_t[found], hi_t[found], side[found])
+        points = origins + directions * np.where(hit, distance, 0.0)[:, None]
+        return hit, distance, points
+
+    def intersect_segment(self, start, end):
+        """Interseção de segmentos start -> end (N, 3); retorna (hit, ponto)"""
+        start = np.atleast_2d(np.asarray(start, dtype=np.float64))
+        delta = np.atleast_2d(np.asarray(end, dtype=np.float64)) - start
+        hit, _, points = self.raycast(start, delta, max_distance=np.linalg.norm(delta, axis=1))
+        return hit, points
+
+    def _gap(self, points):
+        """Altura do ponto acima da superfície (negativa = abaixo)"""
+        return points[..., 1] - self.height_at(points[..., 0], points[..., 2])
+
+    def _refine(self, origins, directions, lo, hi, side, iterations=24):
+        """
+        Entre lo (lado de partida) e hi (outro lado): secante e bissecção
+        alternadas. side = +1 para raios que partem acima, -1 abaixo.
+        """
+        gap_lo = self._gap(origins + directions * lo[:, None]) * side
+        gap_hi = self._gap(origins + directions * hi[:, None]) * side
+        for k in range(iterations):
+            if k % 2 == 0:
+                denom = gap_lo - gap_hi
+                mid = np.where(np.abs(denom) > 1e-12, lo + (hi - lo) * gap_lo / np.where(denom == 0, 1, denom),
+                               0.5 * (lo + hi))
+                mid = np.clip(mid, lo, hi)
+            else:
+                mid = 0.5 * (lo + hi)
+            gap = self._gap(origins + directions * mid[:, None]) * side
+            above = gap > 0
+            lo, gap_lo = np.where(above, mid, lo), np.where(above, gap, gap_lo)
+            hi, gap_hi = np.where(above, hi, mid), np.where(above, gap_hi, gap)
+        return hi
+
+def height_grid_from_obj(obj_path, scale=300.0):
+    """
+    HeightGrid do terreno OBJ escalado por (scale, 1, scale) como o Terreno o
+    desenha, sem OpenGL (ex.: spawn_personagens). None se o OBJ não carregar.
+    """
+    from obj_loader import load_obj
+    vertices, _, _, indices = load_obj(obj_path, weld=True, optimize=True)
+    if vertices is None:
+        return None
+    world = vertices.reshape(-1, 3) * np.array([scale, 1.0, scale], dtype=np.float32)
+    return HeightGrid.from_mesh(world, indices)
+
+
+def self_test(count=20000, seed=1):
+    """Raios de cima, de baixo, verticais e rasantes numa grade ondulada; retorna True se passou"""
+    rng = np.random.default_rng(seed)
+    zs, xs = np.mgrid[0:129, 0:129] * 0.5
+    grid = HeightGrid(4.0 * np.sin(xs * 0.3) * np.cos(zs * 0.2) + 0.05 * xs, (0.0, 0.0), 0.5)
+    low, high = grid.extent_min, grid.extent_max
+
+    def random_points(y_low, y_high):
+        xz = rng.uniform(low + 16, high - 16, (count, 2))
+        return np.column_stack([xz[:, 0], rng.uniform(y_low, y_high, count), xz[:, 1]])
+
+    down = np.tile([0.0, -1.0, 0.0], (count, 1))
+    cases = [
+        ("de cima, oblíquos", random_points(10, 30), rng.normal(size=(count, 3)) * [0.1, 0, 0.1] + [0, -1, 0]),
+        ("de baixo, oblíquos", random_points(-30, -10), rng.normal(size=(count, 3)) * [0.1, 0, 0.1] + [0, 1, 0]),
+        ("verticais para baixo", random_points(10, 30), down),
+        ("verticais para cima", random_points(-100, -10), -down),
+        ("rasantes", random_points(-4, 4), rng.normal(size=(count, 3)) * [1, 0.05, 1]),
+    ]
+    ok = True
+    for name, origins, directions in cases:
+        hit, distance, points = grid.raycast(origins, directions)
+        gap = np.abs(grid._gap(points[hit]))
+        # Fora os rasantes, todos atravessam a altura da grade sem sair dela em XZ
+        passed = bool(np.all(gap < 1e-3)) and (name == "rasantes" or bool(hit.all()))
+        print(f"{'✅' if passed else '❌'} {name}: {hit.sum()}/{count} acertos, maior |gap| {gap.max(initial=0):.2e} m")
+        ok = ok and passed
+
+    # Origem bem abaixo da caixa, subindo: o ponto é a superfície, não a entrada da caixa
+    hit, distance, point = grid.raycast([20.0, -100.0, 30.0], [0.0, 1.0, 0.0])
+    ground = float(grid.height_at(20.0, 30.0))
+    passed = bool(hit[0]) and abs(point[0, 1] - ground) < 1e-4 and abs(distance[0] - (100.0 + ground)) < 1e-4
+    print(f"{'✅' if passed else '❌'} origem abaixo da caixa: ponto y={point[0, 1]:.4f}, superfície {ground:.4f}")
+    return ok and passed
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    if "--teste" not in sys.argv:
+        print("Uso: python terrain_query.py --teste")
+        sys.exit(2)
+    passed = self_test()
+    grid = HeightGrid(np.random.default_rng(0).uniform(0, 20, (1025, 1025)), (-512.0, -512.0), 1.0)
+    xz = np.random.default_rng(1).uniform(-500, 500, (100000, 2))
+    for name, directions in (("retos para baixo", [0.0, -1.0, 0.0]), ("inclinados 10°", [0.1763, -1.0, 0.0])):
+        start = time.perf_counter()
+        grid.raycast(np.column_stack([xz[:, 0], np.full(len(xz), 50.0), xz[:, 1]]), np.tile(directions, (len(xz), 1)))
+        print(f"⏱️ 100k raios {name}: {(time.perf_counter() - start) * 1000:.0f} ms")
+    sys.exit(0 if passed else 1)
@@ -1,31 +1,102 @@
+import math
 import numpy as np
 from OpenGL.GL import *
 import glm
 import pygame
+from gl_state import gl_state, DrawList
 from obj_loader import load_obj # Importa a função do arquivo obj_loader.py corrigido
+from heightfield import ChunkedHeightfield, generate_heightmap, load_heightmap
+from terrain_query import HeightGrid
+from personagem import bind_mesh_attributes
 
 class Terreno:
-    def __init__(self, obj_path="FBX models/terreno.obj", texture_path="Textures/Grass005_2K-PNG_Color.png", scale=300.0, uv_repeat=40.0):
-        # 1. Tenta carregar o OBJ usando a função corrigida
-        self.vertices, self.texcoords, self.normals, self.indices = load_obj(obj_path)
-
-        # Se falhar (arquivo não existe ou erro), cria um plano simples para não travar
-        if self.vertices is None:
-            print(f"⚠️ Falha ao carregar {obj_path}, criando terreno plano de fallback.")
-            self.create_fallback_data()
+    """
+    Modo malha (padrão): o OBJ inteiro, escalado por (scale, 1, scale), em um glDrawElements.
+    Modo mapa de alturas (heightmap = caminho .npy/imagem, array ou "procedural"):
+    ChunkedHeightfield cobrindo [-scale, scale], com nível de detalhe por bloco
+    (update_lod) e culling por bloco (planes em submit).
+    Nos dois modos height_at / normal_at / raycast consultam a superfície
+    (HeightGrid) em coordenadas de mundo.
+    """
+    def __init__(self, obj_path="FBX models/terreno.obj", texture_path="Textures/Grass005_2K-PNG_Color.png", scale=300.0, uv_repeat=40.0, textures=None,
+                 heightmap=None, height_scale=30.0, chunk_size=64, pixel_error=2.0):
+        self.heightfield = None
+        self.pixel_error = pixel_error
+        self.stats = {"chunks": 0, "triangles": 0}
+        if heightmap is not None:
+            self._create_heightfield(heightmap, scale, height_scale, chunk_size, uv_repeat)
         else:
-            # Se carregou, repete a textura (Tiling) para não ficar esticada
-            if self.texcoords is not None:
-                self.texcoords *= uv_repeat
+            # 1. Tenta carregar o OBJ usando a função corrigida
+            self.vertices, self.texcoords, self.normals, self.indices = load_obj(obj_path, weld=True, optimize=True)
+
+            # Se falhar (arquivo não existe ou erro), cria um plano simples para não travar
+            if self.vertices is None:
+                print(f"⚠️ Falha ao carregar {obj_path}, criando terreno plano de fallback.")
+                self.create_fallback_data()
+            else:
+                # Se carregou, repete a textura (Tiling) para não ficar esticada
+                if self.texcoords is not None:
+                    self.texcoords *= uv_repeat
 
         # 2. Carrega Textura (Tenta arquivo -> Fallback para Verde Interno)
-        self.texture = self._load_or_create_texture(texture_path)
+        # Com TextureManager: verde interno como placeholder até a imagem ficar residente
+        self.texture_handle = None
+        if textures is not None:
+            self.texture_handle = textures.request(texture_path, repeat=True, mipmaps=True, flip=True,
+                                                   placeholder_color=(30, 100, 30, 255))
+        else:
+            self._texture = self._load_or_create_texture(texture_path)
 
         # 3. Configura os Buffers do OpenGL (VAO, VBOs, EBO)
-        self.vao = self._setup_buffers()
+        self.vao = self._setup_chunk_buffers() if self.heightfield is not None else self._setup_buffers()
         
         self.scale = scale
 
+        # 4. Grade de alturas para as consultas (no modo malha: o OBJ já escalado, rasterizado uma vez)
+        if self.heightfield is not None:
+            self.height_grid = HeightGrid.from_heightfield(self.heightfield)
+        else:
+            world = self.vertices.reshape(-1, 3) * np.array([scale, 1.0, scale], dtype=np.float32)
+            self.height_grid = HeightGrid.from_mesh(world, self.indices)
+
+    def _create_heightfield(self, heightmap, scale, height_scale, chunk_size, uv_repeat):
+        if isinstance(heightmap, str):
+            heightmap = generate_heightmap(1025) if heightmap == "procedural" else load_heightmap(heightmap)
+        self.heightfield = ChunkedHeightfield(heightmap, extent=scale, height_scale=height_scale,
+                                              chunk_size=chunk_size, uv_repeat=uv_repeat)
+        self.vertices = self.texcoords = self.normals = self.indices = None
+        # Até o primeiro update_lod todos os blocos ficam no nível mais grosso
+        self.chunk_lods = np.full(self.heightfield.chunk_count, self.heightfield.lod_levels - 1)
+        hf = self.heightfield
+        print(f"⛰️ Terreno por mapa de alturas: {hf.heights.shape[1]}x{hf.heights.shape[0]} amostras, "
+              f"{hf.chunk_count} blocos de {hf.chunk_size}², {hf.lod_levels} níveis "
+              f"({hf.full_triangles} triângulos na resolução completa)")
+
+    def height_at(self, x, z):
+        """Altura da superfície em (x, z) do mundo; escalares ou arrays"""
+        return self.height_grid.height_at(x, z)
+
+    def normal_at(self, x, z):
+        """Normal da face em (x, z), (..., 3)"""
+        return self.height_grid.normal_at(x, z)
+
+    def raycast(self, origins, directions, max_distance=1000.0):
+        """Primeira interseção de cada raio: (hit, distância, ponto), ver HeightGrid.raycast"""
+        return self.height_grid.raycast(origins, directions, max_distance)
+
+    def snap_to_ground(self, positions, bottom_offsets=0.0):
+        """
+        Cópia de positions (N, 3) com y na superfície. bottom_offsets: quanto
+        a base do objeto fica abaixo da sua origem (ex.: -bbox_min_y * escala).
+        """
+        positions = np.array(positions, dtype=np.float32).reshape(-1, 3)
+        positions[:, 1] = self.height_at(positions[:, 0], positions[:, 2]) + bottom_offsets
+        return positions
+
+    @property
+    def texture(self):
+        return self.texture_handle.id if self.texture_handle is not None else self._texture
+
     def _load_or_create_texture(self, path):
         """Tenta carregar imagem. Se falhar, cria textura verde na memória."""
         try:
@@ -90,6 +161,32 @@ class Terreno:
         glBindVertexArray(0)
         return vao
 
+    def _setup_chunk_buffers(self):
+        """Modo mapa de alturas: VBO intercalado com os vértices de todos os blocos + EBO com os índices de cada nível"""
+        hf = self.heightfield
+        vertices = hf.vertices.reshape(-1, 8)
+        self.vbo, self.ebo = glGenBuffers(2)
+        vao = glGenVertexArrays(1)
+        gl_state.bind_vertex_array(vao)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, hf.indices.nbytes, hf.indices, GL_STATIC_DRAW)
+        bind_mesh_attributes(self.vbo, self.ebo)
+        gl_state.bind_vertex_array(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        self.index_type = GL_UNSIGNED_SHORT if hf.indices.dtype == np.uint16 else GL_UNSIGNED_INT
+        self.lod_byte_offsets = hf.lod_offsets * hf.indices.itemsize
+        return vao
+
+    def update_lod(self, camera_pos, fov_degrees, viewport_height):
+        """Modo mapa de alturas: escolhe o nível de cada bloco para a câmera (uma vez por frame, vale para todos os passes)"""
+        if self.heightfield is None:
+            return
+        projection_scale = viewport_height / (2.0 * math.tan(math.radians(fov_degrees) / 2.0))
+        self.chunk_lods = self.heightfield.select_lods(camera_pos, projection_scale, self.pixel_error)
+
     def create_fallback_data(self):
         """Cria um quadrado simples caso o OBJ falhe."""
         # 4 vértices (Y=0)
@@ -101,22 +198,54 @@ class Terreno:
         # 2 Triângulos
         self.indices = np.array([0,1,2, 0,2,3], dtype=np.uint32)
 
-    def draw(self, program):
-        glUseProgram(program)
+    def submit(self, draw_list, program, bind_texture=True, model=None, planes=None):
+        """
+        Envia o terreno para a DrawList do passe (textura na unidade 0).
+        No modo mapa de alturas os vértices já estão no mundo; planes (6, 4)
+        descarta os blocos fora do frustum.
+        """
+        if self.heightfield is not None:
+            self._submit_chunks(draw_list, program, bind_texture, planes)
+            return
+        # Matriz Model (escala o terreno para o tamanho desejado, ex: 300m)
+        if model is None:
+            model = glm.scale(glm.mat4(1), glm.vec3(self.scale, 1.0, self.scale))
+        index_count = len(self.indices)
         
-        # 1. Ativa a textura na unidade 0
-        glActiveTexture(GL_TEXTURE0)
-        glBindTexture(GL_TEXTURE_2D, self.texture)
+        def setup():
+            # 'texture1' está na unidade 0; o terreno não usa o VBO de instâncias
+            program.set_int("texture1", 0)
+            program.set_int("useInstancing", 0)
+            program.set_mat4("model", model)
         
-        # Informa ao shader que 'texture1' está na unidade 0
-        loc = glGetUniformLocation(program, "texture1")
-        if loc != -1: glUniform1i(loc, 0)
-
-        # 2. Define a Matriz Model (escala o terreno para o tamanho desejado, ex: 300m)
-        model = glm.scale(glm.mat4(1), glm.vec3(self.scale, 1.0, self.scale))
-        glUniformMatrix4fv(glGetUniformLocation(program, "model"), 1, GL_FALSE, np.array(model, dtype=np.float32))
-
-        # 3. Desenha
-        glBindVertexArray(self.vao)
-        glDrawElements(GL_TRIANGLES, len(self.indices), GL_UNSIGNED_INT, None)
-        glBindVertexArray(0)
\ No newline at end of file
+        draw_list.submit(program, self.vao, self.texture if bind_texture else None,
+                         lambda: glDrawElements(GL_TRIANGLES, index_count, GL_UNSIGNED_INT, None),
+                         setup=setup)
+
+    def _submit_chunks(self, draw_list, program, bind_texture, planes):
+        """Todos os blocos visíveis num glMultiDrawElementsBaseVertex (um desenho por bloco, um comando)"""
+        hf = self.heightfield
+        chunks = hf.visible_chunks(planes)
+        if len(chunks) == 0:
+            return
+        lods = self.chunk_lods[chunks]
+        counts = hf.lod_counts[lods].astype(np.int32)
+        offsets = self.lod_byte_offsets[lods].astype(np.uintp)
+        base_vertices = (chunks * hf.vertices_per_chunk).astype(np.int32)
+        self.stats = {"chunks": len(chunks), "triangles": int(counts.sum()) // 3}
+        index_type = self.index_type
+
+        def setup():
+            program.set_int("texture1", 0)
+            program.set_int("useInstancing", 0)
+            program.set_mat4("model", glm.mat4(1.0))
+
+        draw_list.submit(program, self.vao, self.texture if bind_texture else None,
+                         lambda: glMultiDrawElementsBaseVertex(GL_TRIANGLES, counts, index_type, offsets,
+                                                               len(chunks), base_vertices),
+                         setup=setup)
+
+    def draw(self, program):
+        draw_list = DrawList()
+        self.submit(draw_list, program)
+        draw_list.execute()
@@ -0,0 +1,370 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import mesh_cache
+
+# ==========================================
+# PRÉ-PROCESSAMENTO DE TEXTURAS (MIPMAPS + BC1/BC3)
+# ==========================================
+#
+# bake() gera a cadeia completa de mipmaps na CPU (filtro caixa ou Kaiser,
+# com a média feita em espaço linear) e, opcionalmente, comprime cada nível
+# em blocos 4x4 BC1 (DXT1, 8 bytes/bloco, sem alfa) ou BC3 (DXT5, 16
+# bytes/bloco, com alfa). Os níveis vão para o mesmo cache binário das
+# malhas (mesh_cache, kind "tex"), com a mesma regra de invalidação: a
+# entrada vale enquanto mtime/tamanho da imagem e TEXTURE_VERSION baterem.
+#
+# Em tempo de execução, load_baked() devolve os níveis prontos e o
+# TextureManager/load_texture os envia direto ao GL, sem decodificar PNG e
+# sem glGenerateMipmap.
+#
+# python texture_baker.py                      -> .fbm dos personagens + ../Textures
+# python texture_baker.py "FBX models" --formato bc1 --filtro caixa
+
+TEXTURE_VERSION = 1
+
+# Formato -> (internal format do GL, bytes por bloco 4x4; 0 = sem compressão)
+GL_RGBA8 = 0x8058
+GL_COMPRESSED_RGB_S3TC_DXT1_EXT = 0x83F0
+GL_COMPRESSED_RGBA_S3TC_DXT5_EXT = 0x83F3
+FORMATS = {
+    "rgba": (GL_RGBA8, 0),
+    "bc1": (GL_COMPRESSED_RGB_S3TC_DXT1_EXT, 8),
+    "bc3": (GL_COMPRESSED_RGBA_S3TC_DXT5_EXT, 16),
+}
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tga", ".bmp")
+
+
+class BakedTexture:
+    """Cadeia de mipmaps pronta para upload: levels[i] = (largura, altura, bytes uint8)"""
+    def __init__(self, fmt, levels, source=None):
+        self.format = fmt
+        self.levels = levels
+        self.source = source
+
+    @property
+    def internal_format(self):
+        return FORMATS[self.format][0]
+
+    @property
+    def compressed(self):
+        return FORMATS[self.format][1] > 0
+
+    @property
+    def width(self):
+        return self.levels[0][0]
+
+    @property
+    def height(self):
+        return self.levels[0][1]
+
+    @property
+    def nbytes(self):
+        return sum(int(data.nbytes) for _, _, data in self.levels)
+
+
+# ------------------------------------------
+# Mipmaps
+# ------------------------------------------
+
+def _kaiser_weights(alpha=4.0, half_width=3):
+    """Pesos do filtro de redução 2x: sinc de meia banda janelado por Kaiser"""
+    taps = np.arange(-half_width + 1, half_width + 1)     # amostras 2i-2 .. 2i+3
+    x = taps - 0.5                                        # distância ao centro 2i+0.5
+    window = np.i0(alpha * np.sqrt(1.0 - (x / half_width) ** 2)) / np.i0(alpha)
+    weights = np.sinc(x / 2.0) * window
+    return taps, weights / weights.sum()
+
+
+_FILTERS = {
+    "caixa": (np.array([0, 1]), np.array([0.5, 0.5])),
+    "kaiser": _kaiser_weights(),
+}
+
+
+def _downsample_axis(img, axis, taps, weights, wrap):
+    """Reduz um eixo pela metade (mínimo 1); bordas repetidas ou em wrap (texturas em tiling)"""
+    n = img.shape[axis]
+    centers = 2 * np.arange(max(1, n // 2))
+    result = np.zeros_like(np.take(img, centers, axis=axis))
+    for tap, weight in zip(taps, weights):
+        idx = centers + tap
+        idx = idx % n if wrap else np.clip(idx, 0, n - 1)
+        result += weight * np.take(img, idx, axis=axis)
+    return result
+
+
+def build_mip_chain(pixels, filter="kaiser", wrap=False, gamma=2.2):
+    """
+    Cadeia completa (até 1x1) de uma imagem (altura, largura, 4) uint8.
+    RGB é filtrado em espaço linear (pixel ** gamma) para os níveis pequenos
+    não escurecerem; alfa é filtrado direto.
+    """
+    taps, weights = _FILTERS[filter]
+    linear = pixels.astype(np.float32) / 255.0
+    linear[..., :3] **= gamma
+
+    levels = [np.ascontiguousarray(pixels, dtype=np.uint8)]
+    while linear.shape[0] > 1 or linear.shape[1] > 1:
+        if linear.shape[0] > 1:
+            linear = _downsample_axis(linear, 0, taps, weights, wrap)
+        if linear.shape[1] > 1:
+            linear = _downsample_axis(linear, 1, taps, weights, wrap)
+        np.clip(linear, 0.0, 1.0, out=linear)
+        out = linear.copy()
+        out[..., :3] **= 1.0 / gamma
+        levels.append(np.round(out * 255.0).astype(np.uint8))
+    return levels
+
+
+# ------------------------------------------
+# Compressão BC1/BC3 (vetorizada por bloco)
+# ------------------------------------------
+
+def _to_blocks(pixels):
+    """(altura, largura, 4) -> (blocos, 16, 4) float32, completando até múltiplos de 4 com a borda"""
+    h, w = pixels.shape[:2]
+    pad_h, pad_w = (-h) % 4, (-w) % 4
+    if pad_h or pad_w:
+        pixels = np.pad(pixels, ((0, pad_h), (0, pad_w), (0, 0)), mode="edge")
+    bh, bw = pixels.shape[0] // 4, pixels.shape[1] // 4
+    blocks = pixels.reshape(bh, 4, bw, 4, 4).transpose(0, 2, 1, 3, 4)
+    return blocks.reshape(bh * bw, 16, 4).astype(np.float32)
+
+
+def _pack_565(rgb):
+    r = np.round(rgb[:, 0] * 31.0 / 255.0).astype(np.uint16)
+    g = np.round(rgb[:, 1] * 63.0 / 255.0).astype(np.uint16)
+    b = np.round(rgb[:, 2] * 31.0 / 255.0).astype(np.uint16)
+    return (r << 11) | (g << 5) | b
+
+
+def _unpack_565(c):
+    r = (c >> 11) & 31
+    g = (c >> 5) & 63
+    b = c & 31
+    return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=1).astype(np.float32)
+
+
+def _encode_color_blocks(rgb):
+    """
+    rgb (blocos, 16, 3) -> blocos BC1 (blocos, 8) uint8.
+    Extremos pela direção principal (PCA) das cores do bloco; sempre no
+    modo de 4 cores (c0 > c1), que também é o único válido dentro do BC3.
+    """
+    mean = rgb.mean(axis=1, keepdims=True)
+    centered = rgb - mean
+    cov = np.einsum("nki,nkj->nij", centered, centered)
+
+    # Iteração de potência: poucas rodadas bastam para uma matriz 3x3
+    axis = np.ones((len(rgb), 3), dtype=np.float32)
+    for _ in range(8):
+        axis = np.einsum("nij,nj->ni", cov, axis)
+        axis /= np.maximum(np.linalg.norm(axis, axis=1, keepdims=True), 1e-8)
+
+    proj = np.einsum("nki,ni->nk", centered, axis)
+    e0 = np.clip(mean[:, 0] + axis * proj.max(axis=1, keepdims=True), 0, 255)
+    e1 = np.clip(mean[:, 0] + axis * proj.min(axis=1, keepdims=True), 0, 255)
+
+    c0, c1 = _pack_565(e0), _pack_565(e1)
+    swap = c0 < c1
+    c0, c1 = np.where(swap, c1, c0), np.where(swap, c0, c1)
+
+    p0, p1 = _unpack_565(c0), _unpack_565(c1)
+    palette = np.stack([p0, p1, (2 * p0 + p1) / 3.0, (p0 + 2 * p1) / 3.0], axis=1)   # (n, 4, 3)
+    dist = ((rgb[:, :, None, :] - palette[:, None, :, :]) ** 2).sum(axis=-1)          # (n, 16, 4)
+    idx = dist.argmin(axis=-1).astype(np.uint32)
+    idx[c0 == c1] = 0   # bloco de cor única: modo de 3 cores, índice 0 = c0
+
+    bits = (idx << (2 * np.arange(16, dtype=np.uint32))).sum(axis=1, dtype=np.uint32)
+    out = np.zeros(len(rgb), dtype=[("c0", "<u2"), ("c1", "<u2"), ("idx", "<u4")])
+    out["c0"], out["c1"], out["idx"] = c0, c1, bits
+    return out.view(np.uint8).reshape(-1, 8)
+
+
+def _encode_alpha_blocks(alpha):
+    """alpha (blocos, 16) -> blocos de alfa do BC3 (blocos, 8) uint8, modo de 8 valores (a0 > a1)"""
+    a0 = alpha.max(axis=1).astype(np.uint8)
+    a1 = alpha.min(axis=1).astype(np.uint8)
+    f0, f1 = a0.astype(np.float32)[:, None], a1.astype(np.float32)[:, None]
+    steps = np.arange(1, 7, dtype=np.float32)[None, :]
+    palette = np.concatenate([f0, f1, ((7 - steps) * f0 + steps * f1) / 7.0], axis=1)   # (n, 8)
+    idx = np.abs(alpha[:, :, None] - palette[:, None, :]).argmin(axis=-1).astype(np.uint64)
+    idx[a0 == a1] = 0
+
+    bits = (idx << (3 * np.arange(16, dtype=np.uint64))).sum(axis=1, dtype=np.uint64)
+    out = np.zeros((len(alpha), 8), dtype=np.uint8)
+    out[:, 0], out[:, 1] = a0, a1
+    out[:, 2:] = bits.astype("<u8").view(np.uint8).reshape(-1, 8)[:, :6]
+    return out
+
+
+def encode_bc1(pixels):
+    """(altura, largura, 4) uint8 -> bytes BC1 em ordem de blocos (linhas de cima para baixo)"""
+    blocks = _to_blocks(pixels)
+    return _encode_color_blocks(blocks[:, :, :3]).ravel()
+
+
+def encode_bc3(pixels):
+    """(altura, largura, 4) uint8 -> bytes BC3 (alfa + cor por bloco)"""
+    blocks = _to_blocks(pixels)
+    alpha = _encode_alpha_blocks(blocks[:, :, 3])
+    color = _encode_color_blocks(blocks[:, :, :3])
+    return np.concatenate([alpha, color], axis=1).ravel()
+
+
+_ENCODERS = {"rgba": lambda level: level.ravel(), "bc1": encode_bc1, "bc3": encode_bc3}
+
+
+# ------------------------------------------
+# Bake / cache
+# ------------------------------------------
+
+def _variant(flip):
+    return "flip" if flip else ""
+
+
+def bake(path, fmt="auto", filter="kaiser", wrap=False, flip=False, store=True):
+    """
+    Gera (e grava no cache) a textura pronta de uma imagem.
+    fmt "auto": BC3 se houver alfa diferente de 255, senão BC1.
+    """
+    from PIL import Image
+    with Image.open(path) as img:
+        img = img.convert("RGBA")
+        if flip:
+            img = img.transpose(Image.FLIP_TOP_BOTTOM)
+        pixels = np.asarray(img, dtype=np.uint8)
+
+    if fmt == "auto":
+        fmt = "bc3" if np.any(pixels[..., 3] < 255) else "bc1"
+    encode = _ENCODERS[fmt]
+    # Mapas de normal guardam vetores, não cores: média direto, sem gamma
+    gamma = 1.0 if "normal" in os.path.basename(path).lower() else 2.2
+
+    levels = []
+    for level in build_mip_chain(pixels, filter=filter, wrap=wrap, gamma=gamma):
+        levels.append((level.shape[1], level.shape[0], np.ascontiguousarray(encode(level))))
+    baked = BakedTexture(fmt, levels, source=path)
+
+    if store:
+        mesh_cache.store(path, "tex", TEXTURE_VERSION,
+                         {f"level{i}": data for i, (_, _, data) in enumerate(levels)},
+                         extra={"format": fmt, "filter": filter, "wrap": wrap, "gamma": gamma,
+                                "sizes": [[w, h] for w, h, _ in levels]},
+                         variant=_variant(flip))
+    return baked
+
+
+def load_baked(path, flip=False, allow_compressed=True, copy=False):
+    """
+    Textura pré-processada de path, ou None se não houver entrada válida
+    (ou se ela for comprimida e o driver não tiver S3TC).
+    copy=True tira os níveis do memmap (útil em threads de carregamento).
+    """
+    if not path or not os.path.exists(path):
+        return None
+    cached = mesh_cache.load(path, "tex", TEXTURE_VERSION, _variant(flip))
+    if cached is None:
+        return None
+    arrays, extra = cached
+    fmt = extra.get("format")
+    if fmt not in FORMATS or (FORMATS[fmt][1] and not allow_compressed):
+        return None
+    levels = []
+    for i, (w, h) in enumerate(extra["sizes"]):
+        data = arrays[f"level{i}"]
+        levels.append((w, h, np.array(data) if copy else data))
+    return BakedTexture(fmt, levels, source=path)
+
+
+def is_baked(path, flip=False):
+    return load_baked(path, flip) is not None
+
+
+# ------------------------------------------
+# Relatório de memória
+# ------------------------------------------
+
+def uncompressed_bytes(width, height):
+    """Como a textura era enviada antes: RGBA8, só o nível 0"""
+    return width * height * 4
+
+
+def print_memory_report(baked_textures):
+    """Memória de vídeo antes (RGBA8 sem mipmaps) e depois (formato pré-processado, cadeia completa)"""
+    print("💾 Memória de textura:")
+    before_total = after_total = 0
+    for baked in baked_textures:
+        before = uncompressed_bytes(baked.width, baked.height)
+        after = baked.nbytes
+        before_total += before
+        after_total += after
+        name = os.path.basename(baked.source or "?")
+        print(f"   {name:<36} {baked.width}x{baked.height} {baked.format.upper():<4} "
+              f"{len(baked.levels):>2} níveis | {before / 2**20:7.2f} MB -> {after / 2**20:7.2f} MB")
+    if baked_textures:
+        print(f"   Total: {before_total / 2**20:.2f} MB -> {after_total / 2**20:.2f} MB "
+              f"({after_total / max(before_total, 1) * 100:.0f}% do original, já com mipmaps)")
+
+
+# ==========================================
+# CLI
+# ==========================================
+
+def find_images(directory):
+    images = []
+    for root, _, files in os.walk(directory):
+        for file in sorted(files):
+            if file.lower().endswith(IMAGE_EXTENSIONS):
+                images.append(os.path.join(root, file))
+    return images
+
+
+def bake_directory(directory, fmt="auto", filter="kaiser", wrap=False, flip=False, force=False):
+    """Processa todas as imagens de um diretório; retorna as BakedTexture (novas ou do cache)"""
+    results = []
+    for path in find_images(directory):
+        baked = None if force else load_baked(path, flip)
+        if baked is not None:
+            print(f"✅ Já processada: {path}")
+        else:
+            start = time.perf_counter()
+            try:
+                baked = bake(path, fmt=fmt, filter=filter, wrap=wrap, flip=flip)
+            except (OSError, ValueError) as e:
+                print(f"❌ Falha em {path}: {e}")
+                continue
+            print(f"🧱 {path}: {baked.format.upper()}, {len(baked.levels)} níveis "
+                  f"em {time.perf_counter() - start:.2f}s")
+        results.append(baked)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera mipmaps e texturas BC1/BC3 no cache.")
+    parser.add_argument("diretorios", nargs="*",
+                        help="Diretórios de imagens (padrão: texturas dos personagens e ../Textures do terreno)")
+    parser.add_argument("--formato", choices=["auto", "bc1", "bc3", "rgba"], default="auto")
+    parser.add_argument("--filtro", choices=list(_FILTERS), default="kaiser")
+    parser.add_argument("--repetir", action="store_true", help="Filtra com wrap (texturas em tiling)")
+    parser.add_argument("--inverter", action="store_true", help="Inverte na vertical (origem do OpenGL)")
+    parser.add_argument("--forcar", action="store_true", help="Refaz mesmo com cache válido")
+    args = parser.parse_args()
+
+    if args.diretorios:
+        jobs = [(d, args.repetir, args.inverter) for d in args.diretorios]
+    else:
+        # Mesmas opções com que o renderer pede cada textura
+        jobs = [("FBX models", False, False), (os.path.join("..", "Textures"), True, True), ("Textures", True, True)]
+
+    baked_textures = []
+    for directory, wrap, flip in jobs:
+        if os.path.isdir(directory):
+            baked_textures += bake_directory(directory, fmt=args.formato, filter=args.filtro,
+                                             wrap=wrap, flip=flip, force=args.forcar)
+    print_memory_report(baked_textures)
+    sys.exit(0 if baked_textures else 1)
@@ -0,0 +1,398 @@
+import os
+import sys
+import time
+import ctypes
+
+# O autoteste roda sem janela: o PyOpenGL precisa do EGL antes de ser importado
+if __name__ == "__main__":
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from OpenGL.GL import *
+from OpenGL.raw.GL.VERSION.GL_1_3 import glCompressedTexImage2D as raw_glCompressedTexImage2D
+from gl_state import gl_state, has_extension
+from texture_baker import BakedTexture, load_baked
+
+# ==========================================
+# TEXTURAS ASSÍNCRONAS (THREADS + PBO)
+# ==========================================
+#
+# request() devolve na hora um TextureHandle cujo id aponta para uma
+# textura placeholder 1x1. A imagem é decodificada (PIL) num pool de
+# threads; a cada frame, update() pega as decodificações prontas e envia
+# os pixels por um pixel buffer object (PBO): o memcpy vai para memória do
+# driver e o glTexImage2D lê do PBO de forma assíncrona. Uma fence indica
+# quando a GPU terminou; só então o handle passa a apontar para a textura
+# real e o PBO é liberado. O loop principal nunca espera pela imagem.
+#
+# Caminhos iguais (com as mesmas opções) compartilham o mesmo handle.
+#
+# Se a imagem já foi pré-processada (texture_baker), a thread lê os níveis
+# prontos do cache em vez de decodificar o PNG, e o upload envia todos os
+# mipmaps (BC1/BC3 quando o driver tem S3TC) pelo mesmo PBO.
+#
+# python texture_manager.py --teste   -> autoteste sem janela (EGL): níveis BC1/BC3 ida e volta pelo GL
+
+
+class TextureHandle:
+    """Textura pedida ao TextureManager; use sempre .id na hora de desenhar"""
+    def __init__(self, path, placeholder_id, repeat, mipmaps, flip):
+        self.path = path
+        self.placeholder_id = placeholder_id
+        self.texture_id = None
+        self.repeat = repeat
+        self.mipmaps = mipmaps
+        self.flip = flip
+        self.error = None
+        self.format = None
+        self.vram_bytes = 0
+
+        self.requested_at = time.perf_counter()
+        self.timings = {}
+
+        self._future = None
+        self._pixels = None
+        self._pbo = None
+        self._fence = None
+        self._pending_id = None
+
+    @property
+    def id(self):
+        return self.texture_id if self.texture_id is not None else self.placeholder_id
+
+    @property
+    def resident(self):
+        return self.texture_id is not None
+
+
+def decode_image(path, flip=False):
+    """Decodifica em RGBA (altura, largura, 4) uint8; roda nas threads do pool"""
+    from PIL import Image
+    with Image.open(path) as img:
+        img = img.convert("RGBA")
+        if flip:
+            # Origem do OpenGL no canto inferior esquerdo
+            img = img.transpose(Image.FLIP_TOP_BOTTOM)
+        return np.asarray(img, dtype=np.uint8)
+
+
+def s3tc_supported():
+    """O driver aceita texturas BC1/BC3 (GL_EXT_texture_compression_s3tc)?"""
+    return has_extension("GL_EXT_texture_compression_s3tc")
+
+
+def upload_levels(baked, offsets=None):
+    """
+    Envia todos os níveis de uma BakedTexture para a textura ligada em
+    GL_TEXTURE_2D. Com offsets, os dados vêm do PBO ligado (um offset por nível).
+
+    Os níveis comprimidos usam a função crua: o glCompressedTexImage2D do
+    PyOpenGL calcula o imageSize a partir do array (7 argumentos) e não
+    aceita o offset de um PBO.
+    """
+    for level, (width, height, data) in enumerate(baked.levels):
+        source = ctypes.c_void_p(offsets[level]) if offsets is not None else data
+        if baked.compressed:
+            if offsets is None:
+                data = np.ascontiguousarray(data)
+                source = ctypes.c_void_p(data.ctypes.data)
+            raw_glCompressedTexImage2D(GL_TEXTURE_2D, level, baked.internal_format, width, height, 0,
+                                       int(data.nbytes), source)
+        else:
+            glTexImage2D(GL_TEXTURE_2D, level, GL_RGBA8, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, source)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(baked.levels) - 1)
+
+
+def create_baked_texture(baked, repeat=False):
+    """Upload síncrono (sem PBO) de uma textura pré-processada; retorna o id GL"""
+    tex = glGenTextures(1)
+    gl_state.bind_texture(GL_TEXTURE_2D, tex, 0)
+    wrap = GL_REPEAT if repeat else GL_CLAMP_TO_EDGE
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, wrap)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, wrap)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    upload_levels(baked)
+    return tex
+
+
+class TextureManager:
+    """
+    upload_budget: bytes enviados por frame no máximo (o resto espera o
+    próximo frame), para uma textura 2K não custar um frame inteiro.
+    use_baked: procura antes a versão pré-processada (texture_baker).
+    """
+    def __init__(self, max_workers=4, upload_budget=16 * 1024 * 1024, use_baked=True):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="textura")
+        self.upload_budget = upload_budget
+        self.handles = {}
+        self.placeholders = {}
+        self.decoding = []
+        self.uploading = []
+        self.use_baked = use_baked
+        self.compressed_ok = s3tc_supported()
+
+    # ------------------------------------------
+    # Pedidos (thread principal)
+    # ------------------------------------------
+
+    def request(self, path, pixels=None, repeat=False, mipmaps=False, flip=False,
+                placeholder_color=(200, 200, 200, 255)):
+        """
+        Pede uma textura. pixels (altura, largura, 4) uint8 já decodificados
+        pulam a etapa de decodificação (ex.: vindos do asset_pipeline).
+        """
+        key = (os.path.abspath(path) if path else None, repeat, mipmaps, flip)
+        handle = self.handles.get(key)
+        if handle is not None:
+            return handle
+
+        handle = TextureHandle(path, self._placeholder(placeholder_color), repeat, mipmaps, flip)
+        self.handles[key] = handle
+        if pixels is not None:
+            handle._pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+            handle.timings["decode"] = 0.0
+            self.uploading.append(handle)
+        elif path:
+            handle._future = self.pool.submit(self._decode, handle)
+            self.decoding.append(handle)
+        else:
+            handle.error = "sem caminho de textura"
+        return handle
+
+    def _decode(self, handle):
+        start = time.perf_counter()
+        data = None
+        if self.use_baked:
+            data = load_baked(handle.path, handle.flip, allow_compressed=self.compressed_ok, copy=True)
+        if data is None:
+            data = decode_image(handle.path, handle.flip)
+        handle.timings["decode"] = time.perf_counter() - start
+        return data
+
+    def _placeholder(self, color):
+        """Textura 1x1 de uma cor (criada uma vez por cor)"""
+        tex = self.placeholders.get(color)
+        if tex is None:
+            tex = glGenTextures(1)
+            gl_state.bind_texture(GL_TEXTURE_2D, tex, 0)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, 1, 1, 0, GL_RGBA, GL_UNSIGNED_BYTE,
+                         np.array(color, dtype=np.uint8))
+            self.placeholders[color] = tex
+        return tex
+
+    # ------------------------------------------
+    # Por frame (thread principal)
+    # ------------------------------------------
+
+    def update(self):
+        """Uma vez por frame: inicia uploads das imagens prontas e promove as que a GPU terminou"""
+        if not (self.decoding or self.uploading):
+            return
+
+        # 1. Decodificações concluídas entram na fila de upload
+        still_decoding = []
+        for handle in self.decoding:
+            if not handle._future.done():
+                still_decoding.append(handle)
+                continue
+            try:
+                handle._pixels = handle._future.result()
+                self.uploading.append(handle)
+            except Exception as e:
+                handle.error = f"{type(e).__name__}: {e}"
+                print(f"⚠️ Textura '{handle.path}' indisponível ({handle.error}); mantendo placeholder.")
+            handle._future = None
+        self.decoding = still_decoding
+
+        # 2. Uploads: fences sinalizadas viram texturas residentes;
+        #    novos uploads começam até o orçamento de bytes do frame
+        budget = self.upload_budget
+        still_uploading = []
+        for handle in self.uploading:
+            if handle._fence is not None:
+                if self._fence_done(handle):
+                    self._finish(handle)
+                else:
+                    still_uploading.append(handle)
+            elif budget > 0:
+                budget -= handle._pixels.nbytes
+                try:
+                    self._start_upload(handle)
+                    still_uploading.append(handle)
+                except Exception as e:
+                    self._abort_upload(handle, e)
+            else:
+                still_uploading.append(handle)
+        self.uploading = still_uploading
+
+    def _start_upload(self, handle):
+        start = time.perf_counter()
+        data = handle._pixels
+        baked = data if isinstance(data, BakedTexture) else None
+        chunks = [level for _, _, level in baked.levels] if baked else [data]
+
+        # Cópia para o PBO (memória do driver): todos os níveis em sequência
+        offsets, total = [], 0
+        for chunk in chunks:
+            offsets.append(total)
+            total += chunk.nbytes
+        handle._pbo = glGenBuffers(1)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, handle._pbo)
+        glBufferData(GL_PIXEL_UNPACK_BUFFER, total, None, GL_STREAM_DRAW)
+        ptr = glMapBufferRange(GL_PIXEL_UNPACK_BUFFER, 0, total,
+                               GL_MAP_WRITE_BIT | GL_MAP_INVALIDATE_BUFFER_BIT)
+        for offset, chunk in zip(offsets, chunks):
+            chunk = np.ascontiguousarray(chunk)
+            ctypes.memmove(ptr + offset, chunk.ctypes.data, chunk.nbytes)
+        glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+
+        # glTexImage2D com PBO ligado: o último argumento é um offset no buffer
+        tex = glGenTextures(1)
+        handle._pending_id = tex
+        gl_state.bind_texture(GL_TEXTURE_2D, tex, 0)
+        wrap = GL_REPEAT if handle.repeat else GL_CLAMP_TO_EDGE
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, wrap)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, wrap)
+        mipmaps = handle.mipmaps or baked is not None
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR if mipmaps else GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        if baked:
+            upload_levels(baked, offsets)
+            handle.format, handle.vram_bytes = baked.format, baked.nbytes
+        else:
+            height, width = data.shape[:2]
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+            if handle.mipmaps:
+                glGenerateMipmap(GL_TEXTURE_2D)
+            handle.format = "rgba"
+            handle.vram_bytes = data.nbytes * 4 // 3 if handle.mipmaps else data.nbytes
+
+        # Sem PBO ligado, glTexImage2D volta a ler da memória do cliente
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        handle._fence = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        handle._pixels = None
+        handle.timings["upload"] = time.perf_counter() - start
+
+    def _abort_upload(self, handle, error):
+        """Upload que falhou no GL: libera o PBO e a textura e mantém o placeholder"""
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        if handle._pbo is not None:
+            glDeleteBuffers(1, [handle._pbo])
+        if handle._pending_id is not None:
+            glDeleteTextures(1, [handle._pending_id])
+        handle._pbo = handle._pending_id = handle._pixels = None
+        handle.error = f"upload: {type(error).__name__}: {error}"
+        print(f"⚠️ Textura '{handle.path}' indisponível ({handle.error}); mantendo placeholder.")
+
+    def _fence_done(self, handle):
+        status = glClientWaitSync(handle._fence, 0, 0)
+        return status in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED)
+
+    def _finish(self, handle):
+        glDeleteSync(handle._fence)
+        glDeleteBuffers(1, [handle._pbo])
+        handle._fence = handle._pbo = None
+        handle.texture_id = handle._pending_id
+        handle.timings["pronta"] = time.perf_counter() - handle.requested_at
+        t = handle.timings
+        print(f"🖼️ Textura pronta: {os.path.basename(handle.path or '?')} "
+              f"(decodificação {t['decode'] * 1000:.0f}ms, upload {t['upload'] * 1000:.1f}ms, "
+              f"residente após {t['pronta'] * 1000:.0f}ms)")
+
+    @property
+    def busy(self):
+        return bool(self.decoding or self.uploading)
+
+    def print_report(self):
+        """Tempos de decodificação e upload de cada textura pedida"""
+        print("🖼️ Texturas:")
+        for handle in self.handles.values():
+            name = os.path.basename(handle.path or "?")
+            if handle.error:
+                print(f"   ❌ {name}: {handle.error}")
+            elif handle.resident:
+                t = handle.timings
+                print(f"   ✅ {name}: {handle.format.upper()} {handle.vram_bytes / 2**20:.2f} MB | "
+                      f"decodificação {t['decode'] * 1000:.0f}ms | upload {t['upload'] * 1000:.1f}ms "
+                      f"| residente após {t['pronta'] * 1000:.0f}ms")
+            else:
+                print(f"   ⏳ {name}: aguardando ({'decodificando' if handle._future else 'enviando'})")
+
+    def cleanup(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        textures = [h.texture_id for h in self.handles.values() if h.texture_id is not None]
+        textures += list(self.placeholders.values())
+        if textures:
+            glDeleteTextures(len(textures), textures)
+
+
+# ==========================================
+# AUTOTESTE SEM JANELA (EGL)
+# ==========================================
+
+def self_test(seed=0):
+    """
+    Envia uma cadeia BC1 e uma BC3 pelos dois caminhos (create_baked_texture
+    e PBO do TextureManager) e compara cada nível lido de volta com
+    glGetCompressedTexImage. Retorna True se passou.
+    """
+    from texture_baker import BakedTexture, build_mip_chain, encode_bc1, encode_bc3
+
+    print(f"🖥️ {glGetString(GL_RENDERER).decode()} | GL {glGetString(GL_VERSION).decode()}")
+    if not s3tc_supported():
+        print("⚠️ Sem S3TC: o TextureManager usa os níveis RGBA.")
+        return True
+
+    from OpenGL.raw.GL.VERSION.GL_1_3 import glGetCompressedTexImage as raw_glGetCompressedTexImage
+
+    def read_levels(tex, count):
+        # O glGetCompressedTexImage do PyOpenGL também quebra; tamanho consultado e leitura crua
+        gl_state.bind_texture(GL_TEXTURE_2D, tex, 0)
+        levels = []
+        for level in range(count):
+            size = int(glGetTexLevelParameteriv(GL_TEXTURE_2D, level, GL_TEXTURE_COMPRESSED_IMAGE_SIZE))
+            data = np.zeros(size, dtype=np.uint8)
+            raw_glGetCompressedTexImage(GL_TEXTURE_2D, level, ctypes.c_void_p(data.ctypes.data))
+            levels.append(data)
+        return levels
+
+    pixels = np.random.default_rng(seed).integers(0, 256, (64, 32, 4), dtype=np.uint8)
+    manager = TextureManager(use_baked=False)
+    ok = True
+    for fmt, encode in (("bc1", encode_bc1), ("bc3", encode_bc3)):
+        levels = [(level.shape[1], level.shape[0], np.ascontiguousarray(encode(level)))
+                  for level in build_mip_chain(pixels)]
+        baked = BakedTexture(fmt, levels)
+        expected = [data for _, _, data in levels]
+
+        direct = create_baked_texture(baked)
+        handle = TextureHandle(f"teste_{fmt}", manager._placeholder((0, 0, 0, 255)), False, True, False)
+        handle._pixels = baked
+        handle.timings["decode"] = 0.0
+        manager.uploading.append(handle)
+        while manager.busy:
+            manager.update()
+            glFinish()
+
+        for path, tex in (("direto", direct), ("PBO", handle.texture_id)):
+            got = read_levels(tex, len(levels)) if tex is not None else []
+            passed = handle.error is None and len(got) == len(expected) and \
+                all(np.array_equal(a, b) for a, b in zip(got, expected))
+            print(f"{'✅' if passed else '❌'} {fmt.upper()} {path}: {len(levels)} níveis ({baked.nbytes} bytes)")
+            ok = ok and passed
+        glDeleteTextures(1, [direct])
+    manager.cleanup()
+    return ok
+
+
+if __name__ == "__main__":
+    if "--teste" not in sys.argv:
+        print("Uso: python texture_manager.py --teste")
+        sys.exit(2)
+    from gpu_culling import create_headless_context
+    create_headless_context()
+    sys.exit(0 if self_test() else 1)